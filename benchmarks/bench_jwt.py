@@ -0,0 +1,47 @@
+"""Compare cold and warm verify_token latency.
+
+Usage:
+    python -m benchmarks.bench_jwt --iterations 20000
+
+Cold runs clear the verified-token cache before every call, so each one pays
+for the base64 decode, HMAC check and JSON parse; warm runs hit the cache.
+"""
+import argparse
+import json
+import timeit
+
+from src.utils.jwt import create_access_token, token_cache, verify_token
+
+
+def per_call_us(statement, iterations: int) -> float:
+    return timeit.timeit(statement, number=iterations) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = create_access_token(data={"sub": "benchmark-user"})
+
+    def cold():
+        token_cache.clear()
+        verify_token(token)
+
+    def clear_only():
+        token_cache.clear()
+
+    verify_token(token)
+    warm_us = per_call_us(lambda: verify_token(token), args.iterations)
+    # Subtract the cost of clearing so cold numbers measure verification only
+    cold_us = per_call_us(cold, args.iterations) - per_call_us(clear_only, args.iterations)
+
+    print(json.dumps({
+        "iterations": args.iterations,
+        "cold_us_per_call": round(cold_us, 2),
+        "warm_us_per_call": round(warm_us, 2),
+        "speedup": round(cold_us / warm_us, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Measure login throughput (bcrypt verifications/sec) at different pool sizes.
+
+Usage:
+    python -m benchmarks.bench_password --logins 64 --rounds 12 --pools 1,2,4,8
+
+Each run verifies `--logins` passwords concurrently through a process pool of
+the given size, the same way verify_password_async does on /login.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from src.utils.password import create_password_pool, hash_password, verify_password
+
+
+async def run_logins(pool, logins: int, hashed: str) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, verify_password, "benchmark-password", hashed)
+        for _ in range(logins)
+    ))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return elapsed
+
+def bench_pool_size(workers: int, logins: int, hashed: str) -> dict:
+    pool = create_password_pool(workers)
+    try:
+        # Warm the workers so process start-up is not counted
+        list(pool.map(verify_password, ["benchmark-password"] * workers, [hashed] * workers))
+        elapsed = asyncio.run(run_logins(pool, logins, hashed))
+    finally:
+        pool.shutdown()
+    return {"workers": workers, "logins": logins, "seconds": round(elapsed, 3),
+            "logins_per_sec": round(logins / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--pools", default=",".join(
+        str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})
+    ))
+    args = parser.parse_args()
+
+    hashed = hash_password("benchmark-password", rounds=args.rounds)
+    results = [
+        bench_pool_size(int(workers), args.logins, hashed) for workers in args.pools.split(",")
+    ]
+    print(json.dumps({"rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measure /search query latency against a large synthetic message history.
+
+Usage:
+    python -m benchmarks.bench_search --messages 1000000 --users 1000 --queries 200
+
+Builds a throwaway SQLite database with the app's schema, pragmas and FTS5
+triggers, fills it with random messages spread over `--users` users, then
+times search_messages (ranking, snippets and metadata for one page) for
+random one- and two-word queries by random users, separately for ordinary
+and stop-word-like terms. Loading goes through the insert trigger, so its
+rate is also the indexing rate for new messages.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from benchmarks.load_test import git_commit, percentile
+from src.backend.search import search_messages
+from src.database.database import make_engine
+from src.database.models import Base
+from src.database.search import create_search_index
+
+VOCABULARY_SIZE = 20000
+WORDS_PER_MESSAGE = (5, 40)
+# Frequency ranks queries draw their terms from. The top words behave like
+# stop words, appearing in most messages, and bm25 reads every posting of
+# each query term to weigh it, so they are timed separately.
+QUERY_TERM_RANKS = {"content_terms": (100, 5000), "stop_word_terms": (0, 100)}
+
+
+def make_vocabulary(size: int) -> list[str]:
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(size)]
+
+def zipf_cum_weights(size: int) -> list[float]:
+    """Natural-language-like word frequencies, so common terms have long posting lists"""
+    return list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+
+def load(engine, args, vocabulary: list[str]) -> float:
+    rng = random.Random(1)
+    cum_weights = zipf_cum_weights(len(vocabulary))
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO conversations (id, user_id, created_at) "
+                 "VALUES (:id, :id, '2024-01-01')"),
+            [{"id": user} for user in range(1, args.users + 1)],
+        )
+    done = 0
+    while done < args.messages:
+        batch = []
+        for _ in range(min(10000, args.messages - done)):
+            words = rng.choices(
+                vocabulary, cum_weights=cum_weights, k=rng.randint(*WORDS_PER_MESSAGE)
+            )
+            batch.append({
+                "conversation_id": rng.randint(1, args.users),
+                "content": " ".join(words),
+            })
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO messages (conversation_id, role, content, created_at) "
+                "VALUES (:conversation_id, 'user', :content, '2024-01-01')"
+            ), batch)
+        done += len(batch)
+    return time.perf_counter() - start
+
+def time_queries(db: Session, args, terms: list[str]) -> dict:
+    rng = random.Random(2)
+    latencies, hits = [], []
+    for _ in range(args.queries):
+        query = " ".join(rng.sample(terms, rng.choice((1, 2))))
+        start = time.perf_counter()
+        page = search_messages(db, rng.randint(1, args.users), query, args.limit)
+        latencies.append(time.perf_counter() - start)
+        hits.append(len(page["items"]))
+    latencies.sort()
+    return {
+        "mean_hits_per_page": round(statistics.mean(hits), 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    vocabulary = make_vocabulary(VOCABULARY_SIZE)
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = make_engine(f"sqlite:///{os.path.join(workdir, 'search.db')}")
+        Base.metadata.create_all(bind=engine)
+        create_search_index(engine)
+        load_seconds = load(engine, args, vocabulary)
+
+        with Session(engine) as db:
+            results = {
+                name: time_queries(db, args, vocabulary[start:stop])
+                for name, (start, stop) in QUERY_TERM_RANKS.items()
+            }
+        engine.dispose()
+
+    print(json.dumps({
+        "commit": git_commit(),
+        "config": vars(args),
+        "load_seconds": round(load_seconds, 1),
+        "index_rate_messages_per_second": round(args.messages / load_seconds),
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Measure SQLite read throughput while writes are in progress.
+
+Usage:
+    python -m benchmarks.bench_sqlite_rw --seconds 5 --readers 4 --writers 1
+
+Runs username lookups (as /login does) on reader threads while writer threads
+insert users, once with SQLite defaults and once with the tuned profile and
+read-only engine from src.database.database. Reports reads/sec and writes/sec
+for both, so the effect of WAL and the read/write split is visible.
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from pathlib import Path
+from sqlalchemy import create_engine, insert, select
+from src.database import database
+from src.database.models import Base, User
+
+SEED_USERS = 5000
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(SEED_USERS)
+        ])
+
+def reader(engine, stop: threading.Event, counts: list, index: int):
+    with engine.connect() as conn:
+        while not stop.is_set():
+            username = f"user{random.randrange(SEED_USERS)}"
+            row = conn.execute(select(User.hashed_password).where(User.username == username)).first()
+            assert row is not None
+            conn.rollback()  # end the read transaction so WAL checkpoints can proceed
+            counts[index] += 1
+
+def writer(engine, stop: threading.Event, counts: list, index: int):
+    while not stop.is_set():
+        name = uuid.uuid4().hex[:12]
+        with engine.begin() as conn:
+            conn.execute(insert(User).values(
+                username=name, email=f"{name}@example.com", hashed_password="x"
+            ))
+        counts[index] += 1
+
+def run_threads(target, engine, count: int, stop: threading.Event) -> tuple[list, list]:
+    counts = [0] * count
+    threads = [threading.Thread(target=target, args=(engine, stop, counts, i)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, counts
+
+def run_profile(name: str, write_engine, read_engine, args) -> dict:
+    stop = threading.Event()
+    write_threads, writes = run_threads(writer, write_engine, args.writers, stop)
+    read_threads, reads = run_threads(reader, read_engine, args.readers, stop)
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in write_threads + read_threads:
+        thread.join()
+    return {
+        "profile": name,
+        "reads_per_sec": round(sum(reads) / args.seconds, 1),
+        "writes_per_sec": round(sum(writes) / args.seconds, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=1)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        default_url = f"sqlite:///{Path(tmp) / 'default.db'}"
+        default_engine = create_engine(
+            default_url, connect_args={"check_same_thread": False, "timeout": 30}
+        )
+        seed(default_engine)
+        results.append(run_profile("default", default_engine, default_engine, args))
+        default_engine.dispose()
+
+        tuned_url = f"sqlite:///{Path(tmp) / 'tuned.db'}"
+        write_engine = database.make_engine(tuned_url)
+        read_engine = database.make_engine(tuned_url, read_only=True)
+        seed(write_engine)
+        results.append(run_profile("tuned", write_engine, read_engine, args))
+        write_engine.dispose()
+        read_engine.dispose()
+
+    print(json.dumps({"readers": args.readers, "writers": args.writers,
+                      "seconds": args.seconds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
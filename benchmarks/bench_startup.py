@@ -0,0 +1,105 @@
+"""Measure cold-start cost: import time and time to the first served request.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5
+
+Each run uses a fresh interpreter. `import_seconds` is how long importing
+src.backend.main takes. `first_request_seconds` is the time from launching
+uvicorn until the first request that touches the database is answered.
+`ready_seconds` is the part of that spent before the port accepts
+connections. Medians across runs are reported, along with whether the
+Gemini SDK was imported as a side effect of importing the app.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import free_port, git_commit
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import src.backend.main
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "sdk_imported": "google.generativeai" in sys.modules,
+}))
+"""
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_first_request(env: dict, timeout: float = 60) -> tuple[float, float]:
+    """Launch uvicorn and return (seconds until ready, seconds until first answer)"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.backend.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while True:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"App did not start within {timeout}s")
+            if process.poll() is not None:
+                raise RuntimeError(f"App exited during startup with code {process.returncode}")
+            try:
+                httpx.get(f"{url}/metrics", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.01)
+        ready = time.perf_counter() - start
+        # A failed login still runs a user lookup, so the database path is exercised
+        httpx.post(f"{url}/login", data={"username": "nobody", "password": "x"}, timeout=timeout)
+        return ready, time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports, readies, firsts = [], [], []
+    sdk_imported = False
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ)
+            env.setdefault("GEMINI_API_KEY", "fake-key")
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+            for name in ("DATABASE_READ_URL", "ASYNC_DATABASE_URL", "ASYNC_DATABASE_READ_URL"):
+                env.pop(name, None)
+
+            probe = measure_import(env)
+            imports.append(probe["seconds"])
+            sdk_imported = sdk_imported or probe["sdk_imported"]
+            ready, first = measure_first_request(env)
+            readies.append(ready)
+            firsts.append(first)
+
+    print(json.dumps({
+        "commit": git_commit(),
+        "runs": args.runs,
+        "import_seconds": round(statistics.median(imports), 3),
+        "ready_seconds": round(statistics.median(readies), 3),
+        "first_request_seconds": round(statistics.median(firsts), 3),
+        "sdk_imported_by_app": sdk_imported,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
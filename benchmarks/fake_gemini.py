@@ -0,0 +1,113 @@
+"""Local stand-in for the Gemini API, for load tests.
+
+Usage:
+    python -m benchmarks.fake_gemini --port 50051 --latency-ms 400 --jitter-ms 200 --error-rate 0.02
+
+Serves GenerateContent and StreamGenerateContent over insecure gRPC, the
+transport the SDK's async client uses. Each call sleeps for the base latency
+plus a uniform random jitter. A share of calls set by --error-rate then fail
+with INTERNAL, which the SDK does not retry; the rest reply with a canned
+text and usage metadata.
+"""
+import argparse
+import asyncio
+import logging
+import random
+
+import grpc
+import google.ai.generativelanguage as glm
+
+SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+REPLY = "This is a canned reply from the local Gemini stand-in."
+STREAM_CHUNKS = 4
+
+logger = logging.getLogger(__name__)
+
+
+def make_response(text: str, prompt_tokens: int) -> glm.GenerateContentResponse:
+    return glm.GenerateContentResponse(
+        candidates=[glm.Candidate(
+            content=glm.Content(role="model", parts=[glm.Part(text=text)]),
+            finish_reason=glm.Candidate.FinishReason.STOP,
+            index=0,
+        )],
+        usage_metadata=glm.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=len(text.split()),
+            total_token_count=prompt_tokens + len(text.split()),
+        ),
+    )
+
+def count_prompt_tokens(request: glm.GenerateContentRequest) -> int:
+    return sum(len(part.text.split()) for content in request.contents for part in content.parts)
+
+
+class FakeGemini:
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def delay(self) -> float:
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+    async def generate_content(self, request, context):
+        await asyncio.sleep(self.delay())
+        if self.should_fail():
+            await context.abort(grpc.StatusCode.INTERNAL, "Injected failure")
+        return make_response(REPLY, count_prompt_tokens(request))
+
+    async def stream_generate_content(self, request, context):
+        # Spread the latency over the chunks so time to first token is realistic
+        step = self.delay() / STREAM_CHUNKS
+        words = REPLY.split()
+        size = -(-len(words) // STREAM_CHUNKS)
+        prompt_tokens = count_prompt_tokens(request)
+        # A failing stream breaks off after its first chunk, as a dropped upstream would
+        fails = self.should_fail()
+        for start in range(0, len(words), size):
+            await asyncio.sleep(step)
+            if fails and start > 0:
+                await context.abort(grpc.StatusCode.INTERNAL, "Injected failure")
+            yield make_response(" ".join(words[start:start + size]) + " ", prompt_tokens)
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(SERVICE, {
+            "GenerateContent": grpc.unary_unary_rpc_method_handler(
+                self.generate_content,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+            "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                self.stream_generate_content,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+        })
+
+
+async def serve(port: int, fake: FakeGemini):
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((fake.handler(),))
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    await server.start()
+    logger.info(f"Fake Gemini listening on 127.0.0.1:{port}")
+    await server.wait_for_termination()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.port, FakeGemini(args.latency_ms, args.jitter_ms, args.error_rate)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Drive a register/login/chat mix against the app and report latency percentiles.
+
+Usage:
+    python -m benchmarks.load_test --duration 30 --concurrency 16 \\
+        --mix register=1,login=2,chat=6,chat_stream=1 --latency-ms 400 --jitter-ms 200
+
+Starts benchmarks.fake_gemini and the app (via benchmarks.serve_app, under
+uvicorn, on a throwaway SQLite database) as subprocesses, seeds a few
+accounts, then runs `--concurrency` clients for `--duration` seconds. Pass
+--url to target an app that is already running instead; it then talks to
+whatever Gemini backend that app is configured with.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from contextlib import contextmanager
+
+import httpx
+
+OPERATIONS = ("register", "login", "chat", "chat_stream")
+PASSWORD = "benchmark-password"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; use {OPERATIONS}")
+        weights[name] = float(weight or 1)
+    return weights
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def wait_until_ready(url: str, process: subprocess.Popen | None, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/metrics", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App at {url} did not become ready within {timeout}s")
+
+@contextmanager
+def local_stack(args):
+    """Run the fake Gemini server and the app; yield the app's base URL"""
+    gemini_port, app_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env.setdefault("GEMINI_API_KEY", "fake-key")
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+        env.pop("DATABASE_READ_URL", None)
+        env.pop("ASYNC_DATABASE_URL", None)
+        env.pop("ASYNC_DATABASE_READ_URL", None)
+        if args.bcrypt_rounds:
+            env["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+        processes = [
+            subprocess.Popen([
+                sys.executable, "-m", "benchmarks.fake_gemini", "--port", str(gemini_port),
+                "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                "--error-rate", str(args.error_rate),
+            ], env=env, stderr=subprocess.DEVNULL),
+            subprocess.Popen([
+                sys.executable, "-m", "benchmarks.serve_app", "--port", str(app_port),
+                "--gemini", f"127.0.0.1:{gemini_port}",
+            ], env=env),
+        ]
+        try:
+            url = f"http://127.0.0.1:{app_port}"
+            wait_until_ready(url, processes[1])
+            yield url
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, weights: dict[str, float], prompts: int):
+        self.client = client
+        self.weights = weights
+        self.prompts = prompts
+        self.run_id = uuid.uuid4().hex[:8]
+        self.registered = 0
+        self.usernames: list[str] = []
+        self.tokens: list[str] = []
+        # operation -> list of (latency seconds, succeeded)
+        self.samples: dict[str, list[tuple[float, bool]]] = {name: [] for name in weights}
+
+    def next_username(self) -> str:
+        self.registered += 1
+        return f"load_{self.run_id}_{self.registered}"
+
+    def prompt(self) -> str:
+        if self.prompts <= 0:
+            return f"Benchmark prompt {uuid.uuid4().hex}"
+        return f"Benchmark prompt {random.randrange(self.prompts)}"
+
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {random.choice(self.tokens)}"}
+
+    async def register(self, username: str | None = None) -> bool:
+        username = username or self.next_username()
+        response = await self.client.post("/register", json={
+            "username": username, "email": f"{username}@example.com", "password": PASSWORD
+        })
+        return response.status_code == 200
+
+    async def login(self, username: str | None = None) -> bool:
+        response = await self.client.post("/login", data={
+            "username": username or random.choice(self.usernames), "password": PASSWORD
+        })
+        if response.status_code != 200:
+            return False
+        if username:
+            self.tokens.append(response.json()["access_token"])
+        return True
+
+    async def chat(self) -> bool:
+        response = await self.client.post(
+            "/chat", json={"text": self.prompt()}, headers=self.auth()
+        )
+        return response.status_code == 200
+
+    async def chat_stream(self) -> bool:
+        async with self.client.stream(
+            "POST", "/chat/stream", json={"text": self.prompt()}, headers=self.auth()
+        ) as response:
+            body = await response.aread()
+        return response.status_code == 200 and b"event: end" in body
+
+    async def seed(self, users: int):
+        """Create the accounts that login and chat traffic reuse; not measured"""
+        for _ in range(users):
+            username = self.next_username()
+            if not (await self.register(username) and await self.login(username)):
+                raise RuntimeError(f"Could not seed benchmark user {username}")
+            self.usernames.append(username)
+
+    async def worker(self, deadline: float):
+        names, weights = list(self.weights), list(self.weights.values())
+        while time.monotonic() < deadline:
+            operation = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = await getattr(self, operation)()
+            except httpx.HTTPError:
+                ok = False
+            self.samples[operation].append((time.perf_counter() - start, ok))
+
+    async def run(self, concurrency: int, duration: float) -> float:
+        start = time.monotonic()
+        await asyncio.gather(*(self.worker(start + duration) for _ in range(concurrency)))
+        return time.monotonic() - start
+
+    def report(self, elapsed: float) -> dict:
+        def summarize(samples: list[tuple[float, bool]]) -> dict:
+            latencies = sorted(latency for latency, _ in samples)
+            return {
+                "requests": len(samples),
+                "errors": sum(1 for _, ok in samples if not ok),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            }
+
+        combined = [sample for samples in self.samples.values() for sample in samples]
+        return {
+            "overall": summarize(combined),
+            "operations": {name: summarize(samples) for name, samples in self.samples.items()},
+        }
+
+
+async def run_load_test(url: str, args) -> dict:
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        load_test = LoadTest(client, args.mix, args.prompts)
+        await load_test.seed(args.users)
+        elapsed = await load_test.run(args.concurrency, args.duration)
+        return load_test.report(elapsed) | {"elapsed_seconds": round(elapsed, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Benchmark an already running app instead of starting one")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", type=parse_mix, default="register=1,login=2,chat=6,chat_stream=1")
+    parser.add_argument("--users", type=int, default=10, help="Accounts seeded before the run")
+    parser.add_argument("--prompts", type=int, default=1000,
+                        help="Distinct chat prompts to draw from; 0 makes every prompt unique")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bcrypt-rounds", type=int, help="Override BCRYPT_ROUNDS for the app")
+    args = parser.parse_args()
+
+    if args.url:
+        results = asyncio.run(run_load_test(args.url, args))
+    else:
+        with local_stack(args) as url:
+            results = asyncio.run(run_load_test(url, args))
+
+    config = {
+        key: value for key, value in vars(args).items() if key not in ("mix", "url", "timeout")
+    }
+    print(json.dumps({
+        "commit": git_commit(),
+        "config": config | {"mix": args.mix, "target": args.url or "local"},
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
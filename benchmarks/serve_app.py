@@ -0,0 +1,50 @@
+"""Run the FastAPI app under uvicorn with Gemini pointed at a local stand-in.
+
+Usage:
+    python -m benchmarks.serve_app --port 8001 --gemini 127.0.0.1:50051
+
+The SDK's async client normally opens a TLS channel to Google. Here it is
+built on an insecure channel to the fake server from benchmarks.fake_gemini
+instead, so every other layer (SDK, gate, cache, coalescer) runs unchanged.
+"""
+import argparse
+
+import grpc
+import uvicorn
+import google.ai.generativelanguage as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+    GenerativeServiceGrpcAsyncIOTransport
+)
+from google.generativeai import client as genai_client
+
+
+def use_fake_gemini(address: str):
+    """Make the SDK build its async generative client against `address`"""
+    manager = genai_client._client_manager
+    make_client = manager.make_client
+
+    def make_fake_client(name: str):
+        if name != "generative_async":
+            return make_client(name)
+        # Created lazily, inside uvicorn's event loop, on the first upstream call
+        channel = grpc.aio.insecure_channel(address)
+        return glm.GenerativeServiceAsyncClient(
+            transport=GenerativeServiceGrpcAsyncIOTransport(channel=channel)
+        )
+
+    manager.make_client = make_fake_client
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--gemini", required=True, help="host:port of benchmarks.fake_gemini")
+    args = parser.parse_args()
+
+    use_fake_gemini(args.gemini)
+    from src.backend.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
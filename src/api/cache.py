@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse runs of whitespace so trivially different prompts share a key"""
+    return " ".join(prompt.split())
+
+def make_cache_key(prompt: str, model_name: str) -> str:
+    """Stable key for a (prompt, model) pair"""
+    raw = f"{model_name}\0{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheTier:
+    """Persistent second cache tier so cached replies survive restarts"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] <= time.time():
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+
+class ResponseCache:
+    """Bounded in-memory LRU cache of chat replies with a per-entry TTL.
+
+    Entries are keyed on the normalized prompt plus model name. When a
+    persistent tier is given, misses fall through to it and hits there are
+    promoted back into memory.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 persistent_tier: SQLiteCacheTier | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent_tier = persistent_tier
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.persistent_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, prompt: str, model_name: str) -> str | None:
+        """Return the cached reply, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+        key = make_cache_key(prompt, model_name)
+        value = self._get_memory(key)
+        return value if value is not None else self._get_persistent(key)
+
+    async def get_async(self, prompt: str, model_name: str) -> str | None:
+        """get() for the event loop; the persistent tier is read in a worker thread"""
+        if not self.enabled:
+            return None
+        key = make_cache_key(prompt, model_name)
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        if self.persistent_tier is None:
+            return self._get_persistent(key)  # only counts the miss
+        return await asyncio.to_thread(self._get_persistent, key)
+
+    def _get_memory(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+                self.expirations += 1
+        return None
+
+    def _get_persistent(self, key: str) -> str | None:
+        row = self.persistent_tier.get(key) if self.persistent_tier else None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            self.hits += 1
+            self.persistent_hits += 1
+            # The tier stores wall-clock expiry; memory uses the monotonic clock
+            self._store(key, value, time.monotonic() + (expires_at - time.time()))
+        return value
+
+    def set(self, prompt: str, model_name: str, value: str):
+        """Cache a reply for the configured TTL"""
+        if not self.enabled:
+            return
+        key = make_cache_key(prompt, model_name)
+        with self._lock:
+            self._store(key, value, time.monotonic() + self.ttl_seconds)
+        if self.persistent_tier:
+            self.persistent_tier.set(key, value, time.time() + self.ttl_seconds)
+
+    async def set_async(self, prompt: str, model_name: str, value: str):
+        """set() for the event loop; the persistent tier commits in a worker thread"""
+        if not self.enabled:
+            return
+        key = make_cache_key(prompt, model_name)
+        with self._lock:
+            self._store(key, value, time.monotonic() + self.ttl_seconds)
+        if self.persistent_tier:
+            await asyncio.to_thread(
+                self.persistent_tier.set, key, value, time.time() + self.ttl_seconds
+            )
+
+    def _store(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persistent_tier:
+            self.persistent_tier.clear()
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "persistent_hits": self.persistent_hits,
+            }
@@ -0,0 +1,98 @@
+import math
+import os
+import re
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Total tokens of history, summary and new prompt sent upstream per request
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "4000"))
+# Most recent turns considered at all; older ones are only reachable via the summary
+CHAT_CONTEXT_MAX_TURNS = int(os.getenv("CHAT_CONTEXT_MAX_TURNS", "200"))
+CHAT_SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "false").lower() == "true"
+# Unsummarized turns that must fall out of the budget before a new summary is made
+CHAT_SUMMARY_MIN_TURNS = int(os.getenv("CHAT_SUMMARY_MIN_TURNS", "10"))
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+@dataclass
+class Turn:
+    id: int
+    role: str
+    content: str
+    token_count: int | None = None
+
+
+@dataclass
+class ChatContext:
+    """History to send upstream, plus what fell outside the token budget"""
+    contents: list[dict]
+    token_count: int
+    oldest_included_id: int | None
+    dropped_turns: int
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """Approximate the Gemini token count of `text` without a network call.
+
+    Each word or punctuation mark counts as one token, plus one more per four
+    characters beyond the first four of a long word, which tracks subword
+    tokenizers closely enough for budgeting.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PATTERN.findall(text)) or 1
+
+def turn_tokens(turn: Turn) -> int:
+    return turn.token_count if turn.token_count is not None else estimate_tokens(turn.content)
+
+def to_content(role: str, text: str) -> dict:
+    return {"role": role, "parts": [text]}
+
+def build_context(turns: list[Turn], prompt: str, summary: str | None = None,
+                  budget: int = CHAT_CONTEXT_TOKEN_BUDGET) -> ChatContext:
+    """Fill `budget` with the newest turns that fit, walking backwards.
+
+    `turns` are in chronological order and must not include `prompt`, which
+    is always sent. A stored rolling summary, when given, is placed ahead of
+    the history and counted against the budget. The history is trimmed so it
+    starts with a user turn, as Gemini expects alternating roles.
+    """
+    summary_contents = []
+    used = estimate_tokens(prompt)
+    if summary:
+        summary_contents = [
+            to_content("user", f"{SUMMARY_PREFIX}\n{summary}"),
+            to_content("model", "Understood."),
+        ]
+        used += estimate_tokens(summary)
+
+    included: list[Turn] = []
+    for turn in reversed(turns):
+        cost = turn_tokens(turn)
+        if used + cost > budget:
+            break
+        used += cost
+        included.append(turn)
+    included.reverse()
+    while included and included[0].role != "user":
+        used -= turn_tokens(included.pop(0))
+
+    return ChatContext(
+        contents=summary_contents + [to_content(t.role, t.content) for t in included],
+        token_count=used,
+        oldest_included_id=included[0].id if included else None,
+        dropped_turns=len(turns) - len(included),
+    )
+
+def summary_prompt(previous_summary: str | None, turns: list[Turn]) -> str:
+    """Instruction asking the model to fold `turns` into the rolling summary"""
+    transcript = "\n".join(f"{t.role}: {t.content}" for t in turns)
+    previous = f"Existing summary:\n{previous_summary}\n\n" if previous_summary else ""
+    return (
+        "Update the running summary of this conversation. Keep facts, names, decisions "
+        "and open questions the user mentioned; drop pleasantries. Reply with the "
+        "summary only, in at most 200 words.\n\n"
+        f"{previous}New messages:\n{transcript}"
+    )
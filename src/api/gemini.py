@@ -1,22 +1,262 @@
-import google.generativeai as genai
+import asyncio
 import os
+import time
 
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Callable
+from src.api.cache import ResponseCache, SQLiteCacheTier, make_cache_key
+from src.api.coalescing import RequestCoalescer
+from src.api.providers import (
+    ConcurrencyGate, LLMProvider, ProviderRouter, StubProvider, UpstreamBusyError, UpstreamError,
+    build_providers
+)
+from src.utils.metrics import GEMINI_ERRORS, GEMINI_REQUEST_DURATION, GEMINI_TOKENS
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 load_dotenv()
 
-# Get API key from environment variable
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable not set")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Upper bound on concurrent upstream calls, and on callers allowed to wait for a slot
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_QUEUE_DEPTH = int(os.getenv("GEMINI_MAX_QUEUE_DEPTH", "32"))
+# Exact-match reply cache; set CHAT_CACHE_MAX_ENTRIES=0 to disable
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600"))
+CHAT_CACHE_DB_PATH = os.getenv("CHAT_CACHE_DB_PATH")
+# Similarity cache for reworded prompts (src.api.semantic_cache); needs numpy
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))
+# Cosine similarity needed to serve a cached reply; misses above NEAR_MISS are counted
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_NEAR_MISS = float(os.getenv("SEMANTIC_CACHE_NEAR_MISS", "0.75"))
+SEMANTIC_CACHE_TTL_SECONDS = float(
+    os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(CHAT_CACHE_TTL_SECONDS))
+)
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH")
+# "global" shares cached replies between users; "user" keeps each user's replies,
+# in the exact and semantic caches alike, to themselves
+SEMANTIC_CACHE_SCOPE = os.getenv("SEMANTIC_CACHE_SCOPE", "global")
+# Ordered provider list, primary first; see src.api.providers.build_providers
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", f"gemini:{GEMINI_MODEL_NAME}")
+
+
+upstream_gate = ConcurrencyGate(GEMINI_MAX_CONCURRENCY, GEMINI_MAX_QUEUE_DEPTH)
+response_cache = ResponseCache(
+    max_entries=CHAT_CACHE_MAX_ENTRIES,
+    ttl_seconds=CHAT_CACHE_TTL_SECONDS,
+    persistent_tier=SQLiteCacheTier(CHAT_CACHE_DB_PATH) if CHAT_CACHE_DB_PATH else None,
+)
+# Identical prompts arriving while a call is in flight share that call
+request_coalescer = RequestCoalescer()
+
+
+def build_semantic_cache():
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    # Imported here so numpy is only loaded when the cache is switched on
+    from src.api.semantic_cache import SemanticCache
+    return SemanticCache(
+        capacity=SEMANTIC_CACHE_MAX_ENTRIES, dim=SEMANTIC_CACHE_DIM,
+        threshold=SEMANTIC_CACHE_THRESHOLD, near_miss=SEMANTIC_CACHE_NEAR_MISS,
+        ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS, path=SEMANTIC_CACHE_PATH,
+    )
+
+semantic_cache = build_semantic_cache()
+
+
+# User charged for upstream calls made in the current context; tasks started
+# from it (hedges, coalesced calls) inherit it
+billed_user: ContextVar[str | None] = ContextVar("billed_user", default=None)
+# Called as listener(user, prompt_tokens, completion_tokens) per billed response
+usage_listeners: list[Callable[[str, int, int], None]] = []
+
+_configured_api_key: str | None = None
+
 
-genai.configure(api_key=GEMINI_API_KEY)
+def __getattr__(name: str):
+    # Keeps `src.api.gemini.genai` working (e.g. as a patch target) without importing
+    # the SDK when this module is imported
+    if name == "genai":
+        import google.generativeai as genai
+        return genai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def load_genai():
+    """Import the Gemini SDK and configure it with GEMINI_API_KEY.
+
+    The SDK takes a large share of startup time to import, so this runs on
+    the first model lookup instead of at import time.
+    """
+    global _configured_api_key
+    import google.generativeai as genai
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set")
+    if api_key != _configured_api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+    return genai
+
+@lru_cache(maxsize=None)
+def get_model(model_name: str = GEMINI_MODEL_NAME) -> "genai.GenerativeModel":
+    """Return the shared model instance for `model_name`, creating it once"""
+    return load_genai().GenerativeModel(model_name)
+
+@contextmanager
+def observe_call(operation: str):
+    """Time an upstream call and count its failures by exception type"""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        # A hedge lost the race, or the client went away
+        outcome = "cancelled"
+        raise
+    except Exception as e:
+        outcome = "error"
+        GEMINI_ERRORS.inc(operation, type(e).__name__)
+        raise
+    finally:
+        GEMINI_REQUEST_DURATION.observe(time.perf_counter() - start, operation, outcome)
+
+def record_usage(response):
+    """Add the token counts Gemini reports for a response, when present, and bill them"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    counts = {}
+    for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        count = getattr(usage, field, 0)
+        counts[kind] = count if isinstance(count, int) and count > 0 else 0
+        if counts[kind]:
+            GEMINI_TOKENS.inc(kind, amount=counts[kind])
+    user = billed_user.get()
+    if user is not None:
+        for listener in usage_listeners:
+            listener(user, counts["prompt"], counts["completion"])
 
 def get_chat_response(prompt: str) -> str:
     """Get response from Gemini API for a given prompt"""
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    model = get_model()
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        with observe_call("chat"):
+            response = model.generate_content(prompt)
+            text = response.text
+        record_usage(response)
+        return text
     except Exception as e:
         return f"Error: {str(e)}"
+
+class GeminiProvider(LLMProvider):
+    """Gemini model behind the provider interface"""
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME):
+        self.name = model_name
+        self.model_name = model_name
+
+    async def generate(self, contents, operation: str = "chat") -> str:
+        model = get_model(self.model_name)
+        with observe_call(operation):
+            response = await model.generate_content_async(contents)
+            text = response.text
+        record_usage(response)
+        return text
+
+    async def stream(self, contents) -> AsyncIterator[str]:
+        model = get_model(self.model_name)
+        with observe_call("stream"):
+            response = await model.generate_content_async(contents, stream=True)
+            async for chunk in response:
+                # Chunks carrying only safety/finish metadata have no text parts
+                if chunk.parts:
+                    yield chunk.text
+        record_usage(response)
+
+
+PROVIDER_TYPES = {"gemini": GeminiProvider, "stub": StubProvider}
+provider_router = ProviderRouter(build_providers(LLM_PROVIDERS, PROVIDER_TYPES), upstream_gate)
+
+
+def cache_scope(user: str | None) -> str | None:
+    """Partition of the reply caches and coalesced calls for a caller.
+
+    With SEMANTIC_CACHE_SCOPE "user" each user gets their own, and callers
+    without a user get None: their replies are neither cached nor shared.
+    """
+    if SEMANTIC_CACHE_SCOPE != "user":
+        return provider_router.name
+    return f"{provider_router.name}:{user}" if user else None
+
+async def get_chat_response_async(prompt: str, history: list[dict] | None = None,
+                                  user: str | None = None) -> str:
+    """Get a reply through the provider router without blocking the event loop.
+
+    `history` holds earlier turns as Gemini contents (see src.api.context).
+    Single-turn replies are served from response_cache when possible, then
+    from semantic_cache for reworded prompts, and concurrent identical
+    prompts share a single upstream call. `user` selects the partition of
+    all three when SEMANTIC_CACHE_SCOPE is "user", and is billed for the
+    tokens used. Raises UpstreamBusyError when the upstream queue is full and
+    UpstreamError when no provider answered; failures are never cached.
+    """
+    token = billed_user.set(user)
+    try:
+        return await _get_chat_response(prompt, history, user)
+    finally:
+        billed_user.reset(token)
+
+async def _get_chat_response(prompt: str, history: list[dict] | None, user: str | None) -> str:
+    if history:
+        return await provider_router.generate(history + [{"role": "user", "parts": [prompt]}])
+
+    scope = cache_scope(user)
+    if scope is None:
+        return await provider_router.generate(prompt)
+
+    cached = await response_cache.get_async(prompt, scope)
+    if cached is not None:
+        return cached
+
+    if semantic_cache is not None:
+        # A lookup is a matrix product over every entry; keep it off the event loop
+        similar = await asyncio.to_thread(semantic_cache.get, prompt, scope)
+        if similar is not None:
+            return similar
+
+    key = make_cache_key(prompt, scope)
+    return await request_coalescer.run(key, lambda: _generate_and_cache(prompt, scope))
+
+async def _generate_and_cache(prompt: str, scope: str) -> str:
+    text = await provider_router.generate(prompt)
+    await response_cache.set_async(prompt, scope, text)
+    if semantic_cache is not None:
+        await asyncio.to_thread(semantic_cache.set, prompt, scope, text)
+    return text
+
+async def generate_summary(instruction: str) -> str:
+    """Produce a conversation summary; errors are raised so they are never stored"""
+    return (await provider_router.generate(instruction, operation="summary")).strip()
+
+async def stream_chat_response(prompt: str, history: list[dict] | None = None,
+                               user: str | None = None) -> AsyncIterator[str]:
+    """Yield text chunks as they are generated.
+
+    Errors are raised to the caller so it can report them on its own channel
+    (e.g. an SSE error event) instead of mixing them into the reply text.
+    The gate slot is held until the stream is exhausted or closed. `user`
+    is billed for the tokens used.
+    """
+    if user is not None:
+        # Not reset: a generator may be closed from another context. Streams
+        # are consumed by a task of their own, so the value goes with it.
+        billed_user.set(user)
+    contents = history + [{"role": "user", "parts": [prompt]}] if history else prompt
+    async for chunk in provider_router.stream(contents):
+        yield chunk
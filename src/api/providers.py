@@ -0,0 +1,354 @@
+"""Backend-neutral LLM plumbing: providers, circuit breakers and hedged calls.
+
+A ProviderRouter holds an ordered list of providers (the first is primary).
+Every call goes to the first provider whose circuit is closed. When it has
+not answered within the p95 of its recent latencies, a hedge request goes to
+the next healthy provider (or the same one when it is the only one); the
+first reply wins and the other call is cancelled. If every attempt fails,
+the call fails over to providers not tried yet before giving up with
+UpstreamError.
+"""
+import abc
+import asyncio
+import math
+import os
+import time
+
+from collections import deque
+from typing import AsyncIterator, Callable
+from src.utils.metrics import LLM_HEDGES
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+# Hedge once the primary is slower than this percentile of its recent replies
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Delay used until LLM_HEDGE_MIN_SAMPLES replies have been seen, and the floor after that
+LLM_HEDGE_INITIAL_DELAY_MS = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_MS", "2000"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "50"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+# Consecutive failures that open a provider's circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+
+class UpstreamBusyError(Exception):
+    """Raised when the upstream wait queue is full and the call is rejected"""
+
+
+class UpstreamError(Exception):
+    """Raised when no provider produced a reply"""
+
+
+class ConcurrencyGate:
+    """Async semaphore with a bounded waiting line.
+
+    At most `max_concurrency` callers hold the gate at once and at most
+    `max_waiting` callers queue behind them. Anyone arriving after that is
+    rejected immediately with UpstreamBusyError rather than piling up.
+    """
+
+    def __init__(self, max_concurrency: int, max_waiting: int):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def is_full(self) -> bool:
+        """True when a new caller would be rejected right now"""
+        return self._semaphore.locked() and self.waiting >= self.max_waiting
+
+    async def __aenter__(self):
+        if self.is_full():
+            raise UpstreamBusyError("Too many pending upstream requests")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class LLMProvider(abc.ABC):
+    """A backend able to answer Gemini-style contents (a prompt or a turn list)"""
+
+    name: str
+
+    @abc.abstractmethod
+    async def generate(self, contents, operation: str = "chat") -> str:
+        """Return the full reply text; raise on any failure"""
+
+    @abc.abstractmethod
+    def stream(self, contents) -> AsyncIterator[str]:
+        """Yield the reply text in chunks; raise on any failure"""
+
+
+class StubProvider(LLMProvider):
+    """Canned replies without any network call, for local runs and tests"""
+
+    def __init__(self, name: str = "stub", reply: str | None = None, latency: float = 0.0):
+        self.name = name
+        self.reply = reply
+        self.latency = latency
+
+    def reply_to(self, contents) -> str:
+        if self.reply is not None:
+            return self.reply
+        prompt = contents if isinstance(contents, str) else contents[-1]["parts"][0]
+        return f"Stub reply to: {prompt}"
+
+    async def generate(self, contents, operation: str = "chat") -> str:
+        await asyncio.sleep(self.latency)
+        return self.reply_to(contents)
+
+    async def stream(self, contents) -> AsyncIterator[str]:
+        for word in self.reply_to(contents).split(" "):
+            await asyncio.sleep(self.latency)
+            yield word + " "
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = LLM_HEDGE_MIN_SAMPLES) -> float | None:
+        """Nearest-rank percentile, or None until `min_samples` have been recorded"""
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)]
+
+
+class CircuitBreaker:
+    """Stops routing to a provider after repeated consecutive failures.
+
+    Closed: calls flow. Open: calls are refused for `reset_seconds`. After
+    that one trial call is let through (half-open); its success closes the
+    circuit and its failure opens it again. Only used from the event loop,
+    so no locking is needed.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 reset_seconds: float = LLM_BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; claims the trial slot when half-open"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.clock() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = self.clock()
+
+    def release(self):
+        """Give back a half-open trial that ended without a verdict (cancelled or busy)"""
+        if self.state == "half_open":
+            self.state = "open"
+
+
+class ProviderRouter:
+    """Routes calls across providers with hedging, failover and circuit breakers.
+
+    `gate` bounds upstream concurrency; each attempt, hedges included, holds
+    a slot while it runs.
+    """
+
+    def __init__(self, providers: list[LLMProvider], gate: ConcurrencyGate,
+                 hedge: bool = LLM_HEDGE_ENABLED):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        names = [provider.name for provider in providers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate LLM provider names: {names}")
+        self.providers = providers
+        self.gate = gate
+        self.hedge = hedge
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.latency: dict[str, LatencyTracker] = {}
+        self.reset()
+
+    @property
+    def name(self) -> str:
+        """Name of the primary provider, used to namespace cached replies"""
+        return self.providers[0].name
+
+    def reset(self):
+        self.breakers = {provider.name: CircuitBreaker() for provider in self.providers}
+        self.latency = {provider.name: LatencyTracker() for provider in self.providers}
+
+    def hedge_delay(self, provider: LLMProvider) -> float | None:
+        """Seconds to wait on `provider` before hedging, or None to never hedge"""
+        if not self.hedge:
+            return None
+        observed = self.latency[provider.name].percentile(LLM_HEDGE_PERCENTILE)
+        delay_ms = LLM_HEDGE_INITIAL_DELAY_MS if observed is None else observed * 1000
+        return max(delay_ms, LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+    def pick(self, exclude: set[str]) -> LLMProvider | None:
+        """First provider not in `exclude` whose circuit lets a call through"""
+        for provider in self.providers:
+            if provider.name not in exclude and self.breakers[provider.name].allow():
+                return provider
+        return None
+
+    async def attempt(self, provider: LLMProvider, contents, operation: str) -> str:
+        breaker = self.breakers[provider.name]
+        try:
+            async with self.gate:
+                start = time.perf_counter()
+                text = await provider.generate(contents, operation)
+        except (UpstreamBusyError, asyncio.CancelledError):
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        self.latency[provider.name].record(time.perf_counter() - start)
+        return text
+
+    async def generate(self, contents, operation: str = "chat") -> str:
+        """Get a reply, hedging stragglers and failing over on errors.
+
+        Raises UpstreamBusyError when the gate rejects the call and nothing
+        else is in flight, and UpstreamError when no provider answered.
+        """
+        primary = self.pick(set())
+        if primary is None:
+            raise UpstreamError("All LLM providers are unavailable")
+        tried = {primary.name}
+        pending = {asyncio.create_task(self.attempt(primary, contents, operation)): primary}
+        first_task = next(iter(pending))
+        hedge_at = self.hedge_delay(primary)
+        errors: list[Exception] = []
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_at, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # The primary is straggling: race it against the next healthy
+                    # provider, or against itself when it is the only one
+                    hedge_at = None
+                    hedge = self.pick(tried) or self.pick(set())
+                    if hedge is not None:
+                        tried.add(hedge.name)
+                        task = asyncio.create_task(self.attempt(hedge, contents, operation))
+                        pending[task] = hedge
+                        LLM_HEDGES.inc("sent")
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first_task:
+                            LLM_HEDGES.inc("won")
+                        return task.result()
+                # A hedge refused by the gate is ignored; a lone refused call is a 503
+                busy = [t.exception() for t in done if isinstance(t.exception(), UpstreamBusyError)]
+                errors.extend(t.exception() for t in done if t.exception() not in busy)
+                if busy and not pending and not errors:
+                    raise busy[0]
+
+                if not pending:
+                    fallback = self.pick(tried)
+                    if fallback is not None:
+                        tried.add(fallback.name)
+                        task = asyncio.create_task(self.attempt(fallback, contents, operation))
+                        pending[task] = fallback
+                        hedge_at = self.hedge_delay(fallback)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        last = errors[-1] if errors else None
+        raise UpstreamError(f"All LLM providers failed: {last}") from last
+
+    async def stream(self, contents) -> AsyncIterator[str]:
+        """Stream from the first healthy provider.
+
+        Streams are not hedged, since two partial replies cannot be merged.
+        A provider failing before its first chunk is failed over; once text
+        has been sent, a failure ends the stream with UpstreamError.
+        """
+        tried: set[str] = set()
+        last = None
+        while (provider := self.pick(tried)) is not None:
+            tried.add(provider.name)
+            breaker = self.breakers[provider.name]
+            started = False
+            try:
+                async with self.gate:
+                    async for chunk in provider.stream(contents):
+                        started = True
+                        yield chunk
+            except UpstreamBusyError:
+                breaker.release()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                if started:
+                    raise UpstreamError(f"Stream from {provider.name} failed: {e}") from e
+                last = e
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return
+        raise UpstreamError(f"All LLM providers failed: {last}") from last
+
+    def stats(self) -> dict:
+        return {
+            provider.name: {
+                "circuit_open": self.breakers[provider.name].state != "closed",
+                "p95_seconds": self.latency[provider.name].percentile(95, min_samples=1),
+            }
+            for provider in self.providers
+        }
+
+
+def build_providers(spec: str, provider_types: dict[str, Callable[..., LLMProvider]]):
+    """Build providers from a spec like "gemini:gemini-2.0-flash,gemini:gemini-1.5-flash,stub".
+
+    Each item is a registered provider type, optionally followed by ":" and
+    the single argument its constructor takes (a model or provider name).
+    """
+    providers = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, argument = item.partition(":")
+        if kind not in provider_types:
+            raise ValueError(f"Unknown LLM provider type {kind!r}; use {sorted(provider_types)}")
+        factory = provider_types[kind]
+        providers.append(factory(argument) if argument else factory())
+    return providers
@@ -0,0 +1,300 @@
+"""Similarity-based reply cache for paraphrased prompts.
+
+Prompts are embedded offline with a hashed n-gram vectorizer (word
+unigrams and bigrams plus character trigrams, hashed into a fixed number
+of signed buckets), so no model or network call is involved. Vectors sit
+in one float32 matrix, optionally a memory-mapped file, and a lookup is a
+single matrix product against every live entry of the caller's scope.
+
+The embedding is lexical: it recognizes rewordings that share most of
+their words, not meaning. Prompts that differ in one key word ("capital of
+France" / "capital of Spain") still score high, so keep the threshold
+strict and watch the near-miss histogram before lowering it.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from src.utils.metrics import SEMANTIC_CACHE_SIMILARITY
+
+WORD_PATTERN = re.compile(r"\w+")
+# Relative weight of each feature family in the embedding
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 1.0
+CHAR_WEIGHT = 0.5
+
+
+class HashedNgramEmbedder:
+    """Stateless text embedder; the same text gives the same vector in every process"""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    @staticmethod
+    def features(text: str) -> list[tuple[str, float]]:
+        words = WORD_PATTERN.findall(text.lower())
+        features = [(f"w:{word}", WORD_WEIGHT) for word in words]
+        features += [(f"b:{a} {b}", BIGRAM_WEIGHT) for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            features += [(f"c:{padded[i:i + 3]}", CHAR_WEIGHT) for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        """Unit-length float32 vector, or all zeros for text without words"""
+        features = self.features(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        # crc32 rather than hash(), which is salted per process
+        hashes = np.fromiter(
+            (zlib.crc32(name.encode("utf-8")) for name, _ in features), dtype=np.uint32,
+            count=len(features),
+        )
+        weights = np.fromiter((weight for _, weight in features), dtype=np.float32,
+                              count=len(features))
+        # The top bit picks a sign so that colliding features tend to cancel out
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        vector += np.bincount(hashes % self.dim, weights=weights * signs,
+                              minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: list[str]) -> np.ndarray:
+        return np.stack([self.embed(text) for text in texts]) if texts else (
+            np.zeros((0, self.dim), dtype=np.float32)
+        )
+
+
+def vector_checksum(vector: np.ndarray) -> int:
+    return zlib.crc32(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+
+def scope_key(scope: str) -> int:
+    """Nonzero 63-bit id for a scope name; 0 marks an empty slot"""
+    digest = hashlib.blake2b(scope.encode("utf-8"), digest_size=8).digest()
+    return (int.from_bytes(digest, "big") >> 1) or 1
+
+
+class SemanticCache:
+    """Fixed-capacity cache of replies found by prompt similarity.
+
+    Each slot holds one vector, scope, reply and expiry. A lookup returns
+    the reply of the most similar live entry in the same scope when its
+    cosine similarity reaches `threshold`. Misses scoring at least
+    `near_miss` are counted separately, as candidates for a lower threshold.
+    When full, expired slots are reused first, then the least recently used.
+
+    With `path`, vectors live in `<path>.vectors`, a memory-mapped file, and
+    the other slot fields in a small SQLite file at `path`, so the cache
+    survives restarts. Writes reach the files through flush(), which set
+    runs outside the lock lookups take, so hits never wait on disk I/O.
+    Recency is only persisted on writes.
+    """
+
+    def __init__(self, capacity: int = 10000, dim: int = 512, threshold: float = 0.9,
+                 near_miss: float = 0.75, ttl_seconds: float = 3600, path: str | None = None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.near_miss = near_miss
+        self.ttl_seconds = ttl_seconds
+        self.embedder = HashedNgramEmbedder(dim)
+        self._lock = threading.Lock()
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._replies: list[str | None] = [None] * capacity
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.evictions = 0
+        self._db = None
+        # Serializes writes to the files, outside _lock so lookups never wait on disk
+        self._persist_lock = threading.Lock()
+        # Slots changed since they were last written: slot -> metadata row
+        self._dirty: dict[int, tuple] = {}
+        if path:
+            self._vectors, reused = self._open_vectors(f"{path}.vectors", dim)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._load(reused)
+        else:
+            self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+
+    def _open_vectors(self, path: str, dim: int) -> tuple[np.memmap, bool]:
+        """The vector file, and whether it was reused rather than created empty"""
+        shape = (self.capacity, dim)
+        expected = self.capacity * dim * np.dtype(np.float32).itemsize
+        if os.path.exists(path) and os.path.getsize(path) == expected:
+            return np.memmap(path, dtype=np.float32, mode="r+", shape=shape), True
+        # New file, or one sized for another capacity or dim
+        return np.memmap(path, dtype=np.float32, mode="w+", shape=shape), False
+
+    def _load(self, reused: bool):
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(semantic_cache)")]
+        if columns and "checksum" not in columns:
+            # Written before entries carried a checksum; cannot be trusted
+            self._db.execute("DROP TABLE semantic_cache")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache (slot INTEGER PRIMARY KEY, "
+            "scope INTEGER NOT NULL, reply TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "last_used REAL NOT NULL, checksum INTEGER NOT NULL)"
+        )
+        if not reused:
+            self._db.execute("DELETE FROM semantic_cache")
+        else:
+            self._db.execute(
+                "DELETE FROM semantic_cache WHERE expires_at <= ? OR slot >= ?",
+                (time.time(), self.capacity),
+            )
+        torn = []
+        for slot, scope, reply, expires_at, last_used, checksum in self._db.execute(
+            "SELECT slot, scope, reply, expires_at, last_used, checksum FROM semantic_cache"
+        ).fetchall():
+            if vector_checksum(self._vectors[slot]) != checksum:
+                # The vector was replaced, but the process died before its metadata was
+                torn.append((slot,))
+                continue
+            self._scopes[slot] = scope
+            self._expires_at[slot] = expires_at
+            self._last_used[slot] = last_used
+            self._replies[slot] = reply
+        self._db.executemany("DELETE FROM semantic_cache WHERE slot = ?", torn)
+        self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.ttl_seconds > 0
+
+    def _live(self, key: int, now: float) -> np.ndarray:
+        return (self._scopes == key) & (self._expires_at > now)
+
+    def lookup_many(self, prompts: list[str], scope: str) -> list[str | None]:
+        """Replies for several prompts from one similarity product; None for misses"""
+        if not self.enabled or not prompts:
+            return [None] * len(prompts)
+        queries = self.embedder.embed_many(prompts)
+        now = time.time()
+        results = []
+        with self._lock:
+            live = self._live(scope_key(scope), now)
+            if live.any():
+                similarity = self._vectors @ queries.T
+                similarity[~live] = -np.inf
+                best_slots = similarity.argmax(axis=0)
+                best_scores = similarity[best_slots, np.arange(len(prompts))]
+            else:
+                best_slots = best_scores = [None] * len(prompts)
+            for slot, score in zip(best_slots, best_scores):
+                results.append(self._record(slot, score, now))
+        return results
+
+    def _record(self, slot, score, now: float) -> str | None:
+        if score is not None and score >= self.threshold:
+            self.hits += 1
+            self._last_used[slot] = now
+            SEMANTIC_CACHE_SIMILARITY.observe(float(score), "hit")
+            return self._replies[slot]
+        self.misses += 1
+        if score is None:
+            return None
+        if score >= self.near_miss:
+            self.near_misses += 1
+            SEMANTIC_CACHE_SIMILARITY.observe(float(score), "near_miss")
+        else:
+            SEMANTIC_CACHE_SIMILARITY.observe(max(float(score), 0.0), "miss")
+        return None
+
+    def get(self, prompt: str, scope: str) -> str | None:
+        return self.lookup_many([prompt], scope)[0]
+
+    def set(self, prompt: str, scope: str, reply: str):
+        """Store a reply, replacing a near-identical prompt's entry in the same scope"""
+        if not self.enabled:
+            return
+        vector = self.embedder.embed(prompt)
+        if not vector.any():
+            return
+        key = scope_key(scope)
+        now = time.time()
+        with self._lock:
+            slot = self._choose_slot(vector, key, now)
+            self._vectors[slot] = vector
+            self._scopes[slot] = key
+            self._expires_at[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._replies[slot] = reply
+            if self._db is not None:
+                self._dirty[int(slot)] = (int(slot), key, reply, now + self.ttl_seconds, now,
+                                          vector_checksum(vector))
+        if self._db is not None:
+            self.flush()
+
+    def _choose_slot(self, vector: np.ndarray, key: int, now: float) -> int:
+        live = self._live(key, now)
+        if live.any():
+            similarity = self._vectors @ vector
+            similarity[~live] = -np.inf
+            best = int(similarity.argmax())
+            if similarity[best] >= 0.999:
+                return best
+        free = np.flatnonzero(self._expires_at <= now)
+        if free.size:
+            return int(free[0])
+        self.evictions += 1
+        return int(self._last_used.argmin())
+
+    def flush(self):
+        """Write changed entries to disk: vectors first, then their metadata.
+
+        Each metadata row carries a checksum of its vector, so should a
+        vector be replaced on disk while its old metadata is still stored
+        (the process dying between the two), _load drops the entry.
+        """
+        if self._db is None:
+            return
+        with self._persist_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, {}
+            if not batch:
+                return
+            try:
+                self._vectors.flush()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    list(batch.values()),
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                with self._lock:
+                    self._dirty = {**batch, **self._dirty}
+                raise
+
+    def clear(self):
+        with self._persist_lock, self._lock:
+            self._scopes[:] = 0
+            self._expires_at[:] = 0
+            self._replies = [None] * self.capacity
+            self._dirty = {}
+            if self._db is not None:
+                self._db.execute("DELETE FROM semantic_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters"""
+        with self._lock:
+            return {
+                "size": int(np.count_nonzero(self._expires_at > time.time())),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "near_misses": self.near_misses,
+                "evictions": self.evictions,
+            }
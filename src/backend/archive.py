@@ -0,0 +1,103 @@
+"""Retention job moving idle conversations to the archive, as a background task and a CLI.
+
+    python -m src.backend.archive [--older-than-days 90] [--enable-incremental-vacuum]
+
+Each pass archives every conversation without messages for
+ARCHIVE_AFTER_DAYS, then runs SQLite's incremental_vacuum so the freed
+pages leave the database file. See src/database/archive.py for the format.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
+from src.database.archive import (
+    archive_conversations, enable_incremental_vacuum, incremental_vacuum
+)
+from src.database.database import SessionLocal, engine, init_db
+
+logger = logging.getLogger(__name__)
+
+# Conversations idle for this many days are archived; 0 disables the background job
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+def run_archival(older_than: timedelta) -> dict:
+    """One archival pass followed by incremental_vacuum; returns what it did"""
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        conversations, messages = archive_conversations(db, older_than)
+    pages = incremental_vacuum(engine) if messages else 0
+    return {
+        "conversations": conversations,
+        "messages": messages,
+        "pages_released": pages,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+class Archiver:
+    """Runs run_archival every `interval` seconds while the app is up"""
+
+    def __init__(self, after_days: float = ARCHIVE_AFTER_DAYS,
+                 interval: float = ARCHIVE_INTERVAL_SECONDS):
+        self.after_days = after_days
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0 and self.interval > 0
+
+    async def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                result = await run_in_threadpool(
+                    run_archival, timedelta(days=self.after_days)
+                )
+                if result["messages"]:
+                    logger.info(f"Archived {result['messages']} messages of "
+                                f"{result['conversations']} conversations, released "
+                                f"{result['pages_released']} pages")
+            except Exception as e:
+                logger.error(f"Archiving conversations failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+archiver = Archiver()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Archive idle conversations")
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS or None,
+                        help="Archive conversations idle for this many days")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Rebuild an existing SQLite database in incremental "
+                             "auto-vacuum mode first (takes a full VACUUM)")
+    args = parser.parse_args(argv)
+    if args.older_than_days is None and not args.enable_incremental_vacuum:
+        parser.error("--older-than-days is required unless ARCHIVE_AFTER_DAYS is set")
+
+    init_db()
+    if args.enable_incremental_vacuum and not enable_incremental_vacuum(engine, rebuild=True):
+        parser.error("incremental_vacuum is only available on SQLite")
+    if args.older_than_days is not None:
+        print(json.dumps(run_archival(timedelta(days=args.older_than_days))))
+
+
+if __name__ == "__main__":
+    main()
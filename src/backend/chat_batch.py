@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+
+from fastapi import APIRouter, HTTPException, Request, Security, status
+from fastapi.responses import StreamingResponse
+from src.backend.dependencies import oauth2_scheme
+from src.backend.usage import usage_meter
+from src.api.gemini import UpstreamBusyError, UpstreamError, get_chat_response_async
+from src.utils.jwt import verify_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["chat"])
+
+# Prompts of one batch sent upstream at the same time
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "10000"))
+# Retries for an item rejected by a full upstream queue, with doubling backoff
+CHAT_BATCH_BUSY_RETRIES = int(os.getenv("CHAT_BATCH_BUSY_RETRIES", "3"))
+CHAT_BATCH_BUSY_BACKOFF_SECONDS = float(os.getenv("CHAT_BATCH_BUSY_BACKOFF_SECONDS", "0.5"))
+
+JSONL_MEDIA_TYPES = {"application/x-ndjson", "application/jsonl", "application/json-lines"}
+
+
+def parse_items(body: bytes, content_type: str) -> list:
+    """Split a request body into raw items: one per JSONL line, or per JSON array entry.
+
+    A JSONL line that is not valid JSON becomes a ValueError item, so it is
+    reported at its index instead of failing the batch.
+    """
+    if content_type.split(";")[0].strip().lower() in JSONL_MEDIA_TYPES:
+        items = []
+        for line in body.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f"Invalid JSON: {str(e)}"))
+        return items
+    try:
+        items = json.loads(body)
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or JSONL")
+    return items
+
+def item_prompt(item) -> str:
+    """A prompt given either as a bare string or as {"text": ...}"""
+    if isinstance(item, Exception):
+        raise item
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        return item["text"]
+    raise ValueError('Item must be a string or an object with a "text" string')
+
+async def answer(index: int, item, user: str | None = None) -> dict:
+    """Result line for one item; failures are reported, never raised"""
+    try:
+        prompt = item_prompt(item)
+    except ValueError as e:
+        return {"index": index, "error": str(e), "status": 400}
+
+    if user is not None and usage_meter.exceeded(user):
+        return {"index": index, "error": "Daily token quota exceeded", "status": 429}
+    for attempt in range(CHAT_BATCH_BUSY_RETRIES + 1):
+        try:
+            return {"index": index, "response": await get_chat_response_async(prompt, user=user)}
+        except UpstreamBusyError:
+            if attempt < CHAT_BATCH_BUSY_RETRIES:
+                await asyncio.sleep(CHAT_BATCH_BUSY_BACKOFF_SECONDS * 2 ** attempt)
+        except UpstreamError as e:
+            logger.error(f"Batch item {index} failed: {str(e)}")
+            return {"index": index, "error": "Chat service failed to respond", "status": 502}
+        except Exception as e:
+            logger.exception(f"Batch item {index} failed unexpectedly: {str(e)}")
+            return {"index": index, "error": "Internal error", "status": 500}
+    return {"index": index, "error": "Chat service is busy", "status": 503}
+
+async def batch_results(items: list, user: str | None = None):
+    """Yield JSONL result lines in completion order, then a summary line.
+
+    A fixed pool of workers pulls items in input order. Results pass through
+    a small bounded queue, so a client that reads slowly also slows the
+    workers instead of letting finished replies pile up in memory.
+    """
+    pending = iter(enumerate(items))
+    results = asyncio.Queue(maxsize=CHAT_BATCH_CONCURRENCY)
+
+    async def worker():
+        for index, item in pending:
+            await results.put(await answer(index, item, user))
+
+    workers = [
+        asyncio.create_task(worker()) for _ in range(min(CHAT_BATCH_CONCURRENCY, len(items)))
+    ]
+    errors = 0
+    try:
+        for _ in range(len(items)):
+            result = await results.get()
+            errors += "error" in result
+            yield json.dumps(result) + "\n"
+    finally:
+        # Stops outstanding upstream calls when the client disconnects
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    yield json.dumps({"done": True, "items": len(items), "errors": errors}) + "\n"
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(request: Request, token: str = Security(oauth2_scheme)):
+    """Answer many independent prompts in one request.
+
+    The body is a JSON array, or JSONL when sent as application/x-ndjson.
+    Each item is a prompt string or {"text": ...}. Results stream back as
+    JSONL in completion order, each tagged with its input index, and a
+    failed item is reported on its own line without failing the batch.
+    """
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await usage_meter.check(payload["sub"])
+
+    # Read the whole body first: StreamingResponse consumes the receive channel
+    # while it streams, so the request cannot be read alongside the response.
+    items = parse_items(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch holds at most {CHAT_BATCH_MAX_ITEMS} items",
+        )
+
+    return StreamingResponse(
+        batch_results(items, payload["sub"]),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import os
+import time
+
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Security, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from src.backend import conversations, usage
+from src.backend.dependencies import get_current_user, get_db, oauth2_scheme
+from src.backend.schemas import ChatMessage
+from src.database.database import SessionLocal
+from src.database.models import ChatJob, Conversation, User, utcnow
+from src.api.gemini import UpstreamBusyError, get_chat_response_async
+from src.utils.jwt import verify_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/chat/jobs", tags=["chat"])
+
+# Workers per process; 0 leaves jobs to other processes
+CHAT_JOB_WORKERS = int(os.getenv("CHAT_JOB_WORKERS", "4"))
+# A running job whose worker has not finished it by then is handed out again
+CHAT_JOB_VISIBILITY_TIMEOUT_SECONDS = float(
+    os.getenv("CHAT_JOB_VISIBILITY_TIMEOUT_SECONDS", "120")
+)
+CHAT_JOB_MAX_ATTEMPTS = int(os.getenv("CHAT_JOB_MAX_ATTEMPTS", "3"))
+# Delay before retry N is this times 2**(N-1)
+CHAT_JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("CHAT_JOB_RETRY_BACKOFF_SECONDS", "2"))
+# How often idle workers and long-polls re-check the table for other processes' changes
+CHAT_JOB_POLL_SECONDS = float(os.getenv("CHAT_JOB_POLL_SECONDS", "1"))
+CHAT_JOB_MAX_WAIT_SECONDS = float(os.getenv("CHAT_JOB_MAX_WAIT_SECONDS", "30"))
+
+FINISHED = ("succeeded", "failed")
+
+
+class ChatJobOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    status: str
+    attempts: int
+    conversation_id: int | None
+    response: str | None
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+class LeasedJob(NamedTuple):
+    id: int
+    user_id: int
+    conversation_id: int | None
+    prompt: str
+    # Fencing token: the job's attempts count when this lease was taken
+    attempt: int
+
+
+def enqueue_job(db: Session, user_id: int, prompt: str,
+                conversation_id: int | None = None) -> ChatJob:
+    job = ChatJob(user_id=user_id, prompt=prompt, conversation_id=conversation_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def lease_job(db: Session) -> LeasedJob | None:
+    """Claim the oldest due job for CHAT_JOB_VISIBILITY_TIMEOUT_SECONDS.
+
+    A job is due when it is queued and its retry delay has passed, or when
+    it is running under a lapsed lease because its worker died. The claim
+    is one UPDATE guarded by the same condition, so two workers racing for
+    a row cannot both win it. Lapsed jobs with no attempts left are failed.
+    """
+    now = utcnow()
+    db.execute(
+        update(ChatJob)
+        .where(ChatJob.status == "running", ChatJob.available_at <= now,
+               ChatJob.attempts >= CHAT_JOB_MAX_ATTEMPTS)
+        .values(status="failed", error="Lease expired on the last attempt", finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    due = (
+        ChatJob.status.in_(("queued", "running")),
+        ChatJob.available_at <= now,
+        ChatJob.attempts < CHAT_JOB_MAX_ATTEMPTS,
+    )
+    next_id = (
+        select(ChatJob.id).where(*due).order_by(ChatJob.available_at, ChatJob.id).limit(1)
+        .scalar_subquery()
+    )
+    row = db.execute(
+        update(ChatJob)
+        .where(ChatJob.id == next_id, *due)
+        .values(
+            status="running", attempts=ChatJob.attempts + 1,
+            available_at=now + timedelta(seconds=CHAT_JOB_VISIBILITY_TIMEOUT_SECONDS),
+        )
+        .returning(ChatJob.id, ChatJob.user_id, ChatJob.conversation_id, ChatJob.prompt,
+                   ChatJob.attempts)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return LeasedJob(*row) if row else None
+
+def update_leased(db: Session, job: LeasedJob, **values) -> bool:
+    """Apply `values` if `job` still holds its lease; the caller commits"""
+    result = db.execute(
+        update(ChatJob)
+        .where(ChatJob.id == job.id, ChatJob.status == "running",
+               ChatJob.attempts == job.attempt)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def load_history(db: Session, job: LeasedJob):
+    """Conversation context for a job, or None for a standalone prompt"""
+    if job.conversation_id is None:
+        return None
+    conversation = db.get(Conversation, job.conversation_id)
+    return conversations.load_context(db, conversation, job.prompt)
+
+def load_job_input(db: Session, job: LeasedJob):
+    """The job owner's username, who is billed for the reply, and its context"""
+    return db.get(User, job.user_id).username, load_history(db, job)
+
+def complete_job(db: Session, job: LeasedJob, reply: str) -> bool:
+    """Store the reply, and the exchange for conversation jobs, in one transaction.
+
+    Returns False, storing nothing, when the lease was lost to another worker.
+    """
+    if not update_leased(db, job, status="succeeded", response=reply, error=None,
+                         finished_at=utcnow()):
+        db.rollback()
+        return False
+    if job.conversation_id is None:
+        db.commit()
+    else:
+        conversations.save_exchange(db, job.conversation_id, job.prompt, reply)
+    return True
+
+def fail_job(db: Session, job: LeasedJob, error: str) -> bool:
+    """Queue the job for a retry with backoff, or fail it once attempts run out"""
+    now = utcnow()
+    if job.attempt < CHAT_JOB_MAX_ATTEMPTS:
+        delay = CHAT_JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempt - 1)
+        updated = update_leased(db, job, status="queued", error=error,
+                                available_at=now + timedelta(seconds=delay))
+    else:
+        updated = update_leased(db, job, status="failed", error=error, finished_at=now)
+    db.commit()
+    return updated
+
+def release_job(db: Session, job: LeasedJob, delay: float = 0) -> bool:
+    """Hand an interrupted job back without using up an attempt"""
+    updated = update_leased(db, job, status="queued",
+                            available_at=utcnow() + timedelta(seconds=delay),
+                            attempts=job.attempt - 1)
+    db.commit()
+    return updated
+
+def in_session(func, *args):
+    with SessionLocal() as db:
+        return func(db, *args)
+
+
+class JobWorkerPool:
+    """Asyncio workers that lease chat jobs and answer them.
+
+    Idle workers sleep until a job is submitted in this process, or for
+    CHAT_JOB_POLL_SECONDS to pick up jobs submitted elsewhere. Long-polls
+    are woken whenever a local worker finishes a job.
+    """
+
+    def __init__(self, workers: int = CHAT_JOB_WORKERS):
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self._submitted = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._loop = None
+
+    def start(self):
+        self._bind_loop()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify_submitted(self):
+        self._submitted.set()
+
+    def _bind_loop(self):
+        # Events belong to one event loop; tests run apps on several in turn
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._submitted = asyncio.Event()
+            self._finished = asyncio.Event()
+
+    def finished_event(self) -> asyncio.Event:
+        """Event set the next time a local worker finishes any job"""
+        self._bind_loop()
+        return self._finished
+
+    def _notify_finished(self):
+        finished, self._finished = self._finished, asyncio.Event()
+        finished.set()
+
+    async def _run(self):
+        while True:
+            try:
+                job = await run_in_threadpool(in_session, lease_job)
+            except Exception as e:
+                logger.error(f"Leasing a chat job failed: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._submitted.wait(), CHAT_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._submitted.clear()
+                continue
+            await self.process(job)
+
+    async def process(self, job: LeasedJob):
+        try:
+            username, context = await run_in_threadpool(in_session, load_job_input, job)
+            reply = await get_chat_response_async(
+                job.prompt, history=context.contents if context else None, user=username
+            )
+            done = await run_in_threadpool(in_session, complete_job, job, reply)
+        except asyncio.CancelledError:
+            await run_in_threadpool(in_session, release_job, job)
+            raise
+        except UpstreamBusyError:
+            # Local backpressure, not a failure of the job: retry after a poll interval
+            logger.warning(f"Chat job {job.id} deferred: too many pending upstream requests")
+            await run_in_threadpool(in_session, release_job, job, CHAT_JOB_POLL_SECONDS)
+            return
+        except Exception as e:
+            logger.error(f"Chat job {job.id} attempt {job.attempt} failed: {str(e)}")
+            await run_in_threadpool(in_session, fail_job, job, str(e))
+            self._notify_finished()
+            return
+        if not done:
+            logger.warning(f"Chat job {job.id} lease lapsed before attempt {job.attempt} finished")
+        elif context is not None and conversations.should_summarize(context):
+            conversations.schedule_summary(job.conversation_id, context.oldest_included_id)
+        self._notify_finished()
+
+worker_pool = JobWorkerPool()
+
+
+def get_owned_job(db: Session, job_id: int, username: str) -> ChatJobOut:
+    job = db.scalar(
+        select(ChatJob).join(User, ChatJob.user_id == User.id)
+        .where(ChatJob.id == job_id, User.username == username)
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ChatJobOut.model_validate(job)
+
+@router.post("", response_model=ChatJobOut, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(message: ChatMessage, user: User = Depends(get_current_user),
+                     db: Session = Depends(get_db)):
+    """Queue a chat prompt and return its job at once; poll GET /chat/jobs/{id}"""
+    await usage.usage_meter.check(user.username)
+    if message.conversation_id is not None:
+        await run_in_threadpool(
+            conversations.get_owned_conversation, db, message.conversation_id, user.username
+        )
+    job = await run_in_threadpool(
+        enqueue_job, db, user.id, message.text, message.conversation_id
+    )
+    worker_pool.notify_submitted()
+    return job
+
+@router.get("/{job_id}", response_model=ChatJobOut)
+async def get_job(job_id: int, wait: float = Query(0, ge=0, le=CHAT_JOB_MAX_WAIT_SECONDS),
+                  token: str = Security(oauth2_scheme)):
+    """Current state of a job; with `wait`, hold the request up to that many
+    seconds until the job has succeeded or failed.
+
+    Authenticates from the token alone so no database session is held open
+    while waiting.
+    """
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    deadline = time.monotonic() + wait
+    while True:
+        # Taken before the read so a job finishing in between still wakes us
+        finished = worker_pool.finished_event()
+        job = await run_in_threadpool(in_session, get_owned_job, job_id, payload["sub"])
+        remaining = deadline - time.monotonic()
+        if job.status in FINISHED or remaining <= 0:
+            return job
+        try:
+            await asyncio.wait_for(finished.wait(), min(remaining, CHAT_JOB_POLL_SECONDS))
+        except asyncio.TimeoutError:
+            pass
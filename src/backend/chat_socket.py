@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from src.backend import conversations
+from src.backend.usage import usage_meter
+from src.backend.schemas import ChatMessage
+from src.database.database import init_db_async
+from src.api.gemini import UpstreamBusyError, stream_chat_response
+from src.utils.jwt import verify_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["chat"])
+
+# Reply chunks buffered between the upstream stream and a slow reader
+WS_CHAT_SEND_QUEUE = int(os.getenv("WS_CHAT_SEND_QUEUE", "16"))
+# A client that leaves a chunk unread this long is disconnected
+WS_CHAT_SEND_TIMEOUT = float(os.getenv("WS_CHAT_SEND_TIMEOUT", "30"))
+
+# Application close codes live in the 4000-4999 range
+TOKEN_EXPIRED_CLOSE_CODE = 4001
+
+
+class SlowClientError(Exception):
+    """Raised when the client stops reading the reply stream"""
+
+
+def socket_token(websocket: WebSocket) -> str | None:
+    """Bearer token from the Authorization header, or the `token` query parameter.
+
+    Browsers cannot set headers on a WebSocket handshake, hence the fallback.
+    """
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return websocket.query_params.get("token")
+
+async def pump_reply(chunks, queue: asyncio.Queue):
+    """Move upstream chunks into the bounded queue, ending with an end or error item.
+
+    put() blocks while the queue is full, so a slow reader stops the upstream
+    stream from being consumed instead of buffering the whole reply.
+    """
+    try:
+        async for chunk in chunks:
+            await queue.put(("chunk", chunk))
+    except UpstreamBusyError:
+        await queue.put(("error", "Chat service is busy, please retry shortly"))
+    except Exception as e:
+        # Upstream error text stays in the log, as for /chat
+        logger.error(f"Gemini streaming failed: {str(e)}")
+        await queue.put(("error", "Chat service failed to respond, please retry"))
+    else:
+        await queue.put(("end", None))
+
+async def send_frame(websocket: WebSocket, frame: dict):
+    try:
+        await asyncio.wait_for(websocket.send_json(frame), WS_CHAT_SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise SlowClientError(f"Client did not read for {WS_CHAT_SEND_TIMEOUT}s")
+
+async def stream_reply(websocket: WebSocket, prompt: str, history: list[dict] | None,
+                       username: str | None = None) -> str | None:
+    """Send one reply as chunk frames; return its full text, or None if it failed"""
+    queue = asyncio.Queue(maxsize=WS_CHAT_SEND_QUEUE)
+    producer = asyncio.create_task(
+        pump_reply(stream_chat_response(prompt, history, user=username), queue)
+    )
+    parts = []
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "chunk":
+                parts.append(value)
+                await send_frame(websocket, {"type": "chunk", "text": value})
+            elif kind == "error":
+                await send_frame(websocket, {"type": "error", "detail": value})
+                return None
+            else:
+                return "".join(parts)
+    finally:
+        # Releases the upstream gate slot if the client went away mid-reply
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+async def handle_message(websocket: WebSocket, username: str, message: ChatMessage):
+    conversation_id = context = None
+    try:
+        await usage_meter.check(username)
+        if message.conversation_id is not None:
+            conversation_id, context = await run_in_threadpool(
+                conversations.load_conversation, message.conversation_id, username, message.text
+            )
+    except HTTPException as e:
+        await send_frame(websocket, {"type": "error", "detail": e.detail})
+        return
+
+    reply = await stream_reply(
+        websocket, message.text, context.contents if context else None, username
+    )
+    if reply is None:
+        return
+    if conversation_id is None:
+        await send_frame(websocket, {"type": "end"})
+        return
+    await conversations.store_exchange(conversation_id, message.text, reply)
+    await send_frame(websocket, {"type": "end", "conversation_id": conversation_id})
+    if conversations.should_summarize(context):
+        conversations.schedule_summary(conversation_id, context.oldest_included_id)
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """Chat over one socket, authenticated once when it connects.
+
+    Each text frame is a ChatMessage as JSON. The reply comes back as
+    {"type": "chunk"} frames followed by {"type": "end"}, or by a single
+    {"type": "error"} frame. Messages are answered one at a time, in order.
+    When the token expires the socket is closed with code 4001; a reply
+    already being streamed is finished first.
+    """
+    payload = verify_token(socket_token(websocket) or "")
+    if not payload:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+        return
+    expires_at = float(payload.get("exp", "inf"))
+    await init_db_async()
+    await websocket.accept()
+
+    try:
+        while (remaining := expires_at - time.time()) > 0:
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), remaining)
+            except asyncio.TimeoutError:
+                break
+            try:
+                message = ChatMessage.model_validate_json(raw)
+            except ValidationError as e:
+                await send_frame(websocket, {"type": "error", "detail": e.errors(
+                    include_url=False, include_context=False, include_input=False
+                )})
+                continue
+            await handle_message(websocket, payload["sub"], message)
+        await websocket.close(code=TOKEN_EXPIRED_CLOSE_CODE, reason="Token expired")
+    except WebSocketDisconnect:
+        pass
+    except SlowClientError as e:
+        logger.warning(f"Closing chat socket for {payload['sub']}: {str(e)}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Client too slow")
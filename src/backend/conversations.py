@@ -0,0 +1,236 @@
+import asyncio
+import base64
+import logging
+
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from src.backend.dependencies import get_current_user, get_db
+from src.database.database import SessionLocal
+from src.database.archive import read_archived
+from src.database.models import Conversation, Message, User
+from src.database.writer import message_writer
+from src.api.context import (
+    CHAT_CONTEXT_MAX_TURNS, CHAT_SUMMARY_ENABLED, CHAT_SUMMARY_MIN_TURNS,
+    ChatContext, Turn, build_context, estimate_tokens, summary_prompt
+)
+from src.api.gemini import generate_summary
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/conversations", tags=["conversations"])
+
+# Summary refreshes started outside a request; kept so they are not collected mid-run
+_summary_tasks: set[asyncio.Task] = set()
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class ConversationCreate(BaseModel):
+    title: str | None = Field(None, max_length=200)
+
+class ConversationOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str | None
+    created_at: datetime
+
+class ConversationPage(BaseModel):
+    items: list[ConversationOut]
+    next_cursor: str | None
+
+class MessageOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    role: str
+    content: str
+    created_at: datetime
+
+class MessagePage(BaseModel):
+    items: list[MessageOut]
+    next_cursor: int | None
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def get_owned_conversation(db: Session, conversation_id: int, username: str) -> Conversation:
+    """Fetch a conversation belonging to `username`, or fail with 404"""
+    conversation = (
+        db.query(Conversation)
+        .join(User, Conversation.user_id == User.id)
+        .filter(Conversation.id == conversation_id, User.username == username)
+        .first()
+    )
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+def exchange_rows(conversation_id: int, prompt: str, reply: str) -> list[dict]:
+    """Message column values for a user prompt and the model reply"""
+    return [
+        {"conversation_id": conversation_id, "role": role, "content": content,
+         "token_count": estimate_tokens(content)}
+        for role, content in (("user", prompt), ("model", reply))
+    ]
+
+def save_exchange(db: Session, conversation_id: int, prompt: str, reply: str):
+    """Store a user prompt and the model reply in the caller's transaction, and commit"""
+    db.add_all([Message(**row) for row in exchange_rows(conversation_id, prompt, reply)])
+    db.commit()
+
+async def store_exchange(conversation_id: int, prompt: str, reply: str):
+    """Store an exchange through the group-commit writer; returns once it is committed"""
+    await message_writer.write(exchange_rows(conversation_id, prompt, reply))
+
+def load_turns(db: Session, conversation_id: int, after_id: int | None,
+               limit: int = CHAT_CONTEXT_MAX_TURNS, up_to_id: int | None = None) -> list[Turn]:
+    """Load up to `limit` of the newest messages after `after_id`, oldest first.
+
+    Archived messages are all older than live ones, so they are only read
+    when the live rows run out.
+    """
+    query = db.query(Message.id, Message.role, Message.content, Message.token_count).filter(
+        Message.conversation_id == conversation_id
+    )
+    if after_id is not None:
+        query = query.filter(Message.id > after_id)
+    if up_to_id is not None:
+        query = query.filter(Message.id <= up_to_id)
+    rows = query.order_by(Message.id.desc()).limit(limit).all()
+    if len(rows) < limit:
+        before = rows[-1].id if rows else (up_to_id + 1 if up_to_id is not None else None)
+        rows += [
+            (message.id, message.role, message.content, message.token_count)
+            for message in read_archived(db, conversation_id, before=before, after=after_id,
+                                         limit=limit - len(rows))
+        ]
+    return [Turn(*row) for row in reversed(rows)]
+
+def load_context(db: Session, conversation: Conversation, prompt: str) -> ChatContext:
+    """Assemble the budgeted history for the next prompt in `conversation`"""
+    turns = load_turns(db, conversation.id, conversation.summary_message_id)
+    return build_context(turns, prompt, summary=conversation.summary)
+
+def load_conversation(conversation_id: int, username: str, prompt: str) -> tuple[int, ChatContext]:
+    """Ownership check and history for one message, in a short-lived session.
+
+    For async handlers: the connection goes back to the pool before the
+    upstream call instead of being held until the response is sent.
+    """
+    with SessionLocal() as db:
+        conversation = get_owned_conversation(db, conversation_id, username)
+        return conversation.id, load_context(db, conversation, prompt)
+
+def should_summarize(context: ChatContext) -> bool:
+    return (
+        CHAT_SUMMARY_ENABLED
+        and context.oldest_included_id is not None
+        and context.dropped_turns >= CHAT_SUMMARY_MIN_TURNS
+    )
+
+async def refresh_summary(conversation_id: int, before_id: int):
+    """Fold every unsummarized message older than `before_id` into the summary.
+
+    Runs as a background task after the reply has been sent, with its own
+    session. Failures are logged and leave the previous summary in place.
+    """
+    def load():
+        with SessionLocal() as db:
+            conversation = db.get(Conversation, conversation_id)
+            turns = load_turns(db, conversation_id, conversation.summary_message_id,
+                               limit=CHAT_CONTEXT_MAX_TURNS, up_to_id=before_id - 1)
+            return conversation.summary, turns
+
+    def store(summary: str, up_to_id: int):
+        with SessionLocal() as db:
+            conversation = db.get(Conversation, conversation_id)
+            conversation.summary = summary
+            conversation.summary_message_id = up_to_id
+            db.commit()
+
+    try:
+        previous, turns = await run_in_threadpool(load)
+        if not turns:
+            return
+        summary = await generate_summary(summary_prompt(previous, turns))
+        await run_in_threadpool(store, summary, turns[-1].id)
+    except Exception as e:
+        logger.error(f"Summarizing conversation {conversation_id} failed: {str(e)}")
+
+def schedule_summary(conversation_id: int, before_id: int):
+    """Run refresh_summary in the background where no BackgroundTasks is at hand"""
+    task = asyncio.create_task(refresh_summary(conversation_id, before_id))
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+
+@router.post("", response_model=ConversationOut)
+def create_conversation(data: ConversationCreate, user: User = Depends(get_current_user),
+                        db: Session = Depends(get_db)):
+    conversation = Conversation(user_id=user.id, title=data.title)
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
+
+@router.get("", response_model=ConversationPage)
+def list_conversations(cursor: str | None = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                       user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """List the user's conversations, newest first.
+
+    Pages are fetched by seeking past the (created_at, id) of the previous
+    page's last row, which walks ix_conversations_user_created directly
+    instead of skipping rows as OFFSET would.
+    """
+    query = db.query(Conversation).filter(Conversation.user_id == user.id)
+    if cursor:
+        query = query.filter(
+            tuple_(Conversation.created_at, Conversation.id) < tuple_(*decode_cursor(cursor))
+        )
+    rows = (
+        query.order_by(Conversation.created_at.desc(), Conversation.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    items, has_more = rows[:limit], len(rows) > limit
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/{conversation_id}/messages", response_model=MessagePage)
+def list_messages(conversation_id: int, before: int | None = None,
+                  limit: int = Query(DEFAULT_PAGE_SIZE * 2, ge=1, le=MAX_PAGE_SIZE),
+                  user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Return the latest messages, or those older than message id `before`.
+
+    Items are in chronological order; pass `next_cursor` back as `before` to
+    load the previous page. Pages reaching into archived messages read them
+    from their segment files.
+    """
+    get_owned_conversation(db, conversation_id, user.username)
+    query = db.query(Message).filter(Message.conversation_id == conversation_id)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        rows += read_archived(db, conversation_id, before=rows[-1].id if rows else before,
+                              limit=limit + 1 - len(rows))
+    items, has_more = rows[:limit], len(rows) > limit
+    items.reverse()
+    return {"items": items, "next_cursor": items[0].id if has_more else None}
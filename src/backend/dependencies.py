@@ -0,0 +1,54 @@
+import os
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
+from src.database.database import (
+    AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal, init_db, init_db_async
+)
+from src.database.models import User
+from src.utils.jwt import verify_token
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+# Comma-separated usernames allowed to call /admin endpoints
+ADMIN_USERNAMES = {
+    name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()
+}
+
+# Dependency to get DB session
+def get_db():
+    init_db()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get an async DB session for handlers running on the event loop
+async def get_async_db():
+    await init_db_async()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Read-only variant for lookups, so they never queue behind the writer
+async def get_async_read_db():
+    await init_db_async()
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """Resolve the bearer token to its User, or fail with 401"""
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = db.query(User).filter(User.username == payload.get("sub")).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user
+
+def require_admin(user: User = Depends(get_current_user)) -> User:
+    """Allow only users listed in ADMIN_USERNAMES, otherwise fail with 403"""
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return user
@@ -1,98 +1,218 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Security
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from src.database.database import SessionLocal, init_db
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, status, Security, BackgroundTasks
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database.database import (
+    init_db_async, AsyncSessionLocal, async_engine, async_read_engine
+)
 from src.database.models import User
-from src.utils.password import verify_password, hash_password
-from src.utils.jwt import create_access_token, verify_token
-from src.api.gemini import get_chat_response
-from datetime import timedelta
+from src.database.writer import message_writer
+from src.backend.dependencies import oauth2_scheme, get_async_db, get_async_read_db
+from src.backend import (
+    archive, chat_batch, chat_jobs, chat_socket, conversations, metrics, search, tokens, usage,
+    user_import
+)
+from src.utils.password import (
+    hash_password_async, verify_password_async, needs_rehash, shutdown_password_pool
+)
+from src.utils.jwt import verify_token
+from src.api.gemini import (
+    get_chat_response_async, semantic_cache, stream_chat_response, upstream_gate,
+    UpstreamBusyError, UpstreamError
+)
+from contextlib import asynccontextmanager
+import json
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Core routes; create_app() mounts them next to the feature routers
+router = APIRouter()
 
-app = FastAPI()
-
-# Initialize database
-init_db()
-
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-from pydantic import BaseModel, Field, EmailStr
-
-class UserRegistration(BaseModel):
-    username: str = Field(..., min_length=3, max_length=50)
-    email: EmailStr = Field(..., min_length=5, max_length=100)
-    password: str = Field(..., min_length=6, max_length=100)
-
-class ChatMessage(BaseModel):
-    text: str
+from src.backend.schemas import ChatMessage, UserRegistration
 
 import logging
 logger = logging.getLogger(__name__)
 
-@app.post("/register")
-def register_user(user_data: UserRegistration, db: Session = Depends(get_db)):
+@router.post("/register")
+async def register_user(user_data: UserRegistration, db: AsyncSession = Depends(get_async_db)):
     
     # Check if username already exists
-    existing_username = db.query(User).filter(User.username == user_data.username).first()
+    existing_username = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_username:
         logger.warning(f"Registration attempt for existing username: {user_data.username}")
         raise HTTPException(status_code=400, detail="Username already registered")
     
     # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
+    existing_email = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_email:
         logger.warning(f"Registration attempt for existing email: {user_data.email}")
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    hashed_password = hash_password(user_data.password)
+    # Create new user; bcrypt runs on the password pool, off the event loop
+    hashed_password = await hash_password_async(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
         hashed_password=hashed_password
     )
     db.add(new_user)
-    db.commit()
+    await db.commit()
     logger.info(f"Successfully registered user: {user_data.username}")
     return {"message": "User created successfully"}
 
-@app.post("/login")
-def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+@router.post("/login")
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends(),
+                     db: AsyncSession = Depends(get_async_read_db)):
+    user = await db.scalar(select(User).where(User.username == form_data.username))
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Upgrade hashes made with an old work factor while the plaintext is at hand
+    if needs_rehash(user.hashed_password):
+        new_hash = await hash_password_async(form_data.password)
+        async with AsyncSessionLocal() as write_db:
+            await write_db.execute(
+                update(User).where(User.id == user.id).values(hashed_password=new_hash)
+            )
+            await write_db.commit()
+        logger.info(f"Rehashed password for user: {user.username}")
     
-    access_token = create_access_token(
-        data={"sub": user.username},
-        expires_delta=timedelta(minutes=30)
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    async with AsyncSessionLocal() as write_db:
+        refresh_token = await tokens.issue_refresh_token(write_db, user.id)
+    return tokens.token_response(user.username, refresh_token)
 
-@app.get("/protected")
+@router.get("/protected")
 def protected_route(token: str = Depends(oauth2_scheme)):
     payload = verify_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return {"message": "This is a protected route", "user": payload["sub"]}
 
-@app.post("/chat")
-def chat_endpoint(message: ChatMessage, token: str = Security(oauth2_scheme)):
+def upstream_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Chat service is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+@router.post("/chat")
+async def chat_endpoint(message: ChatMessage, background_tasks: BackgroundTasks,
+                        token: str = Security(oauth2_scheme)):
     payload = verify_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Not authenticated")
+    await usage.usage_meter.check(payload["sub"])
+
+    conversation_id = context = None
+    if message.conversation_id is not None:
+        # Check ownership before spending any upstream quota
+        conversation_id, context = await run_in_threadpool(
+            conversations.load_conversation, message.conversation_id, payload["sub"],
+            message.text
+        )
     
     # Get response from Gemini
-    response_text = get_chat_response(message.text)
-    return {"response": response_text}
+    try:
+        response_text = await get_chat_response_async(
+            message.text, history=context.contents if context else None, user=payload["sub"]
+        )
+    except UpstreamBusyError:
+        raise upstream_busy()
+    except UpstreamError as e:
+        logger.error(f"Chat upstream failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Chat service failed to respond, please retry",
+        )
+
+    if conversation_id is None:
+        return {"response": response_text}
+    await conversations.store_exchange(conversation_id, message.text, response_text)
+    if conversations.should_summarize(context):
+        background_tasks.add_task(
+            conversations.refresh_summary, conversation_id, context.oldest_included_id
+        )
+    return {"response": response_text, "conversation_id": conversation_id}
+
+def format_sse(data: dict, event: str | None = None) -> str:
+    """Encode a payload as a single server-sent event frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+async def sse_chat_events(prompt: str, user: str | None = None):
+    """Relay Gemini chunks as SSE frames, closing with an end or error event"""
+    try:
+        async for chunk in stream_chat_response(prompt, user=user):
+            yield format_sse({"text": chunk})
+    except Exception as e:
+        # Upstream error text stays in the log, as for /chat
+        logger.error(f"Gemini streaming failed: {str(e)}")
+        yield format_sse({"detail": "Chat service failed to respond, please retry"},
+                         event="error")
+        return
+    yield format_sse({}, event="end")
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(message: ChatMessage, token: str = Security(oauth2_scheme)):
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await usage.usage_meter.check(payload["sub"])
+    # Reject before the 200 goes out; a race past this check becomes an error event
+    if upstream_gate.is_full():
+        raise upstream_busy()
+
+    return StreamingResponse(
+        sse_chat_events(message.text, payload["sub"]),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream and delaying the first token
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db_async()
+    await tokens.revocation_sync.start()
+    await usage.usage_meter.start()
+    chat_jobs.worker_pool.start()
+    await archive.archiver.start()
+    yield
+    await archive.archiver.stop()
+    await chat_jobs.worker_pool.stop()
+    # Chat requests are done by now; commit the messages they queued
+    await run_in_threadpool(message_writer.stop)
+    # After the workers, so usage of jobs they finished is written too
+    await usage.usage_meter.stop()
+    await tokens.revocation_sync.stop()
+    if semantic_cache is not None:
+        await run_in_threadpool(semantic_cache.flush)
+    await run_in_threadpool(shutdown_password_pool)
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+def create_app() -> FastAPI:
+    """Build the API application.
+
+    Nothing slow happens here: tables are created at startup (or on first
+    use), and the Gemini SDK is imported and configured on the first call.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(router)
+    app.include_router(chat_batch.router)
+    app.include_router(chat_jobs.router)
+    app.include_router(chat_socket.router)
+    app.include_router(conversations.router)
+    app.include_router(search.router)
+    app.include_router(tokens.router)
+    app.include_router(usage.router)
+    app.include_router(user_import.router)
+    app.include_router(metrics.router)
+    return app
+
+app = create_app()
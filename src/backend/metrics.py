@@ -0,0 +1,86 @@
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from src.api.gemini import (
+    provider_router, request_coalescer, response_cache, semantic_cache, upstream_gate
+)
+from src.utils.metrics import (
+    CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, gauge_lines, registry
+)
+
+router = APIRouter(tags=["metrics"])
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency by route template and status.
+
+    Written against raw ASGI rather than BaseHTTPMiddleware so streaming
+    responses pass through untouched; their latency covers the whole stream.
+    Unmatched paths share one "unmatched" route label to bound cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method)
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, method,
+                getattr(route, "path", "unmatched"), str(status_code),
+            )
+
+
+def chat_collector():
+    """Scrape-time gauges read from the chat cache, coalescer, gate and providers"""
+    cache = response_cache.stats()
+    yield from gauge_lines(
+        "chat_cache", "Chat reply cache counters and size", cache, "stat"
+    )
+    if semantic_cache is not None:
+        yield from gauge_lines(
+            "semantic_cache", "Semantic reply cache counters and size", semantic_cache.stats(),
+            "stat",
+        )
+    yield from gauge_lines(
+        "chat_coalescer", "Request coalescing counters", request_coalescer.stats(), "stat"
+    )
+    yield from gauge_lines(
+        "gemini_gate", "Upstream concurrency gate occupancy",
+        {"in_flight": upstream_gate.in_flight, "waiting": upstream_gate.waiting}, "state",
+    )
+    providers = provider_router.stats()
+    yield from gauge_lines(
+        "llm_circuit_open", "1 while a provider's circuit breaker is refusing calls",
+        {name: int(stats["circuit_open"]) for name, stats in providers.items()}, "provider",
+    )
+    yield from gauge_lines(
+        "llm_latency_p95_seconds", "p95 of recent successful calls, which sets the hedge delay",
+        {name: stats["p95_seconds"] or 0 for name, stats in providers.items()}, "provider",
+    )
+
+registry.add_collector(chat_collector)
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
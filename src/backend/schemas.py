@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field, EmailStr
+
+class UserRegistration(BaseModel):
+    username: str = Field(..., min_length=3, max_length=50)
+    email: EmailStr = Field(..., min_length=5, max_length=100)
+    password: str = Field(..., min_length=6, max_length=100)
+
+class ChatMessage(BaseModel):
+    text: str
+    # When set, the exchange is stored in this conversation of the caller
+    conversation_id: int | None = None
@@ -0,0 +1,135 @@
+import base64
+import re
+
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+from src.backend.dependencies import get_current_user, get_db
+from src.database.models import User
+from src.database.search import FTS_TABLE, has_search_index, owner_token
+
+router = APIRouter(tags=["search"])
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_TERMS = 16
+# Tokens of context around the matches in each snippet
+SNIPPET_TOKENS = 12
+
+# A "quoted phrase", or a bare word that may end in * for a prefix match
+TERM_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# bm25 weights: matches in `content` count, the `owner` scope term does not
+RANKED_HITS = f"""
+SELECT rowid, rank FROM {FTS_TABLE}
+WHERE {FTS_TABLE} MATCH :match AND rank MATCH 'bm25(1.0, 0.0)'
+{{after}}
+ORDER BY rank, rowid
+LIMIT :limit
+"""
+
+HIT_DETAILS = text(f"""
+SELECT {FTS_TABLE}.rowid,
+       snippet({FTS_TABLE}, 0, '<mark>', '</mark>', '…', :tokens) AS snippet,
+       messages.conversation_id, messages.role, messages.created_at
+FROM {FTS_TABLE} JOIN messages ON messages.id = {FTS_TABLE}.rowid
+WHERE {FTS_TABLE} MATCH :match AND {FTS_TABLE}.rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+class SearchHit(BaseModel):
+    message_id: int
+    conversation_id: int
+    role: str
+    snippet: str
+    created_at: datetime
+    # bm25 relevance; higher is better
+    score: float
+
+class SearchPage(BaseModel):
+    items: list[SearchHit]
+    next_cursor: str | None
+
+
+def build_match(query: str, user_id: int) -> str:
+    """Turn a user query into an FTS5 expression scoped to the user's messages.
+
+    Every term must match. Terms are quoted, so FTS5 operators and column
+    filters typed by the user are searched for as plain words and cannot
+    widen the owner scope.
+    """
+    terms = []
+    for phrase, word in TERM_PATTERN.findall(query):
+        term, prefix = (phrase, False) if phrase else (word.rstrip("*"), word.endswith("*"))
+        if term.strip():
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no terms")
+    if len(terms) > MAX_QUERY_TERMS:
+        raise HTTPException(
+            status_code=400, detail=f"Search queries hold at most {MAX_QUERY_TERMS} terms"
+        )
+    return f"owner : {owner_token(user_id)} AND content : ({' '.join(terms)})"
+
+def encode_cursor(rank: float, row_id: int) -> str:
+    """Opaque cursor pointing just past (rank, rowid); repr keeps the float exact"""
+    return base64.urlsafe_b64encode(f"{rank!r}|{row_id}".encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, row_id = base64.urlsafe_b64decode(cursor).decode("utf-8").split("|")
+        return float(rank), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def search_messages(db: Session, user_id: int, query: str, limit: int = DEFAULT_PAGE_SIZE,
+                    cursor: str | None = None) -> dict:
+    """Best matches first, in pages keyed on (bm25 rank, rowid).
+
+    Ranking reads only the index. Snippets and message metadata are then
+    fetched for the one page being returned, not for every match.
+    """
+    params = {"match": build_match(query, user_id), "limit": limit + 1}
+    after = ""
+    if cursor:
+        params["rank"], params["row_id"] = decode_cursor(cursor)
+        after = "AND (rank > :rank OR (rank = :rank AND rowid > :row_id))"
+    hits = db.execute(text(RANKED_HITS.format(after=after)), params).all()
+    hits, has_more = hits[:limit], len(hits) > limit
+    if not hits:
+        return {"items": [], "next_cursor": None}
+
+    rows = db.execute(HIT_DETAILS, {
+        "match": params["match"], "tokens": SNIPPET_TOKENS, "ids": [hit.rowid for hit in hits]
+    })
+    details = {row.rowid: row for row in rows}
+    items = [
+        SearchHit(
+            message_id=hit.rowid,
+            conversation_id=details[hit.rowid].conversation_id,
+            role=details[hit.rowid].role,
+            snippet=details[hit.rowid].snippet,
+            created_at=details[hit.rowid].created_at,
+            score=-hit.rank,
+        )
+        for hit in hits if hit.rowid in details
+    ]
+    next_cursor = encode_cursor(hits[-1].rank, hits[-1].rowid) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/search", response_model=SearchPage)
+def search_endpoint(q: str = Query(..., min_length=1, max_length=500),
+                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                    cursor: str | None = None,
+                    user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Search the user's stored messages, best match first.
+
+    Words must all appear (in stemmed form); use "quotes" for a phrase and
+    a trailing * for a prefix. Pass `next_cursor` back as `cursor` for the
+    next page.
+    """
+    if not has_search_index(db):
+        raise HTTPException(status_code=501, detail="Search requires SQLite with FTS5")
+    return search_messages(db, user.id, q, limit, cursor)
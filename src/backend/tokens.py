@@ -0,0 +1,236 @@
+"""Refresh tokens, logout, and the database side of access-token revocation.
+
+Login hands out a short-lived access token and a refresh token. The refresh
+token is exchanged at /token/refresh for a new pair without a password
+check, and each one works once: its replacement belongs to the same family,
+and presenting an already-used token revokes the whole family, since one
+copy of it is in the wrong hands.
+
+Revoked access tokens are stored by jti in revoked_tokens. verify_token
+asks the in-memory revocation_list first and only confirms its rare
+matches here. RevocationSync copies revocations made by other processes
+into this process's filter.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+
+from datetime import UTC, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Security, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from src.backend.dependencies import get_async_db, oauth2_scheme
+from src.database.database import SessionLocal
+from src.database.models import RefreshToken, RevokedToken, User, utcnow
+from src.utils.jwt import create_access_token, revocation_list, revoke_token, verify_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["auth"])
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# How often each process loads revocations made by other processes
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    # Also ends the login this refresh token belongs to
+    refresh_token: str | None = None
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def token_response(username: str, refresh_token: str) -> dict:
+    return {
+        "access_token": create_access_token(data={"sub": username}),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
+
+def invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def issue_refresh_token(db: AsyncSession, user_id: int,
+                              family_id: str | None = None) -> str:
+    """Store a new refresh token, starting a new family unless one is given"""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    await db.commit()
+    return token
+
+async def revoke_family(db: AsyncSession, family_id: str):
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=utcnow())
+    )
+    await db.commit()
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> tuple[User, str]:
+    """Spend a refresh token and return its user with the replacement token.
+
+    Claiming the token is one guarded UPDATE, so of two concurrent exchanges
+    only one succeeds; the loser is treated as reuse.
+    """
+    now = utcnow()
+    row = await db.scalar(
+        select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    if row is None or row.revoked_at is not None or row.expires_at <= now:
+        raise invalid_refresh_token()
+    # Read before anything expires the loaded row
+    token_id, user_id, family_id = row.id, row.user_id, row.family_id
+    claimed = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token_id, RefreshToken.used_at.is_(None),
+               RefreshToken.revoked_at.is_(None))
+        .values(used_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        await db.rollback()
+        logger.warning(f"Refresh token reused; revoking token family of user {user_id}")
+        await revoke_family(db, family_id)
+        raise invalid_refresh_token()
+    user = await db.get(User, user_id)
+    if user is None:
+        await db.rollback()
+        raise invalid_refresh_token()
+    return user, await issue_refresh_token(db, user_id, family_id)
+
+async def revoke_refresh_token(db: AsyncSession, token: str, username: str):
+    """End the login a refresh token belongs to, if it is the caller's"""
+    family_id = await db.scalar(
+        select(RefreshToken.family_id).join(User, RefreshToken.user_id == User.id)
+        .where(RefreshToken.token_hash == hash_refresh_token(token), User.username == username)
+    )
+    if family_id is not None:
+        await revoke_family(db, family_id)
+
+async def revoke_access_token(db: AsyncSession, token: str, payload: dict):
+    """Record the token's jti until it would have expired, and stop accepting it here.
+
+    Rows of tokens that have expired meanwhile are purged on the way.
+    """
+    jti, exp = payload.get("jti"), payload.get("exp")
+    if jti is None or exp is None:
+        return
+    now = utcnow()
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    db.add(RevokedToken(
+        jti=jti, expires_at=datetime.fromtimestamp(exp, UTC).replace(tzinfo=None)
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Already revoked, e.g. by a repeated logout
+        await db.rollback()
+    revocation_list.add(jti)
+    revoke_token(token)
+
+def confirm_revoked(jti: str) -> bool:
+    """Authoritative check for the ids revocation_list may contain"""
+    with SessionLocal() as db:
+        return db.scalar(select(RevokedToken.id).where(RevokedToken.jti == jti)) is not None
+
+revocation_list.confirm = confirm_revoked
+
+
+class RevocationSync:
+    """Keeps this process's revocation filter in step with revoked_tokens.
+
+    Each pass loads only rows added since the last one. When the filter
+    holds more ids than it was sized for, a new one is built from the rows
+    of tokens that have not expired yet and swapped in.
+    """
+
+    def __init__(self, interval: float = REVOCATION_SYNC_SECONDS):
+        self.interval = interval
+        self.last_id = 0
+        self._task: asyncio.Task | None = None
+
+    def load(self, db: Session) -> int:
+        """Add new revocations to the filter; returns how many were added"""
+        rebuild = len(revocation_list.filter) > revocation_list.filter.capacity
+        now = utcnow()
+        rows = db.execute(
+            select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+            .where(RevokedToken.id > (0 if rebuild else self.last_id)).order_by(RevokedToken.id)
+        ).all()
+        live = [row.jti for row in rows if row.expires_at > now]
+        if rebuild:
+            revocation_list.rebuild(live)
+        else:
+            for jti in live:
+                revocation_list.add(jti)
+        if rows:
+            self.last_id = rows[-1].id
+        return len(live)
+
+    def _load_in_session(self) -> int:
+        with SessionLocal() as db:
+            return self.load(db)
+
+    async def start(self):
+        await run_in_threadpool(self._load_in_session)
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self._load_in_session)
+            except Exception as e:
+                logger.error(f"Loading token revocations failed: {str(e)}")
+
+revocation_sync = RevocationSync()
+
+
+@router.post("/token/refresh")
+async def refresh_endpoint(body: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Exchange a refresh token for a new access token and refresh token.
+
+    Costs a token lookup instead of a password check. Each refresh token
+    works once; keep the new one from the response.
+    """
+    user, refresh_token = await rotate_refresh_token(db, body.refresh_token)
+    return token_response(user.username, refresh_token)
+
+@router.post("/logout")
+async def logout_endpoint(body: LogoutRequest | None = None,
+                          token: str = Security(oauth2_scheme),
+                          db: AsyncSession = Depends(get_async_db)):
+    """Revoke the bearer token, and the login of `refresh_token` when given"""
+    payload = verify_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await revoke_access_token(db, token, payload)
+    if body is not None and body.refresh_token:
+        await revoke_refresh_token(db, body.refresh_token, payload["sub"])
+    return {"message": "Logged out"}
@@ -0,0 +1,322 @@
+"""Per-user token accounting and daily quotas.
+
+Every billed Gemini response is added to in-memory counters; nothing is
+written on the request path. UsageMeter flushes the counters to token_usage
+in one transaction every USAGE_FLUSH_SECONDS, sooner once
+USAGE_FLUSH_MAX_PENDING users have unflushed counts, and on shutdown.
+
+Quota checks read the in-memory view: the stored total as of this
+process's last flush or lookup, plus its unflushed counts. Other processes'
+usage shows up within about USAGE_FLUSH_SECONDS. Calls already in flight when a user
+crosses the quota still finish, so the quota can be overshot by about one
+reply per concurrent request.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from datetime import UTC, date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from src.backend.dependencies import get_current_user, get_db, require_admin
+from src.database.database import SessionLocal
+from src.database.models import TokenUsage, User
+from src.api.gemini import usage_listeners
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["usage"])
+
+# Tokens (prompt plus completion) each user may use per UTC day; 0 means unlimited
+USAGE_DAILY_TOKEN_QUOTA = int(os.getenv("USAGE_DAILY_TOKEN_QUOTA", "0"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+USAGE_FLUSH_MAX_PENDING = int(os.getenv("USAGE_FLUSH_MAX_PENDING", "500"))
+MAX_USAGE_DAYS = 90
+
+
+class UsageDay(BaseModel):
+    day: date
+    prompt_tokens: int
+    completion_tokens: int
+    requests: int
+
+class UserUsage(BaseModel):
+    username: str
+    # Tokens allowed per day; None when unlimited
+    daily_quota: int | None
+    days: list[UsageDay]
+
+
+def utc_today() -> date:
+    return datetime.now(UTC).date()
+
+def seconds_until_tomorrow() -> int:
+    now = datetime.now(UTC)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), UTC)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+def upsert_usage(db: Session, rows: list[dict]):
+    """Add counts to their (user_id, day) rows, creating missing ones, in one statement"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"Usage accounting does not support {dialect}")
+    statement = insert(TokenUsage)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TokenUsage.user_id, TokenUsage.day],
+        set_={
+            name: getattr(TokenUsage, name) + getattr(statement.excluded, name)
+            for name in ("prompt_tokens", "completion_tokens", "requests")
+        },
+    )
+    db.execute(statement, rows)
+
+
+class UsageMeter:
+    """In-memory token counters per (username, day), flushed in batches.
+
+    `record` runs on the event loop for every billed response and only
+    takes a short lock. Counts that fail to flush are kept for the next try.
+    """
+
+    def __init__(self, quota: int = USAGE_DAILY_TOKEN_QUOTA,
+                 flush_seconds: float = USAGE_FLUSH_SECONDS,
+                 max_pending: int = USAGE_FLUSH_MAX_PENDING):
+        self.quota = quota
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # [prompt_tokens, completion_tokens, requests] not yet written
+        self._pending: dict[tuple[str, date], list[int]] = {}
+        # Counts being written by a flush, still counted until _stored includes them
+        self._inflight: dict[tuple[str, date], list[int]] = {}
+        # Total tokens stored in token_usage when last read, and when that was
+        self._stored: dict[tuple[str, date], int] = {}
+        self._read_at: dict[tuple[str, date], float] = {}
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+    def record(self, username: str, prompt_tokens: int, completion_tokens: int):
+        key = (username, utc_today())
+        with self._lock:
+            counts = self._pending.setdefault(key, [0, 0, 0])
+            counts[0] += prompt_tokens
+            counts[1] += completion_tokens
+            counts[2] += 1
+            pending = len(self._pending)
+        if pending >= self.max_pending and self._wake is not None:
+            self._wake.set()
+
+    def pending(self, username: str, day: date) -> list[int]:
+        with self._lock:
+            return list(self._pending.get((username, day), (0, 0, 0)))
+
+    def unwritten(self, username: str, day: date) -> list[int]:
+        """Counts not yet committed: pending ones plus those a flush is writing"""
+        key = (username, day)
+        with self._lock:
+            pending = self._pending.get(key, (0, 0, 0))
+            inflight = self._inflight.get(key, (0, 0, 0))
+            return [count + inflight[i] for i, count in enumerate(pending)]
+
+    def used(self, username: str) -> int:
+        """Tokens used today as far as this process knows"""
+        key = (username, utc_today())
+        with self._lock:
+            pending = self._pending.get(key, (0, 0, 0))
+            inflight = self._inflight.get(key, (0, 0, 0))
+            return (self._stored.get(key, 0) + pending[0] + pending[1]
+                    + inflight[0] + inflight[1])
+
+    def exceeded(self, username: str) -> bool:
+        return self.quota > 0 and self.used(username) >= self.quota
+
+    def load(self, db: Session, username: str):
+        """Read the user's stored total for today into the in-memory view"""
+        today = utc_today()
+        row = db.execute(
+            select(TokenUsage.prompt_tokens + TokenUsage.completion_tokens)
+            .join(User, TokenUsage.user_id == User.id)
+            .where(User.username == username, TokenUsage.day == today)
+        ).first()
+        with self._lock:
+            self._stored[(username, today)] = row[0] if row else 0
+            self._read_at[(username, today)] = time.monotonic()
+
+    async def check(self, username: str):
+        """Fail with 429 when the user's daily quota is used up.
+
+        Answered from memory; the stored total is re-read at most once per
+        USAGE_FLUSH_SECONDS per user, to pick up other processes' usage.
+        """
+        if self.quota <= 0:
+            return
+        read_at = self._read_at.get((username, utc_today()))
+        if read_at is None or time.monotonic() - read_at > self.flush_seconds:
+            await run_in_threadpool(self._in_session, self.load, username)
+        if self.exceeded(username):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Daily token quota exceeded",
+                headers={"Retry-After": str(seconds_until_tomorrow())},
+            )
+
+    def flush(self, db: Session) -> int:
+        """Write all pending counts in one transaction; returns rows written"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._merge(self._inflight, batch)
+        if not batch:
+            return 0
+        try:
+            usernames = {username for username, _ in batch}
+            ids = dict(db.execute(
+                select(User.username, User.id).where(User.username.in_(usernames))
+            ).all())
+            rows = [
+                {"user_id": ids[username], "day": day, "prompt_tokens": counts[0],
+                 "completion_tokens": counts[1], "requests": counts[2]}
+                for (username, day), counts in batch.items() if username in ids
+            ]
+            if rows:
+                upsert_usage(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._settle(batch)
+                self._merge(self._pending, batch)
+            raise
+        if len(rows) < len(batch):
+            logger.warning(f"Dropped usage of {len(batch) - len(rows)} deleted user(s)")
+        try:
+            self._refresh_stored(db, ids, [(row["user_id"], row["day"]) for row in rows], batch)
+        except Exception:
+            with self._lock:
+                # Written but not read back: count the batch as stored instead
+                self._settle(batch)
+                for key, counts in batch.items():
+                    self._stored[key] = self._stored.get(key, 0) + counts[0] + counts[1]
+            raise
+        return len(rows)
+
+    @staticmethod
+    def _merge(into: dict[tuple[str, date], list[int]], batch: dict[tuple[str, date], list[int]]):
+        for key, counts in batch.items():
+            merged = into.setdefault(key, [0, 0, 0])
+            for i, count in enumerate(counts):
+                merged[i] += count
+
+    def _settle(self, batch: dict[tuple[str, date], list[int]]):
+        # Take a flushed batch out of the in-flight counts; call with the lock held
+        for key, counts in batch.items():
+            inflight = self._inflight[key]
+            for i, count in enumerate(counts):
+                inflight[i] -= count
+            if not any(inflight):
+                del self._inflight[key]
+
+    def _refresh_stored(self, db: Session, ids: dict[str, int], keys: list[tuple[int, date]],
+                        flushed: dict[tuple[str, date], list[int]] | None = None):
+        # Read back the totals, which include other processes' flushes
+        names = {user_id: username for username, user_id in ids.items()}
+        totals = db.execute(
+            select(TokenUsage.user_id, TokenUsage.day,
+                   TokenUsage.prompt_tokens + TokenUsage.completion_tokens)
+            .where(tuple_(TokenUsage.user_id, TokenUsage.day).in_(keys))
+        ).all() if keys else []
+        today, now = utc_today(), time.monotonic()
+        with self._lock:
+            # The totals now include the flushed batch, so it stops counting as in flight
+            self._settle(flushed or {})
+            self._stored = {key: total for key, total in self._stored.items() if key[1] >= today}
+            self._read_at = {key: at for key, at in self._read_at.items() if key[1] >= today}
+            for user_id, day, total in totals:
+                if day >= today:
+                    self._stored[(names[user_id], day)] = total
+                    self._read_at[(names[user_id], day)] = now
+
+    @staticmethod
+    def _in_session(func, *args):
+        with SessionLocal() as db:
+            return func(db, *args)
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wake = None
+        await run_in_threadpool(self._in_session, self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await run_in_threadpool(self._in_session, self.flush)
+            except Exception as e:
+                logger.error(f"Flushing token usage failed: {str(e)}")
+
+usage_meter = UsageMeter()
+usage_listeners.append(usage_meter.record)
+
+
+def usage_days(db: Session, username: str, days: int) -> list[UsageDay]:
+    """Stored usage for the last `days` days plus unflushed counts, newest first"""
+    since = utc_today() - timedelta(days=days - 1)
+    stored = {
+        row.day: [row.prompt_tokens, row.completion_tokens, row.requests]
+        for row in db.execute(
+            select(TokenUsage).join(User, TokenUsage.user_id == User.id)
+            .where(User.username == username, TokenUsage.day >= since)
+        ).scalars()
+    }
+    today = utc_today()
+    unwritten = usage_meter.unwritten(username, today)
+    if any(unwritten):
+        counts = stored.setdefault(today, [0, 0, 0])
+        for i, count in enumerate(unwritten):
+            counts[i] += count
+    return [
+        UsageDay(day=day, prompt_tokens=counts[0], completion_tokens=counts[1],
+                 requests=counts[2])
+        for day, counts in sorted(stored.items(), reverse=True)
+    ]
+
+def user_usage(db: Session, username: str, days: int) -> UserUsage:
+    return UserUsage(
+        username=username,
+        daily_quota=usage_meter.quota if usage_meter.quota > 0 else None,
+        days=usage_days(db, username, days),
+    )
+
+@router.get("/usage", response_model=UserUsage)
+def my_usage(days: int = Query(7, ge=1, le=MAX_USAGE_DAYS),
+             user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """The caller's token usage per UTC day, newest first; days without usage are left out"""
+    return user_usage(db, user.username, days)
+
+@router.get("/admin/usage", response_model=UserUsage, tags=["admin"])
+def usage_of_user(username: str, days: int = Query(7, ge=1, le=MAX_USAGE_DAYS),
+                  admin: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Any user's token usage, for admins"""
+    if db.scalar(select(User.id).where(User.username == username)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_usage(db, username, days)
@@ -0,0 +1,231 @@
+"""Bulk user import from CSV or JSONL, as an admin endpoint and a CLI.
+
+    python -m src.backend.user_import users.csv [--format csv|jsonl] [--batch-size 500]
+
+Rows are read as a stream and processed in batches. Each batch is validated,
+checked for duplicates with one set-based query, hashed in parallel on the
+password pool and inserted in a single transaction. One result per input row
+is reported as JSON lines.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import Iterable, Iterator
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.backend.dependencies import require_admin
+from src.backend.schemas import UserRegistration
+from src.database.database import SessionLocal, init_db
+from src.database.models import User
+from src.utils.password import BCRYPT_ROUNDS, get_password_pool, hash_password
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin/users", tags=["admin"])
+
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", "500"))
+IMPORT_FORMATS = ("csv", "jsonl")
+
+
+@dataclass
+class RowResult:
+    row: int
+    username: str | None
+    status: str  # "created", "duplicate" or "invalid"
+    detail: str | None = None
+
+
+def duplicate(row_number: int, username: str, detail: str) -> RowResult:
+    return RowResult(row_number, username, "duplicate", detail)
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, dict | None]]:
+    """Yield (row number, fields) pairs; fields is None for unparseable rows"""
+    if fmt == "csv":
+        for row_number, fields in enumerate(csv.DictReader(lines), start=1):
+            yield row_number, fields
+        return
+    for row_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except json.JSONDecodeError:
+            fields = None
+        yield row_number, fields if isinstance(fields, dict) else None
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """Hash a batch of passwords across the password pool's workers"""
+    pool = get_password_pool()
+    rounds = [BCRYPT_ROUNDS] * len(passwords)
+    if pool is None:
+        return list(map(hash_password, passwords, rounds))
+    chunksize = max(1, len(passwords) // (4 * (os.cpu_count() or 1)))
+    return list(pool.map(hash_password, passwords, rounds, chunksize=chunksize))
+
+
+class UserImporter:
+    """Imports batches of rows, remembering usernames and emails seen so far
+    so duplicates within the same file are reported too."""
+
+    def __init__(self, db: Session, batch_size: int = USER_IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.seen_usernames: set[str] = set()
+        self.seen_emails: set[str] = set()
+        self.counts = {"created": 0, "duplicate": 0, "invalid": 0}
+
+    def run(self, rows: Iterator[tuple[int, dict | None]]) -> Iterator[RowResult]:
+        while batch := list(islice(rows, self.batch_size)):
+            for result in self.import_batch(batch):
+                self.counts[result.status] += 1
+                yield result
+
+    def import_batch(self, batch: list[tuple[int, dict | None]]) -> list[RowResult]:
+        results, candidates = self.validate(batch)
+        candidates = self.drop_existing(candidates, results)
+        if candidates:
+            hashes = hash_passwords([user.password for _, user in candidates])
+            results.extend(self.insert(candidates, hashes))
+        return sorted(results, key=lambda result: result.row)
+
+    def validate(self, batch) -> tuple[list[RowResult], list[tuple[int, UserRegistration]]]:
+        results, candidates = [], []
+        for row_number, fields in batch:
+            if fields is None:
+                results.append(RowResult(row_number, None, "invalid", "Unparseable row"))
+                continue
+            if None in fields:
+                # csv.DictReader keys values beyond the header under None
+                results.append(RowResult(row_number, fields.get("username"), "invalid",
+                                         "More columns than the header"))
+                continue
+            try:
+                user = UserRegistration(**fields)
+            except ValidationError as e:
+                detail = "; ".join(f"{err['loc'][0]}: {err['msg']}" for err in e.errors())
+                results.append(RowResult(row_number, fields.get("username"), "invalid", detail))
+                continue
+            candidates.append((row_number, user))
+        return results, candidates
+
+    def drop_existing(self, candidates, results: list[RowResult]):
+        """Filter out rows clashing with the database or earlier rows of the file.
+
+        The database is checked with a single query per batch.
+        """
+        usernames = {user.username for _, user in candidates}
+        emails = {user.email for _, user in candidates}
+        existing = self.db.execute(
+            select(User.username, User.email).where(
+                or_(User.username.in_(usernames), User.email.in_(emails))
+            )
+        ).all()
+        taken_usernames = self.seen_usernames | {row.username for row in existing}
+        taken_emails = self.seen_emails | {row.email for row in existing}
+
+        remaining = []
+        for row_number, user in candidates:
+            if user.username in taken_usernames:
+                results.append(duplicate(row_number, user.username, "Username already registered"))
+            elif user.email in taken_emails:
+                results.append(duplicate(row_number, user.username, "Email already registered"))
+            else:
+                # Only rows being imported claim their names; rejected ones never will
+                remaining.append((row_number, user))
+                taken_usernames.add(user.username)
+                taken_emails.add(user.email)
+                self.seen_usernames.add(user.username)
+                self.seen_emails.add(user.email)
+        return remaining
+
+    def insert(self, candidates, hashes: list[str]) -> list[RowResult]:
+        rows = [
+            {"username": user.username, "email": user.email, "hashed_password": hashed}
+            for (_, user), hashed in zip(candidates, hashes)
+        ]
+        try:
+            self.db.execute(insert(User), rows)
+            self.db.commit()
+        except IntegrityError:
+            # Someone registered one of these names since the duplicate check; go row by row
+            self.db.rollback()
+            return [
+                self.insert_one(row_number, row) for (row_number, _), row in zip(candidates, rows)
+            ]
+        return [RowResult(row_number, user.username, "created") for row_number, user in candidates]
+
+    def insert_one(self, row_number: int, row: dict) -> RowResult:
+        try:
+            self.db.execute(insert(User), [row])
+            self.db.commit()
+            return RowResult(row_number, row["username"], "created")
+        except IntegrityError:
+            self.db.rollback()
+            return duplicate(row_number, row["username"], "Username or email already registered")
+
+
+def detect_format(filename: str | None, fmt: str | None) -> str:
+    fmt = fmt or (filename or "").rsplit(".", 1)[-1].lower()
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt!r}; use csv or jsonl")
+    return fmt
+
+def stream_import(lines: Iterable[str], fmt: str,
+                  batch_size: int = USER_IMPORT_BATCH_SIZE) -> Iterator[str]:
+    """Run an import with its own session, yielding one JSON line per row and a summary"""
+    with SessionLocal() as db:
+        importer = UserImporter(db, batch_size)
+        for result in importer.run(read_rows(lines, fmt)):
+            yield json.dumps(asdict(result)) + "\n"
+        logger.info(f"User import finished: {importer.counts}")
+        yield json.dumps({"summary": importer.counts}) + "\n"
+
+
+@router.post("/import")
+def import_users_endpoint(file: UploadFile, format: str | None = None,
+                          batch_size: int = Query(USER_IMPORT_BATCH_SIZE, ge=1, le=10000),
+                          admin: User = Depends(require_admin)):
+    """Import users from an uploaded CSV or JSONL file.
+
+    Columns/keys are username, email and password. The response streams one
+    JSON line per input row, followed by a {"summary": {...}} line.
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"User import started by admin: {admin.username}")
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return StreamingResponse(
+        stream_import(lines, fmt, batch_size), media_type="application/x-ndjson"
+    )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or JSONL")
+    parser.add_argument("path", help="CSV or JSONL file, or - for stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--batch-size", type=int, default=USER_IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    init_db()
+    fmt = detect_format(None if args.path == "-" else args.path, args.format)
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8", newline="")
+    with source:
+        for line in stream_import(source, fmt, args.batch_size):
+            sys.stdout.write(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Archival of idle conversations into compressed, append-only segment files.
+
+Messages of conversations without activity for a while are moved out of
+the messages table, one compressed record (JSON lines of the messages) per
+conversation, appended to a segment file under ARCHIVE_DIR. Each record is
+its own gzip member or zstd frame, so reading one conversation back only
+decompresses its own bytes. message_archive maps each conversation to the
+byte ranges of its records, along with the ids they cover.
+
+Records are written and fsynced before the transaction that deletes their
+messages commits. A crash in between leaves unreferenced bytes in a
+segment, never lost messages. Segments are only ever appended to, and each
+process appends to segments it created, so archivers in several processes
+never share a file.
+
+Archived messages leave the search index. Once deleted, the freed pages are
+returned to the filesystem by incremental_vacuum, which needs the database
+in incremental auto-vacuum mode: new databases start in it, existing ones
+are converted once with enable_incremental_vacuum(engine, rebuild=True).
+"""
+import gzip
+import json
+import os
+import threading
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from .models import ArchivedRange, Message, utcnow
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+# "gzip", or "zstd" with the zstandard package installed
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "gzip")
+# A segment stops taking records once it reaches this size
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+# Conversations moved per transaction, and per fsync
+ARCHIVE_BATCH_CONVERSATIONS = int(os.getenv("ARCHIVE_BATCH_CONVERSATIONS", "100"))
+# Decompressed records kept in memory for repeated history reads
+ARCHIVE_READ_CACHE_ENTRIES = int(os.getenv("ARCHIVE_READ_CACHE_ENTRIES", "64"))
+# Free pages returned per incremental_vacuum run; 0 returns them all
+ARCHIVE_VACUUM_PAGES = int(os.getenv("ARCHIVE_VACUUM_PAGES", "0"))
+
+SEGMENT_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+INCREMENTAL = 2  # PRAGMA auto_vacuum value
+
+
+def codec_of(segment: str) -> str:
+    for codec, suffix in SEGMENT_SUFFIXES.items():
+        if segment.endswith(suffix):
+            return codec
+    raise ValueError(f"Unknown archive segment type: {segment}")
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, mtime=0)
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def encode_messages(rows) -> bytes:
+    return b"".join(
+        json.dumps({
+            "id": row.id, "role": row.role, "content": row.content,
+            "token_count": row.token_count, "created_at": row.created_at.isoformat(),
+        }).encode("utf-8") + b"\n"
+        for row in rows
+    )
+
+def decode_messages(data: bytes) -> list[dict]:
+    messages = [json.loads(line) for line in data.splitlines()]
+    for message in messages:
+        message["created_at"] = datetime.fromisoformat(message["created_at"])
+    return messages
+
+
+class SegmentStore:
+    """Append-only segment files of compressed records, with an LRU of decoded ones"""
+
+    def __init__(self, directory: str = ARCHIVE_DIR, codec: str = ARCHIVE_COMPRESSION,
+                 max_bytes: int = ARCHIVE_SEGMENT_MAX_BYTES,
+                 cache_entries: int = ARCHIVE_READ_CACHE_ENTRIES):
+        if codec not in SEGMENT_SUFFIXES:
+            raise ValueError(f"ARCHIVE_COMPRESSION must be one of {', '.join(SEGMENT_SUFFIXES)}")
+        self.directory = directory
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self.cache_entries = cache_entries
+        self._lock = threading.Lock()
+        # The segment this process appends to; created on first use
+        self._segment: str | None = None
+        self._cache: OrderedDict[tuple[str, int], list[dict]] = OrderedDict()
+
+    def _path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def _new_segment(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        numbers = [
+            int(name.split("-")[1].split(".")[0]) for name in os.listdir(self.directory)
+            if name.startswith("segment-")
+        ]
+        number = max(numbers, default=0) + 1
+        while True:
+            segment = f"segment-{number:06d}{SEGMENT_SUFFIXES[self.codec]}"
+            try:
+                # Exclusive create, so no two processes ever append to one file
+                open(self._path(segment), "xb").close()
+                return segment
+            except FileExistsError:
+                number += 1
+
+    def append(self, payloads: list[bytes]) -> list[tuple[str, int, int]]:
+        """Compress and durably append one record per payload.
+
+        Returns the (segment, offset, length) of each record.
+        """
+        records = [compress(payload, self.codec) for payload in payloads]
+        places = []
+        with self._lock:
+            if (self._segment is None
+                    or os.path.getsize(self._path(self._segment)) >= self.max_bytes):
+                self._segment = self._new_segment()
+            with open(self._path(self._segment), "ab") as segment_file:
+                offset = segment_file.tell()
+                for record in records:
+                    segment_file.write(record)
+                    places.append((self._segment, offset, len(record)))
+                    offset += len(record)
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+        return places
+
+    def read(self, segment: str, offset: int, length: int) -> list[dict]:
+        """Messages of one record, oldest first; the list is shared, do not modify it"""
+        key = (segment, offset)
+        with self._lock:
+            messages = self._cache.get(key)
+            if messages is not None:
+                self._cache.move_to_end(key)
+                return messages
+        with open(self._path(segment), "rb") as segment_file:
+            segment_file.seek(offset)
+            data = segment_file.read(length)
+        if len(data) != length:
+            raise ValueError(f"Archive record at {segment}:{offset} is truncated")
+        messages = decode_messages(decompress(data, codec_of(segment)))
+        with self._lock:
+            self._cache[key] = messages
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return messages
+
+segment_store = SegmentStore()
+
+
+def idle_conversations(db: Session, cutoff: datetime, newest: int, limit: int) -> list[int]:
+    """Conversations whose newest message is older than `cutoff`.
+
+    The conversation holding message `newest`, the newest overall, is left
+    alone: SQLite hands out max(id) + 1 for new rows, so deleting it would
+    let new messages reuse archived ids.
+    """
+    return list(db.scalars(
+        select(Message.conversation_id)
+        .group_by(Message.conversation_id)
+        .having(func.max(Message.created_at) < cutoff, func.max(Message.id) < newest)
+        .order_by(Message.conversation_id)
+        .limit(limit)
+    ))
+
+def archive_batch(db: Session, conversation_ids: list[int], up_to_id: int,
+                  store: SegmentStore | None = None) -> int:
+    """Move the messages of `conversation_ids` with ids up to `up_to_id` into the archive.
+
+    Deleting with RETURNING claims the rows, so two archivers never store
+    the same messages. Returns how many messages were moved.
+    """
+    store = store or segment_store
+    try:
+        rows = db.execute(
+            delete(Message)
+            .where(Message.conversation_id.in_(conversation_ids), Message.id <= up_to_id)
+            .returning(Message.id, Message.conversation_id, Message.role, Message.content,
+                       Message.token_count, Message.created_at)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not rows:
+            db.rollback()
+            return 0
+        by_conversation: dict[int, list] = {}
+        for row in sorted(rows, key=lambda row: row.id):
+            by_conversation.setdefault(row.conversation_id, []).append(row)
+        places = store.append([encode_messages(group) for group in by_conversation.values()])
+        db.execute(insert(ArchivedRange), [
+            {"conversation_id": conversation_id, "segment": segment, "offset": offset,
+             "length": length, "first_message_id": group[0].id,
+             "last_message_id": group[-1].id, "message_count": len(group)}
+            for (conversation_id, group), (segment, offset, length)
+            in zip(by_conversation.items(), places)
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+def archive_conversations(db: Session, older_than: timedelta,
+                          batch_size: int = ARCHIVE_BATCH_CONVERSATIONS,
+                          store: SegmentStore | None = None) -> tuple[int, int]:
+    """Archive every conversation idle for `older_than`; returns (conversations, messages)"""
+    cutoff = utcnow() - older_than
+    conversations = messages = 0
+    while True:
+        newest = db.scalar(select(func.max(Message.id)))
+        conversation_ids = idle_conversations(db, cutoff, newest, batch_size) if newest else []
+        if not conversation_ids:
+            break
+        # Messages added meanwhile have higher ids and stay live
+        moved = archive_batch(db, conversation_ids, newest, store)
+        if not moved:
+            break
+        conversations += len(conversation_ids)
+        messages += moved
+    return conversations, messages
+
+def read_archived(db: Session, conversation_id: int, before: int | None = None,
+                  after: int | None = None, limit: int | None = None,
+                  store: SegmentStore | None = None) -> list[Message]:
+    """Archived messages with after < id < before, newest first.
+
+    They are returned as transient Message objects, attached to no session.
+    Only the records covering the requested range are decompressed.
+    """
+    store = store or segment_store
+    query = (
+        select(ArchivedRange.segment, ArchivedRange.offset, ArchivedRange.length)
+        .where(ArchivedRange.conversation_id == conversation_id)
+        .order_by(ArchivedRange.last_message_id.desc())
+    )
+    if before is not None:
+        query = query.where(ArchivedRange.first_message_id < before)
+    if after is not None:
+        query = query.where(ArchivedRange.last_message_id > after)
+    messages = []
+    for segment, offset, length in db.execute(query).all():
+        for message in reversed(store.read(segment, offset, length)):
+            if before is not None and message["id"] >= before:
+                continue
+            if after is not None and message["id"] <= after:
+                break
+            messages.append(Message(conversation_id=conversation_id, **message))
+            if limit is not None and len(messages) >= limit:
+                return messages
+    return messages
+
+
+def enable_incremental_vacuum(engine: Engine, rebuild: bool = False) -> bool:
+    """Put a SQLite database in incremental auto-vacuum mode; False when it is not.
+
+    The mode can only be switched before the first table exists, or by
+    rebuilding the whole file with VACUUM, which `rebuild` allows. Other
+    databases are left alone.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == INCREMENTAL:
+            return True
+        tables = conn.exec_driver_sql("SELECT count(*) FROM sqlite_master").scalar()
+        if tables and not rebuild:
+            return False
+        # executescript runs outside any transaction, as VACUUM requires
+        conn.connection.dbapi_connection.executescript(
+            "PRAGMA auto_vacuum=INCREMENTAL; VACUUM"
+        )
+    return True
+
+def incremental_vacuum(engine: Engine, pages: int = ARCHIVE_VACUUM_PAGES) -> int:
+    """Return free pages to the filesystem; returns how many were released"""
+    if engine.dialect.name != "sqlite":
+        return 0
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != INCREMENTAL:
+            return 0
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        # execute() would step the pragma once and release a single page
+        conn.connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        released = free - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        # In WAL mode the file only shrinks once the change is checkpointed
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+    return released
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import declarative_base
+from datetime import datetime, UTC
 
 Base = declarative_base()
 
@@ -10,3 +11,116 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+
+
+def utcnow() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+class Conversation(Base):
+    __tablename__ = 'conversations'
+    # Serves "latest conversations for a user" with keyset pagination
+    __table_args__ = (Index('ix_conversations_user_created', 'user_id', 'created_at'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    title = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    # Rolling summary of every message up to and including summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+
+class Message(Base):
+    __tablename__ = 'messages'
+    # Serves "messages of a conversation before id X" with keyset pagination
+    __table_args__ = (Index('ix_messages_conversation_id', 'conversation_id', 'id'),)
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(
+        Integer, ForeignKey('conversations.id', ondelete='CASCADE'), nullable=False
+    )
+    role = Column(String, nullable=False)  # "user" or "model", as in Gemini contents
+    content = Column(Text, nullable=False)
+    # Estimated once on insert so context assembly never re-tokenizes history
+    token_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+
+class ChatJob(Base):
+    """A chat prompt answered in the background; see src/backend/chat_jobs.py"""
+    __tablename__ = 'chat_jobs'
+    # Serves the workers' "oldest job that is due" scan
+    __table_args__ = (Index('ix_chat_jobs_status_available', 'status', 'available_at'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    conversation_id = Column(
+        Integer, ForeignKey('conversations.id', ondelete='CASCADE'), nullable=True
+    )
+    prompt = Column(Text, nullable=False)
+    # "queued", "running", "succeeded" or "failed"
+    status = Column(String, nullable=False, default="queued")
+    # When a queued job may run, or when a running job's lease lapses
+    available_at = Column(DateTime, nullable=False, default=utcnow)
+    # Also the lease token: only the worker holding attempt N may finish the job
+    attempts = Column(Integer, nullable=False, default=0)
+    response = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class RefreshToken(Base):
+    """A single-use refresh token; see src/backend/tokens.py"""
+    __tablename__ = 'refresh_tokens'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # SHA-256 of the token; the token itself is only ever held by the client
+    token_hash = Column(String, unique=True, nullable=False)
+    # Every token rotated from one login shares its family, so reuse revokes them all
+    family_id = Column(String, index=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    # Set when exchanged for a new token; a second exchange is reuse
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+
+class RevokedToken(Base):
+    """An access token revoked before its expiry, by its jti claim"""
+    __tablename__ = 'revoked_tokens'
+
+    # Increasing ids let each process load only the revocations it has not seen
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, unique=True, nullable=False)
+    # Rows can be purged once the token would have expired anyway
+    expires_at = Column(DateTime, index=True, nullable=False)
+
+class TokenUsage(Base):
+    """Upstream tokens used per user and UTC day; written in batches by src/backend/usage.py"""
+    __tablename__ = 'token_usage'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    # Billed upstream responses; cached replies cost nothing and are not counted
+    requests = Column(Integer, nullable=False, default=0)
+
+class ArchivedRange(Base):
+    """Where messages moved out of the messages table are stored; see src/database/archive.py"""
+    __tablename__ = 'message_archive'
+    # Serves "archived messages of a conversation before id X", newest range first
+    __table_args__ = (
+        Index('ix_message_archive_conversation', 'conversation_id', 'last_message_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(
+        Integer, ForeignKey('conversations.id', ondelete='CASCADE'), nullable=False
+    )
+    # Segment file name and the byte range of this conversation's compressed record in it
+    segment = Column(String, nullable=False)
+    offset = Column(Integer, nullable=False)
+    length = Column(Integer, nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False, default=utcnow)
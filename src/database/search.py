@@ -0,0 +1,96 @@
+"""SQLite FTS5 index over stored chat messages.
+
+messages_fts holds a copy of each message's text plus an `owner` token
+("u<user_id>"), so a search scoped to one user is a single FTS query: the
+owner term is intersected with the user's terms inside the index instead
+of filtering every match through a join afterwards. Triggers on messages
+and conversations keep the index in step with every write.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "messages_fts"
+
+CREATE_FTS_TABLE = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    content, owner, tokenize = 'porter unicode61 remove_diacritics 2'
+)
+"""
+
+FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations
+        WHERE id = new.conversation_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update
+    AFTER UPDATE OF content, conversation_id ON messages BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversations
+        WHERE id = new.conversation_id;
+    END
+    """,
+    # Covers databases without PRAGMA foreign_keys, where no cascade removes the messages
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_conversation_delete
+    AFTER DELETE ON conversations BEGIN
+        DELETE FROM {FTS_TABLE}
+        WHERE rowid IN (SELECT id FROM messages WHERE conversation_id = old.id);
+    END
+    """,
+]
+
+BACKFILL_FTS = f"""
+INSERT INTO {FTS_TABLE}(rowid, content, owner)
+SELECT messages.id, messages.content, 'u' || conversations.user_id
+FROM messages JOIN conversations ON conversations.id = messages.conversation_id
+"""
+
+
+def owner_token(user_id: int) -> str:
+    return f"u{user_id}"
+
+def create_search_index(engine: Engine) -> bool:
+    """Create messages_fts and its triggers if missing; False when unsupported.
+
+    A newly created index is filled from the messages already stored. Other
+    databases, and SQLite builds without FTS5, are left without search.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conn:
+        created = not inspect(conn).has_table(FTS_TABLE)
+        if created:
+            try:
+                conn.execute(text(CREATE_FTS_TABLE))
+            except OperationalError as e:
+                logger.warning(f"Full-text search disabled, FTS5 is unavailable: {str(e)}")
+                return False
+        for trigger in FTS_TRIGGERS:
+            conn.execute(text(trigger))
+        if created:
+            conn.execute(text(BACKFILL_FTS))
+    return True
+
+def has_search_index(db: Session) -> bool:
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first() is not None
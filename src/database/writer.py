@@ -0,0 +1,160 @@
+"""Group commit for chat message inserts.
+
+Requests hand their rows to one writer thread instead of committing
+themselves. The writer takes whatever is queued, waits up to
+MESSAGE_WRITER_MAX_WAIT_MS for more while the batch is below
+MESSAGE_WRITER_MAX_BATCH rows, and inserts the lot in one transaction.
+Under load, one commit (and its fsync, with SQLITE_SYNCHRONOUS=FULL or on
+WAL checkpoints) is shared by many requests, and they no longer queue on
+SQLite's write lock one by one.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+from concurrent.futures import Future
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from src.utils.metrics import MESSAGE_WRITER_BATCH_SIZE, MESSAGE_WRITER_COMMIT_DURATION
+from .database import SessionLocal
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+# Rows per transaction, at most
+MESSAGE_WRITER_MAX_BATCH = int(os.getenv("MESSAGE_WRITER_MAX_BATCH", "256"))
+# How long a batch may wait for more rows once the queue is empty; 0 commits at once
+MESSAGE_WRITER_MAX_WAIT_MS = float(os.getenv("MESSAGE_WRITER_MAX_WAIT_MS", "2"))
+# Pending submissions before new ones wait for room
+MESSAGE_WRITER_QUEUE_SIZE = int(os.getenv("MESSAGE_WRITER_QUEUE_SIZE", "10000"))
+
+_STOP = object()
+
+
+class MessageWriter:
+    """Single background thread committing queued message rows in groups.
+
+    `submit` returns a Future that resolves once the rows are committed, or
+    fails with the insert's error; `write` awaits it. Rows of one submission
+    always commit together. When a group fails, its submissions are retried one by one so
+    one bad row (e.g. for a deleted conversation) only fails its own caller.
+    """
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal,
+                 max_batch: int = MESSAGE_WRITER_MAX_BATCH,
+                 max_wait_ms: float = MESSAGE_WRITER_MAX_WAIT_MS,
+                 queue_size: int = MESSAGE_WRITER_QUEUE_SIZE):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="message-writer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """Commit everything submitted so far, then end the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, rows: list[dict]) -> Future:
+        """Queue Message column values for insertion; started on first use.
+
+        Blocks while the queue is full, so call it from a worker thread.
+        """
+        future = Future()
+        if not rows:
+            future.set_result(None)
+            return future
+        self.start()
+        self._queue.put((rows, future))
+        return future
+
+    async def write(self, rows: list[dict], durable: bool = True):
+        """Queue rows, and when `durable`, wait until they are committed.
+
+        Cancelling the caller stops the wait, not the write: rows already
+        queued are still committed.
+        """
+        if not rows:
+            return
+        future = Future()
+        self.start()
+        try:
+            self._queue.put_nowait((rows, future))
+        except queue.Full:
+            # Wait for room off the event loop
+            await asyncio.to_thread(self._queue.put, (rows, future))
+        if durable:
+            await asyncio.wrap_future(future)
+        else:
+            future.add_done_callback(log_failure)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            # From here on the Future can no longer be cancelled, so resolving it cannot fail
+            item[1].set_running_or_notify_cancel()
+            batch, size = [item], len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    # Drain what is already queued, then wait out the rest of max_wait
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                item[1].set_running_or_notify_cancel()
+                batch.append(item)
+                size += len(item[0])
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # Never let one batch end the thread and strand every later write
+                logger.error(f"Message writer failed: {str(e)}")
+
+    def _commit(self, batch: list[tuple[list[dict], Future]]):
+        rows = [row for submitted, _ in batch for row in submitted]
+        start = time.perf_counter()
+        try:
+            with self.session_factory() as db:
+                db.execute(insert(Message), rows)
+                db.commit()
+        except Exception as e:
+            if len(batch) > 1:
+                for item in batch:
+                    self._commit([item])
+                return
+            if not batch[0][1].cancelled():
+                batch[0][1].set_exception(e)
+            return
+        MESSAGE_WRITER_COMMIT_DURATION.observe(time.perf_counter() - start)
+        MESSAGE_WRITER_BATCH_SIZE.observe(len(rows))
+        for _, future in batch:
+            # Cancelled before it was dequeued; its rows are committed all the same
+            if not future.cancelled():
+                future.set_result(None)
+
+def log_failure(future: Future):
+    if future.exception() is not None:
+        logger.error(f"Storing messages failed: {str(future.exception())}")
+
+message_writer = MessageWriter()
@@ -1,25 +1,101 @@
+import os
 import streamlit as st
 import requests
-from datetime import datetime
+from datetime import datetime, UTC
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Backend API base URL
-BACKEND_URL = "http://127.0.0.1:8000"
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
+# (connect, read) timeouts in seconds; chat replies can take a while upstream
+AUTH_TIMEOUT = (3.05, 10)
+CHAT_TIMEOUT = (3.05, float(os.getenv("FRONTEND_CHAT_TIMEOUT", "60")))
+# Messages rendered at once, and how many each "Load older" click adds
+HISTORY_WINDOW = int(os.getenv("FRONTEND_HISTORY_WINDOW", "20"))
+HISTORY_PAGE_SIZE = int(os.getenv("FRONTEND_HISTORY_PAGE_SIZE", "20"))
 
 # Initialize session state
 if "token" not in st.session_state:
     st.session_state.token = None
+if "refresh_token" not in st.session_state:
+    st.session_state.refresh_token = None
 if "conversation" not in st.session_state:
     st.session_state.conversation = []
 if "username" not in st.session_state:
     st.session_state.username = None
+if "conversation_id" not in st.session_state:
+    st.session_state.conversation_id = None
+if "has_older" not in st.session_state:
+    st.session_state.has_older = False
+if "window" not in st.session_state:
+    st.session_state.window = HISTORY_WINDOW
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Keep-alive session shared across reruns and browser sessions.
+
+    Connection failures are retried for every method, since the request never
+    reached the server. Status retries (502/503/504, honouring Retry-After)
+    only apply to GETs, so a chat message is never sent twice.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def auth_headers():
+    return {"Authorization": f"Bearer {st.session_state.token}"}
+
+def refresh_tokens() -> bool:
+    """Swap the refresh token for a new pair; False when the login has ended"""
+    if not st.session_state.refresh_token:
+        return False
+    response = get_http_session().post(
+        f"{BACKEND_URL}/token/refresh",
+        json={"refresh_token": st.session_state.refresh_token},
+        timeout=AUTH_TIMEOUT
+    )
+    if response.status_code != 200:
+        return False
+    tokens = response.json()
+    st.session_state.token = tokens["access_token"]
+    st.session_state.refresh_token = tokens["refresh_token"]
+    return True
+
+def authed_request(method, path, **kwargs):
+    """Send an authenticated request, refreshing an expired access token once.
+
+    A 401 is only answered by the server before it does any work, so
+    resending after a refresh cannot repeat a chat message.
+    """
+    response = get_http_session().request(
+        method, f"{BACKEND_URL}{path}", headers=auth_headers(), **kwargs
+    )
+    if response.status_code == 401 and refresh_tokens():
+        response = get_http_session().request(
+            method, f"{BACKEND_URL}{path}", headers=auth_headers(), **kwargs
+        )
+    return response
 
 def register_user(username, password):
     print(f"Attempting to register at {BACKEND_URL}/register")  # Debug
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{BACKEND_URL}/register",
             json={"username": username, "password": password},
-            timeout=5
+            timeout=AUTH_TIMEOUT
         )
         print(f"Response status: {response.status_code}")  # Debug
         return response.json()
@@ -29,34 +105,142 @@ def register_user(username, password):
 
 def login_user(username, password):
     form_data = {"username": username, "password": password}
-    response = requests.post(
+    response = get_http_session().post(
         f"{BACKEND_URL}/login",
-        data=form_data
+        data=form_data,
+        timeout=AUTH_TIMEOUT
     )
     return response.json()
 
 def logout_user():
+    try:
+        get_http_session().post(
+            f"{BACKEND_URL}/logout",
+            json={"refresh_token": st.session_state.refresh_token},
+            headers=auth_headers(), timeout=AUTH_TIMEOUT
+        )
+    except requests.exceptions.RequestException:
+        pass  # The local session is dropped either way
     st.session_state.token = None
+    st.session_state.refresh_token = None
     st.session_state.username = None
     st.session_state.conversation = []
+    st.session_state.conversation_id = None
+    st.session_state.has_older = False
+    st.session_state.window = HISTORY_WINDOW
+
+def to_message(item):
+    """Convert a MessageOut from the API into the shape kept in session state"""
+    return {
+        "id": item["id"],
+        "sender": "user" if item["role"] == "user" else "bot",
+        "text": item["content"],
+        "timestamp": datetime.fromisoformat(item["created_at"]),
+    }
+
+def fetch_messages(before=None, limit=HISTORY_PAGE_SIZE):
+    """One page of the current conversation, oldest first, plus whether more exist"""
+    params = {"limit": limit}
+    if before is not None:
+        params["before"] = before
+    response = authed_request(
+        "GET", f"/conversations/{st.session_state.conversation_id}/messages",
+        params=params, timeout=AUTH_TIMEOUT
+    )
+    response.raise_for_status()
+    page = response.json()
+    return [to_message(item) for item in page["items"]], page["next_cursor"] is not None
+
+def open_conversation(conversation_id):
+    """Show the latest window of a conversation"""
+    st.session_state.conversation_id = conversation_id
+    st.session_state.window = HISTORY_WINDOW
+    messages, has_older = fetch_messages(limit=HISTORY_WINDOW)
+    st.session_state.conversation = messages
+    st.session_state.has_older = has_older
+
+def start_conversation():
+    response = authed_request(
+        "POST", "/conversations",
+        json={"title": datetime.now().strftime("Chat %Y-%m-%d %H:%M")},
+        timeout=AUTH_TIMEOUT
+    )
+    response.raise_for_status()
+    st.session_state.conversation_id = response.json()["id"]
+    st.session_state.conversation = []
+    st.session_state.has_older = False
+    st.session_state.window = HISTORY_WINDOW
+
+def resume_or_start_conversation():
+    """After login, continue the most recent conversation or start a new one"""
+    response = authed_request(
+        "GET", "/conversations", params={"limit": 1}, timeout=AUTH_TIMEOUT
+    )
+    response.raise_for_status()
+    items = response.json()["items"]
+    if items:
+        open_conversation(items[0]["id"])
+    else:
+        start_conversation()
+
+def oldest_loaded_id():
+    """Id of the oldest rendered message, or None when the server has none.
+
+    Messages added during this session carry no id, so when only those are
+    left in the window, look up the id of the oldest one on the server.
+    """
+    messages = st.session_state.conversation
+    if messages[0]["id"] is not None:
+        return messages[0]["id"]
+    stored = sum(1 for message in messages if message.get("saved", True))
+    latest, _ = fetch_messages(limit=min(max(stored, 1), 100))
+    return latest[0]["id"] if latest else None
+
+def load_older_messages():
+    if st.session_state.conversation:
+        before = oldest_loaded_id()
+        if before is None:
+            # Only unsaved exchanges are loaded, so nothing older exists
+            st.session_state.has_older = False
+            return
+        older, has_older = fetch_messages(before=before)
+    else:
+        older, has_older = fetch_messages()
+    st.session_state.conversation = older + st.session_state.conversation
+    st.session_state.window = len(st.session_state.conversation)
+    st.session_state.has_older = has_older
+
+def add_message(sender, text, saved=True):
+    """Append a message, dropping the oldest ones beyond the render window.
+
+    `saved` is False for exchanges the backend rejected, which it never stored.
+    """
+    messages = st.session_state.conversation
+    messages.append({"id": None, "sender": sender, "text": text, "saved": saved,
+                     "timestamp": datetime.now(UTC).replace(tzinfo=None)})
+    if len(messages) > st.session_state.window:
+        del messages[:len(messages) - st.session_state.window]
+        st.session_state.has_older = True
 
 def display_login():
     st.title("Chatbot Login")
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
-    
+
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Login"):
             try:
                 response = login_user(username, password)
                 st.session_state.token = response.get("access_token")
+                st.session_state.refresh_token = response.get("refresh_token")
                 st.session_state.username = username
+                resume_or_start_conversation()
                 st.success("Logged in successfully!")
                 st.rerun()
             except Exception as e:
                 st.error(f"Login failed: {str(e)}")
-    
+
     with col2:
         if st.button("Register"):
             try:
@@ -74,45 +258,55 @@ def display_login():
 
 def display_chat():
     st.title(f"Chatbot - Welcome {st.session_state.username}")
-    
-    # Display chat messages
+
+    if st.session_state.has_older and st.button("Load older messages"):
+        try:
+            load_older_messages()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Could not load older messages: {str(e)}")
+        st.rerun()
+
+    # Display chat messages; at most `window` of them, however long the conversation
     for message in st.session_state.conversation:
         with st.chat_message(message["sender"]):
             st.write(f"{message['timestamp'].strftime('%H:%M:%S')}: {message['text']}")
-    
+
     # Chat input
     if prompt := st.chat_input("Type your message"):
         # Add user message to conversation
-        st.session_state.conversation.append({
-            "sender": "user",
-            "text": prompt,
-            "timestamp": datetime.now()
-        })
-        
+        add_message("user", prompt)
+
         # Call the backend chat endpoint
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        data = {"text": prompt}
+        data = {"text": prompt, "conversation_id": st.session_state.conversation_id}
+        saved = False
         try:
-            response = requests.post(f"{BACKEND_URL}/chat", json=data, headers=headers)
+            response = authed_request("POST", "/chat", json=data, timeout=CHAT_TIMEOUT)
             if response.status_code == 200:
                 bot_response = response.json()["response"]
+                saved = True
             else:
                 bot_response = f"Error: {response.status_code} - {response.text}"
         except Exception as e:
             bot_response = f"Error: {str(e)}"
-        
+
         # Add bot response to conversation
-        st.session_state.conversation.append({
-            "sender": "bot",
-            "text": bot_response,
-            "timestamp": datetime.now()
-        })
-        st.rerun()
-    
-    if st.button("Logout"):
-        logout_user()
+        st.session_state.conversation[-1]["saved"] = saved
+        add_message("bot", bot_response, saved=saved)
         st.rerun()
 
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("New conversation"):
+            try:
+                start_conversation()
+            except requests.exceptions.RequestException as e:
+                st.error(f"Could not start a conversation: {str(e)}")
+            st.rerun()
+    with col2:
+        if st.button("Logout"):
+            logout_user()
+            st.rerun()
+
 # Main app logic
 if st.session_state.token:
     display_chat()
@@ -1,10 +1,133 @@
 from datetime import datetime, timedelta, UTC
 from jose import jwt
-from typing import Optional
+from typing import Callable, Iterable, Optional
+from collections import OrderedDict
+from src.utils.bloom import BloomFilter
+import hashlib
+import os
+import secrets
+import threading
+import time
 
 SECRET_KEY = "your-secret-key"  # This should be changed to a secure secret key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Verified-token cache: entries live until the token's exp, capped by the TTL
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+# Revoked token ids the Bloom filter is sized for before its error rate climbs
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001"))
+
+class VerifiedTokenCache:
+    """Bounded LRU of already-verified token claims, keyed by a hash of the token.
+
+    Raw tokens are never kept in memory. An entry is dropped once its
+    expiry passes, and never outlives the token's own `exp`.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Copy so callers cannot mutate the cached claims
+        return dict(payload)
+
+    def put(self, token: str, payload: dict, expires_at: float):
+        if self.max_entries <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_MAX_ENTRIES)
+
+class RevocationList:
+    """Revoked token ids (`jti` claims) behind an in-memory Bloom filter.
+
+    Ids the filter has never seen are not revoked, which settles almost
+    every check without I/O. Possible matches are confirmed with `confirm`,
+    the authoritative store (see src.backend.tokens); until one is set, the
+    filter's answer stands.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.filter = BloomFilter(capacity, error_rate)
+        self.confirm: Callable[[str], bool] | None = None
+        # Answers from `confirm` per jti, with the token's expiry, so replays
+        # and false positives hit the store once rather than on every request
+        self._answers: dict[str, tuple[bool, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, jti: str):
+        self.filter.add(jti)
+        with self._lock:
+            self._answers.pop(jti, None)
+
+    def rebuild(self, jtis: Iterable[str]):
+        """Replace the filter with one holding only `jtis`.
+
+        The new filter is filled first and swapped in with one assignment, so
+        checks running meanwhile still see every revocation.
+        """
+        fresh = BloomFilter(self.filter.capacity, self.filter.error_rate)
+        for jti in jtis:
+            fresh.add(jti)
+        self.filter = fresh
+        with self._lock:
+            self._answers = {jti: answer for jti, answer in self._answers.items() if answer[0]}
+
+    def is_revoked(self, jti: str | None, expires_at: float | None = None) -> bool:
+        if jti is None or jti not in self.filter:
+            return False
+        if self.confirm is None:
+            return True
+        now = time.time()
+        with self._lock:
+            answer = self._answers.get(jti)
+        if answer is not None and answer[1] > now:
+            return answer[0]
+        revoked = self.confirm(jti)
+        if expires_at is not None:
+            with self._lock:
+                if len(self._answers) >= self.filter.capacity:
+                    self._answers = {
+                        key: value for key, value in self._answers.items() if value[1] > now
+                    }
+                self._answers[jti] = (revoked, expires_at)
+        return revoked
+
+revocation_list = RevocationList(REVOCATION_FILTER_CAPACITY, REVOCATION_FILTER_ERROR_RATE)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -13,12 +136,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    # Unique id, so this token can be revoked on its own
+    to_encode.setdefault("jti", secrets.token_hex(16))
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.JWTError:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.JWTError:
+            return None
+        # Tokens without an expiry are verified every time rather than cached unbounded
+        if "exp" in payload:
+            expires_at = min(float(payload["exp"]), time.time() + TOKEN_CACHE_TTL_SECONDS)
+            token_cache.put(token, payload, expires_at)
+    # Checked on cache hits too, so revocations elsewhere apply without waiting for the TTL
+    if revocation_list.is_revoked(payload.get("jti"), payload.get("exp")):
         return None
+    return payload
+
+def revoke_token(token: str):
+    """Drop a token's cached claims so the next verify_token re-checks it"""
+    token_cache.invalidate(token)
@@ -0,0 +1,257 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Recording is lock-free on the hot path: every thread writes to its own
+shard of each metric, and shards are only summed when /metrics is scraped.
+A lock is taken once per thread per metric, when that thread's shard is
+created, and during a scrape.
+"""
+import bisect
+import math
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+# Seconds; spans fast cache hits through slow upstream generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base for sharded metrics; subclasses define what a shard entry holds"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _snapshots(self) -> list[dict]:
+        # dict() copies in one step under the GIL, so writers never see a torn read
+        with self._lock:
+            return [dict(shard) for shard in self._shards]
+
+    def reset(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type_name}"
+        for suffix, labels, value in self.samples():
+            yield f"{self.name}{suffix}{labels} {format_value(value)}"
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return sum(shard.get(labelvalues, 0) for shard in self._snapshots())
+
+    def totals(self) -> dict[tuple, float]:
+        totals: dict[tuple, float] = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def samples(self):
+        for key, value in sorted(self.totals().items()):
+            yield "", format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    """Up/down gauge; shards hold deltas, so it suits counts like in-flight requests"""
+
+    type_name = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+    @contextmanager
+    def track(self, *labelvalues):
+        self.inc(*labelvalues)
+        try:
+            yield
+        finally:
+            self.dec(*labelvalues)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        shard = self._shard()
+        # Per-bucket (non-cumulative) counts, then sum and count
+        entry = shard.get(labelvalues)
+        if entry is None:
+            entry = shard[labelvalues] = [0] * (len(self.buckets) + 3)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def totals(self) -> dict[tuple, list[float]]:
+        totals: dict[tuple, list[float]] = {}
+        for shard in self._snapshots():
+            for key, entry in shard.items():
+                merged = totals.setdefault(key, [0] * len(entry))
+                for i, value in enumerate(entry):
+                    merged[i] += value
+        return totals
+
+    def count(self, *labelvalues) -> int:
+        entry = self.totals().get(labelvalues)
+        return entry[-1] if entry else 0
+
+    def samples(self):
+        for key, entry in sorted(self.totals().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), entry):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                yield "_bucket", format_labels(self.labelnames, key, le), cumulative
+            labels = format_labels(self.labelnames, key)
+            yield "_sum", labels, entry[-2]
+            yield "_count", labels, entry[-1]
+
+
+class MetricsRegistry:
+    """Holds metrics and scrape-time collectors, and renders them all"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Register a callable returning exposition lines, evaluated on every scrape"""
+        self._collectors.append(collector)
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, documentation: str, values: dict[str, float],
+                labelname: str) -> Iterator[str]:
+    """Exposition lines for a labelled gauge read from a stats() snapshot"""
+    yield f"# HELP {name} {documentation}"
+    yield f"# TYPE {name} gauge"
+    for label, value in values.items():
+        yield f"{name}{format_labels((labelname,), (label,))} {format_value(value)}"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",)
+)
+PASSWORD_HASH_DURATION = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt hash and verify time, including pool queueing",
+    ("operation",),
+)
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "Database statement execution time", ("engine", "operation"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+GEMINI_REQUEST_DURATION = registry.histogram(
+    "gemini_request_duration_seconds", "Gemini call latency", ("operation", "outcome")
+)
+GEMINI_ERRORS = registry.counter(
+    "gemini_errors_total", "Failed Gemini calls by exception type", ("operation", "error")
+)
+GEMINI_TOKENS = registry.counter(
+    "gemini_tokens_total", "Tokens reported by Gemini usage metadata", ("kind",)
+)
+LLM_HEDGES = registry.counter(
+    "llm_hedged_requests_total", "Hedge requests sent, and how many beat the primary", ("result",)
+)
+SEMANTIC_CACHE_SIMILARITY = registry.histogram(
+    "semantic_cache_similarity", "Best cosine similarity found by semantic cache lookups",
+    ("outcome",), buckets=(0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0),
+)
+MESSAGE_WRITER_BATCH_SIZE = registry.histogram(
+    "message_writer_batch_size", "Message rows inserted per group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+MESSAGE_WRITER_COMMIT_DURATION = registry.histogram(
+    "message_writer_commit_duration_seconds", "Time to insert and commit one message batch",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
@@ -1,8 +1,21 @@
+import asyncio
 import bcrypt
+import multiprocessing
+import os
 
-def hash_password(password: str) -> str:
+from concurrent.futures import Executor, ProcessPoolExecutor
+from src.utils.metrics import PASSWORD_HASH_DURATION
+
+# bcrypt work factor for new hashes; each +1 doubles the cost of hashing and checking
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes for hashing; 0 runs bcrypt on the caller's thread pool instead
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(os.cpu_count() or 1)))
+
+_password_pool: ProcessPoolExecutor | None = None
+
+def hash_password(password: str, rounds: int | None = None) -> str:
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
     hashed_password = bcrypt.hashpw(password=pwd_bytes, salt=salt)
     return hashed_password.decode('utf-8')
 
@@ -10,3 +23,49 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_byte_enc = plain_password.encode('utf-8')
     hashed_password_bytes = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password=password_byte_enc, hashed_password=hashed_password_bytes)
+
+def get_hash_rounds(hashed_password: str) -> int:
+    """Read the work factor out of a "$2b$<rounds>$..." bcrypt hash"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        raise ValueError("Invalid bcrypt hash")
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with a different work factor than configured"""
+    return get_hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+def create_password_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned workers import only this module and never inherit server threads
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def get_password_pool() -> Executor | None:
+    """Shared process pool for bcrypt, created on first use; None when disabled"""
+    global _password_pool
+    if PASSWORD_POOL_WORKERS <= 0:
+        return None
+    if _password_pool is None:
+        _password_pool = create_password_pool(PASSWORD_POOL_WORKERS)
+    return _password_pool
+
+def shutdown_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=True)
+        _password_pool = None
+
+async def hash_password_async(password: str) -> str:
+    """Hash on the password pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    with PASSWORD_HASH_DURATION.time("hash"):
+        return await loop.run_in_executor(
+            get_password_pool(), hash_password, password, BCRYPT_ROUNDS
+        )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify on the password pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    with PASSWORD_HASH_DURATION.time("verify"):
+        return await loop.run_in_executor(
+            get_password_pool(), verify_password, plain_password, hashed_password
+        )
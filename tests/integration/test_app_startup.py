@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+from src.backend.main import create_app
+import os
+import subprocess
+import sys
+
+class TestAppStartup:
+    def test_import_has_no_heavy_side_effects(self):
+        """Test that importing the app needs no API key and skips the Gemini SDK"""
+        env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+        probe = (
+            "import sys, src.backend.main; "
+            "assert 'google.generativeai' not in sys.modules, 'Gemini SDK imported eagerly'"
+        )
+        result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True,
+                                text=True, cwd=os.getcwd())
+        assert result.returncode == 0, result.stderr
+
+    def test_create_app_runs_lifespan(self):
+        """Test that a factory-built app starts up and serves requests"""
+        app = create_app()
+        with TestClient(app) as client:
+            assert client.get("/metrics").status_code == 200
+            response = client.post("/login", data={"username": "nobody", "password": "x"})
+            assert response.status_code == 401
+        assert create_app() is not app
@@ -2,7 +2,8 @@ import pytest
 from fastapi.testclient import TestClient
 from src.backend.main import app
 from src.database.models import User
-from src.utils.password import hash_password
+from src.database.database import SessionLocal
+from src.utils.password import hash_password, verify_password, get_hash_rounds, BCRYPT_ROUNDS
 import uuid
 
 client = TestClient(app)
@@ -111,3 +112,73 @@ class TestAuthFlow:
         """Test registration with various invalid data"""
         response = client.post("/register", json=invalid_data)
         assert response.status_code == 422  # Unprocessable Entity
+
+    def test_login_rehashes_outdated_hash(self):
+        """Test that logging in upgrades a hash made with an old work factor"""
+        unique_id = str(uuid.uuid4())[:8]
+        username = f"rehash_{unique_id}"
+        with SessionLocal() as db:
+            db.add(User(username=username, email=f"{username}@example.com",
+                        hashed_password=hash_password("oldpass", rounds=4)))
+            db.commit()
+
+        response = client.post("/login", data={"username": username, "password": "oldpass"})
+        assert response.status_code == 200
+
+        with SessionLocal() as db:
+            stored = db.query(User).filter(User.username == username).first().hashed_password
+        assert get_hash_rounds(stored) == BCRYPT_ROUNDS
+        assert verify_password("oldpass", stored)
+
+class TestTokenLifecycle:
+    @pytest.fixture
+    def login(self):
+        username = f"tokens_{str(uuid.uuid4())[:8]}"
+        with SessionLocal() as db:
+            db.add(User(username=username, email=f"{username}@example.com",
+                        hashed_password=hash_password("tokenpass", rounds=4)))
+            db.commit()
+        response = client.post("/login", data={"username": username, "password": "tokenpass"})
+        assert response.status_code == 200
+        return response.json()
+
+    def test_refresh_rotates_tokens(self, login):
+        """Test that a refresh token buys a working pair and cannot be used again"""
+        response = client.post("/token/refresh", json={"refresh_token": login["refresh_token"]})
+        assert response.status_code == 200
+        tokens = response.json()
+        assert tokens["refresh_token"] != login["refresh_token"]
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/protected", headers=headers).status_code == 200
+
+        response = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 200
+
+    def test_reused_refresh_token_revokes_family(self, login):
+        """Test that replaying a spent refresh token also kills its replacement"""
+        rotated = client.post(
+            "/token/refresh", json={"refresh_token": login["refresh_token"]}
+        ).json()
+
+        replay = client.post("/token/refresh", json={"refresh_token": login["refresh_token"]})
+        assert replay.status_code == 401
+        response = client.post("/token/refresh", json={"refresh_token": rotated["refresh_token"]})
+        assert response.status_code == 401
+
+    def test_unknown_refresh_token(self):
+        """Test that a made-up refresh token is rejected"""
+        response = client.post("/token/refresh", json={"refresh_token": "not-a-token"})
+        assert response.status_code == 401
+
+    def test_logout_revokes_tokens(self, login):
+        """Test that logout stops both the access token and the refresh token working"""
+        headers = {"Authorization": f"Bearer {login['access_token']}"}
+        assert client.get("/protected", headers=headers).status_code == 200
+
+        response = client.post(
+            "/logout", json={"refresh_token": login["refresh_token"]}, headers=headers
+        )
+        assert response.status_code == 200
+        assert client.get("/protected", headers=headers).status_code == 401
+        response = client.post("/token/refresh", json={"refresh_token": login["refresh_token"]})
+        assert response.status_code == 401
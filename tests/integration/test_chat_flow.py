@@ -1,12 +1,17 @@
+from datetime import timedelta
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 from src.backend.main import app
+from src.utils.jwt import create_access_token
+from src.api.gemini import UpstreamBusyError, UpstreamError
 from unittest.mock import patch
+import json
 import pytest
 
 client = TestClient(app)
 
 class TestChatFlow:
-    @patch('src.backend.main.get_chat_response')
+    @patch('src.backend.main.get_chat_response_async')
     def test_chat_interaction(self, mock_generate):
         """Test complete chat flow from frontend to backend"""
         # Setup mock
@@ -25,9 +30,9 @@ class TestChatFlow:
         # Verify response
         assert response.status_code == 200
         assert response.json() == {"response": "Mocked AI response"}
-        mock_generate.assert_called_once_with("Hello AI")
+        mock_generate.assert_called_once_with("Hello AI", history=None, user="testuser")
 
-    @patch('src.backend.main.get_chat_response')
+    @patch('src.backend.main.get_chat_response_async')
     def test_empty_message(self, mock_generate):
         """Test sending empty message"""
         mock_generate.return_value = "Empty message response"
@@ -41,7 +46,7 @@ class TestChatFlow:
         assert response.status_code == 200
         assert "Empty message response" in response.json()["response"]
 
-    @patch('src.backend.main.get_chat_response')
+    @patch('src.backend.main.get_chat_response_async')
     def test_long_message(self, mock_generate):
         """Test sending very long message"""
         long_message = "a" * 10000
@@ -56,7 +61,7 @@ class TestChatFlow:
         assert response.status_code == 200
         assert "Long message response" in response.json()["response"]
 
-    @patch('src.backend.main.get_chat_response')
+    @patch('src.backend.main.get_chat_response_async')
     def test_special_characters(self, mock_generate):
         """Test message with special characters"""
         special_message = "!@#$%^&*()_+{}|:\"<>?~`"
@@ -71,6 +76,28 @@ class TestChatFlow:
         assert response.status_code == 200
         assert "Special chars response" in response.json()["response"]
 
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_busy_returns_503(self, mock_generate):
+        """Test that a rejected upstream call surfaces as 503 Service Unavailable"""
+        mock_generate.side_effect = UpstreamBusyError("Too many pending upstream requests")
+        token = create_access_token(data={"sub": "testuser"})
+
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post("/chat", json={"text": "Hello"}, headers=headers)
+        assert response.status_code == 503
+        assert "busy" in response.json()["detail"]
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_upstream_failure_returns_502(self, mock_generate):
+        """Test that a failed upstream call surfaces as 502 instead of an error reply"""
+        mock_generate.side_effect = UpstreamError("All LLM providers failed: API Error")
+        token = create_access_token(data={"sub": "testuser"})
+
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post("/chat", json={"text": "Hello"}, headers=headers)
+        assert response.status_code == 502
+        assert "API Error" not in response.json()["detail"]
+
     def test_chat_without_token(self):
         """Test accessing chat endpoint without token"""
         response = client.post("/chat", json={"text": "Hello"})
@@ -84,7 +111,7 @@ class TestChatFlow:
         assert response.status_code == 401
         assert "Not authenticated" in response.json()["detail"]
 
-    @patch('src.backend.main.get_chat_response')
+    @patch('src.backend.main.get_chat_response_async')
     def test_multiple_messages(self, mock_generate):
         """Test sending multiple messages in sequence"""
         mock_generate.side_effect = ["Response 1", "Response 2", "Response 3"]
@@ -111,3 +138,204 @@ class TestChatFlow:
         assert response3.json() == {"response": "Response 3"}
         
         assert mock_generate.call_count == 3
+
+class TestChatStreamFlow:
+    def auth_headers(self):
+        token = create_access_token(data={"sub": "testuser"})
+        return {"Authorization": f"Bearer {token}"}
+
+    @patch('src.backend.main.stream_chat_response')
+    def test_stream_chunks_then_end_event(self, mock_stream):
+        """Test that chunks arrive as SSE data frames followed by an end event"""
+        async def chunks(prompt, user):
+            yield "Hello"
+            yield " world"
+        mock_stream.side_effect = chunks
+
+        response = client.post("/chat/stream", json={"text": "Hi"}, headers=self.auth_headers())
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            'data: {"text": "Hello"}\n\n'
+            'data: {"text": " world"}\n\n'
+            'event: end\ndata: {}\n\n'
+        )
+        mock_stream.assert_called_once_with("Hi", user="testuser")
+
+    @patch('src.backend.main.stream_chat_response')
+    def test_stream_error_event(self, mock_stream):
+        """Test that an upstream failure mid-stream is reported as an error event"""
+        async def failing_stream(prompt, user):
+            yield "Partial"
+            raise Exception("API Error")
+        mock_stream.side_effect = failing_stream
+
+        response = client.post("/chat/stream", json={"text": "Hi"}, headers=self.auth_headers())
+
+        assert response.status_code == 200
+        assert 'data: {"text": "Partial"}\n\n' in response.text
+        assert response.text.endswith(
+            'event: error\ndata: {"detail": "Chat service failed to respond, please retry"}\n\n'
+        )
+        assert "API Error" not in response.text
+        assert "event: end" not in response.text
+
+    @patch('src.backend.main.upstream_gate')
+    def test_stream_rejected_when_busy(self, mock_gate):
+        """Test that a full upstream queue is reported as 503 before streaming"""
+        mock_gate.is_full.return_value = True
+
+        response = client.post("/chat/stream", json={"text": "Hi"}, headers=self.auth_headers())
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+    def test_stream_without_token(self):
+        """Test that streaming chat requires authentication"""
+        response = client.post("/chat/stream", json={"text": "Hello"})
+        assert response.status_code == 401
+
+class TestChatSocketFlow:
+    def token(self, **kwargs):
+        return create_access_token(data={"sub": "testuser"}, **kwargs)
+
+    @patch('src.backend.chat_socket.stream_chat_response')
+    def test_socket_streams_replies(self, mock_stream):
+        """Test that several messages share one socket, each streamed as chunks then end"""
+        async def chunks(prompt, history, user):
+            yield f"Re: {prompt}"
+            yield "!"
+        mock_stream.side_effect = chunks
+
+        with client.websocket_connect(f"/ws/chat?token={self.token()}") as websocket:
+            for prompt in ("Hi", "Again"):
+                websocket.send_json({"text": prompt})
+                assert websocket.receive_json() == {"type": "chunk", "text": f"Re: {prompt}"}
+                assert websocket.receive_json() == {"type": "chunk", "text": "!"}
+                assert websocket.receive_json() == {"type": "end"}
+        assert mock_stream.call_count == 2
+
+    @patch('src.backend.chat_socket.stream_chat_response')
+    def test_socket_accepts_authorization_header(self, mock_stream):
+        """Test that the token can also be sent as a bearer header"""
+        async def chunks(prompt, history, user):
+            yield "Hello"
+        mock_stream.side_effect = chunks
+
+        headers = {"Authorization": f"Bearer {self.token()}"}
+        with client.websocket_connect("/ws/chat", headers=headers) as websocket:
+            websocket.send_json({"text": "Hi"})
+            assert websocket.receive_json() == {"type": "chunk", "text": "Hello"}
+
+    @patch('src.backend.chat_socket.stream_chat_response')
+    def test_socket_error_keeps_connection(self, mock_stream):
+        """Test that a failed reply or bad message is reported and the socket stays usable"""
+        async def failing_stream(prompt, history, user):
+            yield "Partial"
+            raise Exception("API Error")
+        mock_stream.side_effect = failing_stream
+
+        with client.websocket_connect(f"/ws/chat?token={self.token()}") as websocket:
+            websocket.send_json({"text": "Hi"})
+            assert websocket.receive_json() == {"type": "chunk", "text": "Partial"}
+            assert websocket.receive_json() == {
+                "type": "error", "detail": "Chat service failed to respond, please retry"
+            }
+
+            websocket.send_text("not json")
+            assert websocket.receive_json()["type"] == "error"
+
+            websocket.send_json({"text": "Hi again"})
+            assert websocket.receive_json() == {"type": "chunk", "text": "Partial"}
+
+    def test_socket_rejects_invalid_token(self):
+        """Test that the handshake is refused without a valid token"""
+        for url in ("/ws/chat", "/ws/chat?token=invalid"):
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                with client.websocket_connect(url):
+                    pass
+            assert exc_info.value.code == 1008
+
+    def test_socket_closes_when_token_expires(self):
+        """Test that an idle socket is closed with 4001 once its token expires"""
+        token = self.token(expires_delta=timedelta(seconds=1))
+        with client.websocket_connect(f"/ws/chat?token={token}") as websocket:
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+        assert exc_info.value.code == 4001
+
+class TestChatBatchFlow:
+    def auth_headers(self, **extra):
+        token = create_access_token(data={"sub": "testuser"})
+        return {"Authorization": f"Bearer {token}", **extra}
+
+    @staticmethod
+    def lines(response):
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    @patch('src.backend.chat_batch.get_chat_response_async')
+    def test_batch_json_array(self, mock_generate):
+        """Test that every prompt is answered once, tagged with its index, then summarized"""
+        async def reply(prompt, user):
+            return f"Re: {prompt}"
+        mock_generate.side_effect = reply
+
+        prompts = ["One", {"text": "Two"}, "Three"]
+        response = client.post("/chat/batch", json=prompts, headers=self.auth_headers())
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        *results, summary = self.lines(response)
+        assert sorted(results, key=lambda r: r["index"]) == [
+            {"index": 0, "response": "Re: One"},
+            {"index": 1, "response": "Re: Two"},
+            {"index": 2, "response": "Re: Three"},
+        ]
+        assert summary == {"done": True, "items": 3, "errors": 0}
+
+    @patch('src.backend.chat_batch.get_chat_response_async')
+    def test_batch_jsonl_item_errors(self, mock_generate):
+        """Test that bad lines and failed prompts are reported without failing the batch"""
+        async def reply(prompt, user):
+            if prompt == "fail":
+                raise UpstreamError("All LLM providers failed: API Error")
+            return "ok"
+        mock_generate.side_effect = reply
+
+        body = '"hello"\n{not json}\n{"text": "fail"}\n\n42\n'
+        response = client.post(
+            "/chat/batch", content=body,
+            headers=self.auth_headers(**{"Content-Type": "application/x-ndjson"}),
+        )
+
+        assert response.status_code == 200
+        *results, summary = self.lines(response)
+        by_index = {result["index"]: result for result in results}
+        assert by_index[0] == {"index": 0, "response": "ok"}
+        assert by_index[1]["status"] == 400
+        assert by_index[2]["status"] == 502
+        assert by_index[3]["status"] == 400
+        assert summary == {"done": True, "items": 4, "errors": 3}
+
+    @patch('src.backend.chat_batch.CHAT_BATCH_BUSY_BACKOFF_SECONDS', 0)
+    @patch('src.backend.chat_batch.get_chat_response_async')
+    def test_batch_retries_busy_items(self, mock_generate):
+        """Test that an item rejected by a full upstream queue is retried"""
+        mock_generate.side_effect = [UpstreamBusyError("Too many pending upstream requests"), "ok"]
+
+        response = client.post("/chat/batch", json=["Hi"], headers=self.auth_headers())
+
+        assert self.lines(response)[0] == {"index": 0, "response": "ok"}
+        assert mock_generate.call_count == 2
+
+    @patch('src.backend.chat_batch.CHAT_BATCH_MAX_ITEMS', 2)
+    def test_batch_limits(self):
+        """Test that oversized and malformed batches are rejected up front"""
+        headers = self.auth_headers()
+        assert client.post("/chat/batch", json=["a", "b", "c"], headers=headers).status_code == 413
+        assert client.post("/chat/batch", json={"text": "a"}, headers=headers).status_code == 400
+
+    def test_batch_without_token(self):
+        """Test that batch chat requires authentication"""
+        assert client.post("/chat/batch", json=["Hello"]).status_code == 401
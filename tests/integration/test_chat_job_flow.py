@@ -0,0 +1,82 @@
+from fastapi.testclient import TestClient
+from src.backend.main import app
+from src.utils.jwt import create_access_token
+from src.api.gemini import UpstreamError
+from unittest.mock import patch
+import uuid
+import pytest
+
+@pytest.fixture
+def client():
+    # Entering the client runs the lifespan, which starts the job workers
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def auth_headers(client):
+    unique_id = uuid.uuid4().hex[:8]
+    credentials = {"username": f"jobs_{unique_id}", "password": f"pass_{unique_id}"}
+    client.post("/register", json={**credentials, "email": f"jobs_{unique_id}@example.com"})
+    token = client.post("/login", data=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+class TestChatJobFlow:
+    @patch('src.backend.chat_jobs.get_chat_response_async')
+    def test_submit_and_long_poll(self, mock_generate, client, auth_headers):
+        """Test that a job is accepted at once and its reply is returned by a long-poll"""
+        mock_generate.return_value = "Background reply"
+
+        response = client.post("/chat/jobs", json={"text": "Hi"}, headers=auth_headers)
+        assert response.status_code == 202
+        assert response.json()["status"] in ("queued", "running", "succeeded")
+
+        job_id = response.json()["id"]
+        job = client.get(f"/chat/jobs/{job_id}", params={"wait": 10}, headers=auth_headers).json()
+        assert job["status"] == "succeeded"
+        assert job["response"] == "Background reply"
+        mock_generate.assert_called_once()
+        assert mock_generate.call_args.args == ("Hi",)
+        # Billed to the submitting user
+        assert mock_generate.call_args.kwargs["history"] is None
+        assert mock_generate.call_args.kwargs["user"].startswith("jobs_")
+
+    @patch('src.backend.chat_jobs.get_chat_response_async')
+    def test_conversation_job_persists_messages(self, mock_generate, client, auth_headers):
+        """Test that a job in a conversation stores the exchange like /chat does"""
+        mock_generate.return_value = "Stored reply"
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+
+        job_id = client.post(
+            "/chat/jobs", json={"text": "Hi", "conversation_id": conversation_id},
+            headers=auth_headers,
+        ).json()["id"]
+        client.get(f"/chat/jobs/{job_id}", params={"wait": 10}, headers=auth_headers)
+
+        messages = client.get(f"/conversations/{conversation_id}/messages", headers=auth_headers)
+        assert [m["content"] for m in messages.json()["items"]] == ["Hi", "Stored reply"]
+
+    @patch('src.backend.chat_jobs.CHAT_JOB_RETRY_BACKOFF_SECONDS', 0)
+    @patch('src.backend.chat_jobs.get_chat_response_async')
+    def test_failed_job_is_retried(self, mock_generate, client, auth_headers):
+        """Test that an upstream failure is retried and later attempts can succeed"""
+        mock_generate.side_effect = [UpstreamError("All LLM providers failed"), "Second try"]
+
+        job_id = client.post("/chat/jobs", json={"text": "Hi"}, headers=auth_headers).json()["id"]
+        job = client.get(f"/chat/jobs/{job_id}", params={"wait": 10}, headers=auth_headers).json()
+
+        assert (job["status"], job["attempts"], job["response"]) == ("succeeded", 2, "Second try")
+
+    @patch('src.backend.chat_jobs.get_chat_response_async')
+    def test_job_scoped_to_owner(self, mock_generate, client, auth_headers):
+        """Test that another user's job is reported as not found"""
+        mock_generate.return_value = "Private reply"
+        job_id = client.post("/chat/jobs", json={"text": "Hi"}, headers=auth_headers).json()["id"]
+
+        other = {"Authorization": f"Bearer {create_access_token(data={'sub': 'someone_else'})}"}
+        assert client.get(f"/chat/jobs/{job_id}", headers=other).status_code == 404
+        assert client.get("/chat/jobs/999999999", headers=auth_headers).status_code == 404
+
+    def test_jobs_require_auth(self, client):
+        """Test that job endpoints are protected"""
+        assert client.post("/chat/jobs", json={"text": "Hi"}).status_code == 401
+        assert client.get("/chat/jobs/1").status_code == 401
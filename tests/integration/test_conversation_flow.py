@@ -0,0 +1,241 @@
+from fastapi.testclient import TestClient
+from src.backend.main import app
+from src.api.context import build_context, estimate_tokens
+from src.database.archive import SegmentStore, archive_conversations
+from src.database.database import SessionLocal, engine
+from src.database.models import Message
+from datetime import timedelta
+from unittest.mock import patch
+import uuid
+import pytest
+
+client = TestClient(app)
+
+def register_and_login() -> dict:
+    """Register a fresh user and return bearer headers for it"""
+    unique_id = str(uuid.uuid4())[:8]
+    credentials = {"username": f"conv_{unique_id}", "password": f"pass_{unique_id}"}
+    client.post("/register", json={**credentials, "email": f"conv_{unique_id}@example.com"})
+    token = client.post("/login", data=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def auth_headers():
+    return register_and_login()
+
+class TestConversationFlow:
+    def test_create_and_list_conversations(self, auth_headers):
+        """Test that conversations are listed newest first across keyset pages"""
+        created = [
+            client.post("/conversations", json={"title": f"Chat {i}"}, headers=auth_headers).json()
+            for i in range(5)
+        ]
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/conversations", params=params, headers=auth_headers).json()
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == [c["id"] for c in reversed(created)]
+
+    def test_conversations_scoped_to_user(self, auth_headers):
+        """Test that users only see their own conversations"""
+        client.post("/conversations", json={"title": "Private"}, headers=auth_headers)
+        other_headers = register_and_login()
+
+        response = client.get("/conversations", headers=other_headers)
+        assert response.status_code == 200
+        assert response.json() == {"items": [], "next_cursor": None}
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_persists_messages(self, mock_generate, auth_headers):
+        """Test that chatting in a conversation stores both sides of the exchange"""
+        mock_generate.side_effect = ["Reply 1", "Reply 2", "Reply 3"]
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+
+        for i in range(1, 4):
+            response = client.post(
+                "/chat", json={"text": f"Prompt {i}", "conversation_id": conversation_id},
+                headers=auth_headers,
+            )
+            assert response.json() == {"response": f"Reply {i}", "conversation_id": conversation_id}
+
+        url = f"/conversations/{conversation_id}/messages"
+        latest = client.get(url, params={"limit": 4}, headers=auth_headers).json()
+        assert [m["content"] for m in latest["items"]] == ["Prompt 2", "Reply 2", "Prompt 3", "Reply 3"]
+        assert [m["role"] for m in latest["items"]] == ["user", "model", "user", "model"]
+
+        older = client.get(
+            url, params={"limit": 4, "before": latest["next_cursor"]}, headers=auth_headers
+        ).json()
+        assert [m["content"] for m in older["items"]] == ["Prompt 1", "Reply 1"]
+        assert older["next_cursor"] is None
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_archived_history_still_pages(self, mock_generate, auth_headers, tmp_path):
+        """Test that history pages run from live messages on into archived ones"""
+        mock_generate.side_effect = [f"Reply {i}" for i in range(1, 5)]
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        body = {"conversation_id": conversation_id}
+        for i in range(1, 4):
+            client.post("/chat", json={**body, "text": f"Prompt {i}"}, headers=auth_headers)
+        other_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        client.post("/chat", json={"text": "Elsewhere", "conversation_id": other_id},
+                    headers=auth_headers)
+
+        store = SegmentStore(str(tmp_path / "archive"))
+        with SessionLocal() as db:
+            for message in db.query(Message).filter(Message.conversation_id == conversation_id):
+                message.created_at -= timedelta(days=400)
+            db.commit()
+            archive_conversations(db, timedelta(days=365), store=store)
+            assert db.query(Message).filter(Message.conversation_id == conversation_id).count() == 0
+
+        url = f"/conversations/{conversation_id}/messages"
+        with patch("src.database.archive.segment_store", store):
+            latest = client.get(url, params={"limit": 4}, headers=auth_headers).json()
+            older = client.get(
+                url, params={"limit": 4, "before": latest["next_cursor"]}, headers=auth_headers
+            ).json()
+        assert [m["content"] for m in latest["items"]] == ["Prompt 2", "Reply 2", "Prompt 3", "Reply 3"]
+        assert [m["content"] for m in older["items"]] == ["Prompt 1", "Reply 1"]
+        assert older["next_cursor"] is None
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_releases_connection_during_upstream_call(self, mock_generate, auth_headers):
+        """Test that no pooled connection is held while waiting on the upstream reply"""
+        checked_out = []
+
+        async def reply(prompt, history=None, user=None):
+            checked_out.append(engine.pool.checkedout())
+            return "Reply"
+
+        mock_generate.side_effect = reply
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        response = client.post(
+            "/chat", json={"text": "Hi", "conversation_id": conversation_id}, headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert checked_out == [0]
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_sends_history(self, mock_generate, auth_headers):
+        """Test that earlier turns of the conversation are sent as context"""
+        mock_generate.side_effect = ["Nice to meet you, Ada", "Your name is Ada"]
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        body = {"conversation_id": conversation_id}
+
+        client.post("/chat", json={**body, "text": "I am Ada"}, headers=auth_headers)
+        client.post("/chat", json={**body, "text": "What is my name?"}, headers=auth_headers)
+
+        first_call, second_call = mock_generate.call_args_list
+        assert first_call.kwargs["history"] == []
+        assert second_call.args == ("What is my name?",)
+        assert second_call.kwargs["history"] == [
+            {"role": "user", "parts": ["I am Ada"]},
+            {"role": "model", "parts": ["Nice to meet you, Ada"]},
+        ]
+
+    @patch('src.backend.chat_socket.stream_chat_response')
+    def test_socket_chat_persists_messages(self, mock_stream, auth_headers):
+        """Test that a WebSocket exchange in a conversation is stored and sent history"""
+        async def chunks(prompt, history, user):
+            yield f"Re: {prompt}"
+        mock_stream.side_effect = chunks
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+
+        with client.websocket_connect("/ws/chat", headers=auth_headers) as websocket:
+            for prompt in ("First", "Second"):
+                websocket.send_json({"text": prompt, "conversation_id": conversation_id})
+                websocket.receive_json()
+                assert websocket.receive_json() == {
+                    "type": "end", "conversation_id": conversation_id
+                }
+
+        assert mock_stream.call_args.args == ("Second", [
+            {"role": "user", "parts": ["First"]}, {"role": "model", "parts": ["Re: First"]},
+        ])
+        messages = client.get(f"/conversations/{conversation_id}/messages", headers=auth_headers)
+        assert [m["content"] for m in messages.json()["items"]] == [
+            "First", "Re: First", "Second", "Re: Second"
+        ]
+
+    @patch('src.backend.conversations.generate_summary')
+    @patch('src.backend.main.get_chat_response_async')
+    def test_dropped_turns_are_summarized(self, mock_generate, mock_summary, auth_headers, monkeypatch):
+        """Test that turns pushed out of the budget are folded into a rolling summary"""
+        monkeypatch.setattr("src.backend.conversations.CHAT_SUMMARY_ENABLED", True)
+        monkeypatch.setattr("src.backend.conversations.CHAT_SUMMARY_MIN_TURNS", 2)
+        mock_generate.return_value = "Reply"
+        mock_summary.return_value = "User introduced themselves"
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        body = {"conversation_id": conversation_id}
+
+        # Budget fits the prompt plus exactly one earlier exchange
+        def tight_budget(turns, prompt, summary=None):
+            return build_context(turns, prompt, summary=summary, budget=estimate_tokens(prompt) + 4)
+
+        with patch("src.backend.conversations.build_context", side_effect=tight_budget):
+            for text in ["First", "Second", "Third"]:
+                client.post("/chat", json={**body, "text": text}, headers=auth_headers)
+
+        mock_summary.assert_awaited_once()
+        assert "user: First" in mock_summary.call_args.args[0]
+        # The next request starts from the summary instead of the dropped turns
+        client.post("/chat", json={**body, "text": "Fourth"}, headers=auth_headers)
+        history = mock_generate.call_args.kwargs["history"]
+        assert "User introduced themselves" in history[0]["parts"][0]
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_in_foreign_conversation(self, mock_generate, auth_headers):
+        """Test that another user's conversation cannot be read or written"""
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        other_headers = register_and_login()
+
+        response = client.post(
+            "/chat", json={"text": "Hi", "conversation_id": conversation_id}, headers=other_headers
+        )
+        assert response.status_code == 404
+        mock_generate.assert_not_called()
+
+        response = client.get(f"/conversations/{conversation_id}/messages", headers=other_headers)
+        assert response.status_code == 404
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_search_stored_messages(self, mock_generate, auth_headers):
+        """Test that stored messages are searchable by their owner only"""
+        mock_generate.return_value = "Try restarting the flux capacitor"
+        conversation_id = client.post("/conversations", json={}, headers=auth_headers).json()["id"]
+        client.post(
+            "/chat", json={"text": "My capacitor broke", "conversation_id": conversation_id},
+            headers=auth_headers,
+        )
+
+        response = client.get("/search", params={"q": "capacitor"}, headers=auth_headers)
+        assert response.status_code == 200
+        hits = response.json()["items"]
+        assert [(hit["role"], hit["conversation_id"]) for hit in hits] == [
+            ("user", conversation_id), ("model", conversation_id)
+        ]
+        assert "<mark>capacitor</mark>" in hits[0]["snippet"]
+
+        other_headers = register_and_login()
+        assert client.get(
+            "/search", params={"q": "capacitor"}, headers=other_headers
+        ).json()["items"] == []
+        assert client.get("/search", params={"q": "capacitor"}).status_code == 401
+
+    def test_invalid_cursor(self, auth_headers):
+        """Test that a malformed cursor is rejected"""
+        response = client.get("/conversations", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_conversations_require_auth(self):
+        """Test that conversation endpoints are protected"""
+        assert client.get("/conversations").status_code == 401
+        assert client.post("/conversations", json={}).status_code == 401
@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+from src.backend.main import app
+
+client = TestClient(app)
+
+class TestMetricsFlow:
+    def test_metrics_exposition(self):
+        """Test that /metrics serves Prometheus text with per-route latency"""
+        client.get("/protected")
+        client.get("/conversations/1/messages")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        series = 'method="GET",route="/protected",status="401"'
+        assert f"http_request_duration_seconds_count{{{series}}} " in text
+        # Routes are labelled by template, not by the concrete path
+        assert 'route="/conversations/{conversation_id}/messages"' in text
+        assert "# TYPE http_requests_in_flight gauge" in text
+        assert "# TYPE db_query_duration_seconds histogram" in text
+        assert 'chat_cache{stat="hits"}' in text
+
+    def test_unmatched_paths_share_a_label(self):
+        """Test that unknown paths do not create a series each"""
+        client.get("/no/such/path/123")
+        assert 'route="unmatched",status="404"' in client.get("/metrics").text
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+from src.backend.main import app
+from src.backend.usage import usage_meter, utc_today
+from src.database.database import SessionLocal
+from src.database.models import TokenUsage, User
+from unittest.mock import patch
+import uuid
+import pytest
+
+client = TestClient(app)
+
+@pytest.fixture
+def user():
+    unique_id = uuid.uuid4().hex[:8]
+    credentials = {"username": f"usage_{unique_id}", "password": f"pass_{unique_id}"}
+    client.post("/register", json={**credentials, "email": f"usage_{unique_id}@example.com"})
+    token = client.post("/login", data=credentials).json()["access_token"]
+    return credentials["username"], {"Authorization": f"Bearer {token}"}
+
+class TestUsageFlow:
+    def test_usage_reports_unflushed_counts(self, user):
+        """Test that /usage includes tokens not yet written to the database"""
+        username, headers = user
+        usage_meter.record(username, 12, 30)
+
+        response = client.get("/usage", headers=headers)
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["username"] == username
+        assert [(d["prompt_tokens"], d["completion_tokens"], d["requests"])
+                for d in body["days"]] == [(12, 30, 1)]
+
+    @patch('src.backend.main.get_chat_response_async')
+    def test_chat_over_quota_is_rejected_before_upstream(self, mock_generate, user):
+        """Test that /chat answers 429 without calling upstream once the quota is used"""
+        username, headers = user
+        usage_meter.record(username, 40, 60)
+
+        with patch.object(usage_meter, "quota", 100):
+            response = client.post("/chat", json={"text": "Hi"}, headers=headers)
+
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        mock_generate.assert_not_called()
+
+    def test_admin_usage_requires_admin(self, user):
+        """Test that other users' usage is only shown to admins"""
+        username, headers = user
+        response = client.get("/admin/usage", params={"username": username}, headers=headers)
+        assert response.status_code == 403
+
+        with patch('src.backend.dependencies.ADMIN_USERNAMES', {username}):
+            response = client.get("/admin/usage", params={"username": username}, headers=headers)
+        assert response.status_code == 200
+
+    def test_shutdown_flushes_counts(self, user):
+        """Test that counts still in memory are written when the app shuts down"""
+        username, _ = user
+        with TestClient(app):
+            usage_meter.record(username, 3, 4)
+
+        assert usage_meter.pending(username, utc_today()) == [0, 0, 0]
+        with SessionLocal() as db:
+            row = db.query(TokenUsage).join(User).filter(User.username == username).one()
+        assert (row.prompt_tokens, row.completion_tokens, row.requests) == (3, 4, 1)
@@ -0,0 +1,58 @@
+from fastapi.testclient import TestClient
+from src.backend.main import app
+from src.utils.jwt import create_access_token
+import json
+import uuid
+import pytest
+
+client = TestClient(app)
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """Register a user, make it an admin and return its bearer headers"""
+    monkeypatch.setattr("src.utils.password.PASSWORD_POOL_WORKERS", 0)
+    monkeypatch.setattr("src.backend.user_import.BCRYPT_ROUNDS", 4)
+    username = f"admin_{uuid.uuid4().hex[:8]}"
+    client.post("/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "adminpass"
+    })
+    monkeypatch.setattr("src.backend.dependencies.ADMIN_USERNAMES", {username})
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': username})}"}
+
+class TestUserImportFlow:
+    def test_import_jsonl(self, admin_headers):
+        """Test importing users from an uploaded JSONL file"""
+        prefix = uuid.uuid4().hex[:6]
+        rows = [
+            {"username": f"{prefix}_a", "email": f"{prefix}_a@example.com", "password": "secret1"},
+            {"username": f"{prefix}_b", "email": f"{prefix}_b@example.com", "password": "secret2"},
+            {"username": f"{prefix}_a", "email": f"{prefix}_c@example.com", "password": "secret3"},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows)
+
+        response = client.post(
+            "/admin/users/import", files={"file": ("users.jsonl", body)}, headers=admin_headers
+        )
+
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["status"] for line in lines[:-1]] == ["created", "created", "duplicate"]
+        assert lines[-1] == {"summary": {"created": 2, "duplicate": 1, "invalid": 0}}
+
+        login = client.post("/login", data={"username": f"{prefix}_b", "password": "secret2"})
+        assert login.status_code == 200
+
+    def test_import_unknown_format(self, admin_headers):
+        """Test that unsupported file types are rejected"""
+        response = client.post(
+            "/admin/users/import", files={"file": ("users.xml", "<users/>")}, headers=admin_headers
+        )
+        assert response.status_code == 400
+
+    def test_import_requires_admin(self):
+        """Test that regular users cannot import"""
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'testuser'})}"}
+        response = client.post(
+            "/admin/users/import", files={"file": ("users.csv", "username\n")}, headers=headers
+        )
+        assert response.status_code in (401, 403)
@@ -0,0 +1,173 @@
+from datetime import timedelta
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import ArchivedRange, Conversation, Message, User, utcnow
+from src.database.archive import (
+    SegmentStore, archive_conversations, enable_incremental_vacuum, incremental_vacuum,
+    read_archived
+)
+from src.backend.conversations import load_turns
+from unittest.mock import patch
+import os
+import pytest
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    enable_incremental_vacuum(engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    with sessionmaker(bind=engine)() as session:
+        session.add(User(id=1, username="alice", email="alice@example.com", hashed_password="x"))
+        session.commit()
+        yield session
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(str(tmp_path / "segments"), max_bytes=1024 * 1024)
+
+def add_conversation(db, conversation_id: int, messages: int, days_old: float) -> list[int]:
+    db.add(Conversation(id=conversation_id, user_id=1))
+    created_at = utcnow() - timedelta(days=days_old)
+    rows = [
+        Message(conversation_id=conversation_id, role="user" if i % 2 == 0 else "model",
+                content=f"c{conversation_id} message {i}", token_count=3,
+                created_at=created_at)
+        for i in range(messages)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+def live_count(db, conversation_id: int) -> int:
+    return db.scalar(
+        select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id)
+    )
+
+class TestArchive:
+    def test_archives_idle_conversations_only(self, db, store):
+        """Test that idle conversations move to segments and recent ones stay live"""
+        old_ids = add_conversation(db, 1, 6, days_old=40)
+        add_conversation(db, 2, 4, days_old=1)
+        add_conversation(db, 3, 2, days_old=50)
+
+        assert archive_conversations(db, timedelta(days=30), store=store) == (1, 6)
+        assert live_count(db, 1) == 0
+        assert live_count(db, 2) == 4
+        archived = read_archived(db, 1, store=store)
+        assert [message.id for message in archived] == list(reversed(old_ids))
+        assert archived[0].content == "c1 message 5"
+
+    def test_skips_conversation_with_newest_message(self, db, store):
+        """Test that the newest message's conversation is kept, so its id is never reused"""
+        add_conversation(db, 1, 2, days_old=40)
+
+        assert archive_conversations(db, timedelta(days=30), store=store) == (0, 0)
+        assert live_count(db, 1) == 2
+
+    def test_reads_ranges_lazily(self, db, store):
+        """Test that reads honour before/after/limit and only open the records they need"""
+        first = add_conversation(db, 1, 4, days_old=40)
+        add_conversation(db, 9, 1, days_old=0)
+        archive_conversations(db, timedelta(days=30), store=store)
+        # Later activity in the same conversation, archived as a second record
+        db.add_all([
+            Message(conversation_id=1, role="user", content=f"late {i}",
+                    created_at=utcnow() - timedelta(days=35))
+            for i in range(2)
+        ])
+        db.commit()
+        add_conversation(db, 10, 1, days_old=0)
+        archive_conversations(db, timedelta(days=30), store=store)
+        assert db.scalar(select(func.count()).select_from(ArchivedRange)) == 2
+
+        page = read_archived(db, 1, limit=3, store=store)
+        assert [message.content for message in page] == ["late 1", "late 0", "c1 message 3"]
+        with patch.object(store, "read", wraps=store.read) as read:
+            older = read_archived(db, 1, before=first[2], store=store)
+        assert [message.id for message in older] == [first[1], first[0]]
+        assert read.call_count == 1
+        assert [m.id for m in read_archived(db, 1, after=first[2], store=store)][-1] == first[3]
+
+    def test_context_includes_archived_turns(self, db, store):
+        """Test that context loading continues from live messages into the archive"""
+        archived_ids = add_conversation(db, 1, 4, days_old=40)
+        add_conversation(db, 9, 1, days_old=0)
+        archive_conversations(db, timedelta(days=30), store=store)
+        db.add(Message(conversation_id=1, role="user", content="back again"))
+        db.commit()
+
+        with patch("src.database.archive.segment_store", store):
+            turns = load_turns(db, 1, after_id=archived_ids[0])
+        assert [turn.content for turn in turns] == [
+            "c1 message 1", "c1 message 2", "c1 message 3", "back again"
+        ]
+
+    def test_failed_append_keeps_messages(self, db, store):
+        """Test that messages stay live when their record cannot be written"""
+        add_conversation(db, 1, 3, days_old=40)
+        add_conversation(db, 9, 1, days_old=0)
+
+        with patch.object(store, "append", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                archive_conversations(db, timedelta(days=30), store=store)
+        assert live_count(db, 1) == 3
+        assert db.scalar(select(func.count()).select_from(ArchivedRange)) == 0
+
+    def test_segments_roll_over(self, db, tmp_path):
+        """Test that a full segment is closed and later records go to a new one"""
+        store = SegmentStore(str(tmp_path / "segments"), max_bytes=1)
+        for conversation_id in range(1, 4):
+            add_conversation(db, conversation_id, 2, days_old=40)
+            add_conversation(db, 100 + conversation_id, 1, days_old=0)
+            archive_conversations(db, timedelta(days=30), store=store)
+
+        assert len(os.listdir(tmp_path / "segments")) == 3
+        assert [m.content for m in read_archived(db, 2, store=store)] == [
+            "c2 message 1", "c2 message 0"
+        ]
+
+    def test_zstd_records(self, db, tmp_path):
+        """Test that zstd segments round-trip when zstandard is installed"""
+        pytest.importorskip("zstandard")
+        store = SegmentStore(str(tmp_path / "segments"), codec="zstd")
+        add_conversation(db, 1, 2, days_old=40)
+        add_conversation(db, 9, 1, days_old=0)
+        archive_conversations(db, timedelta(days=30), store=store)
+
+        assert os.listdir(tmp_path / "segments")[0].endswith(".jsonl.zst")
+        assert len(read_archived(db, 1, store=store)) == 2
+
+    def test_unknown_codec_rejected(self, tmp_path):
+        """Test that an unsupported ARCHIVE_COMPRESSION fails early"""
+        with pytest.raises(ValueError):
+            SegmentStore(str(tmp_path), codec="lz4")
+
+class TestIncrementalVacuum:
+    def test_releases_freed_pages(self, engine, db, store):
+        """Test that archived messages' pages are returned to the filesystem"""
+        add_conversation(db, 1, 2000, days_old=40)
+        add_conversation(db, 9, 1, days_old=0)
+        archive_conversations(db, timedelta(days=30), store=store)
+
+        assert incremental_vacuum(engine) > 0
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+
+    def test_existing_database_needs_rebuild(self, tmp_path):
+        """Test that a database with tables is only converted when a rebuild is allowed"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        Base.metadata.create_all(bind=engine)
+        try:
+            assert not enable_incremental_vacuum(engine)
+            assert incremental_vacuum(engine) == 0
+            assert enable_incremental_vacuum(engine, rebuild=True)
+            with engine.connect() as conn:
+                assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+        finally:
+            engine.dispose()
@@ -0,0 +1,31 @@
+from src.utils.bloom import BloomFilter
+
+
+class TestBloomFilter:
+    def test_no_false_negatives(self):
+        """Test that every added item is reported as present"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"token-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        assert all(item in bloom for item in items)
+        assert len(bloom) == 1000
+
+    def test_false_positive_rate_near_target(self):
+        """Test that unseen items rarely match once the filter is at capacity"""
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        for i in range(2000):
+            bloom.add(f"revoked-{i}")
+
+        false_positives = sum(f"active-{i}" in bloom for i in range(20000))
+        assert false_positives / 20000 < 0.02
+
+    def test_clear(self):
+        """Test that clearing forgets every item"""
+        bloom = BloomFilter(capacity=10)
+        bloom.add("jti")
+        bloom.clear()
+
+        assert "jti" not in bloom
+        assert len(bloom) == 0
@@ -0,0 +1,96 @@
+from unittest.mock import patch
+from src.api.cache import ResponseCache, SQLiteCacheTier, make_cache_key
+import asyncio
+import threading
+
+class TestResponseCache:
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted as hits or misses"""
+        cache = ResponseCache(max_entries=10, ttl_seconds=60)
+        assert cache.get("Hello", "model-a") is None
+        cache.set("Hello", "model-a", "Hi there")
+
+        assert cache.get("Hello", "model-a") == "Hi there"
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_key_normalizes_whitespace(self):
+        """Test that prompts differing only in whitespace share an entry"""
+        assert make_cache_key("  Hello \n world ", "m") == make_cache_key("Hello world", "m")
+
+    def test_key_includes_model(self):
+        """Test that the same prompt is cached separately per model"""
+        cache = ResponseCache(max_entries=10, ttl_seconds=60)
+        cache.set("Hello", "model-a", "From A")
+        assert cache.get("Hello", "model-b") is None
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted at capacity"""
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        cache.set("one", "m", "1")
+        cache.set("two", "m", "2")
+        cache.get("one", "m")  # "two" is now least recently used
+        cache.set("three", "m", "3")
+
+        assert cache.get("two", "m") is None
+        assert cache.get("one", "m") == "1"
+        assert cache.get("three", "m") == "3"
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """Test that entries are dropped once their TTL has passed"""
+        cache = ResponseCache(max_entries=10, ttl_seconds=30)
+        with patch("src.api.cache.time.monotonic", return_value=1000.0):
+            cache.set("Hello", "m", "Hi")
+        with patch("src.api.cache.time.monotonic", return_value=1031.0):
+            assert cache.get("Hello", "m") is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["size"] == 0
+
+    def test_disabled_cache(self):
+        """Test that a zero-size cache never stores anything"""
+        cache = ResponseCache(max_entries=0, ttl_seconds=60)
+        cache.set("Hello", "m", "Hi")
+        assert cache.get("Hello", "m") is None
+
+class TestSQLiteCacheTier:
+    def test_survives_restart(self, tmp_path):
+        """Test that replies cached in one instance are served by a new one"""
+        path = str(tmp_path / "cache.db")
+        ResponseCache(persistent_tier=SQLiteCacheTier(path)).set("Hello", "m", "Hi")
+
+        restarted = ResponseCache(persistent_tier=SQLiteCacheTier(path))
+        assert restarted.get("Hello", "m") == "Hi"
+        assert restarted.stats()["persistent_hits"] == 1
+        # Promoted into memory, so the next lookup does not touch SQLite
+        assert restarted.stats()["size"] == 1
+
+    def test_async_access_keeps_sqlite_off_the_loop(self, tmp_path):
+        """Test that get_async/set_async reach the persistent tier from a worker thread"""
+        tier = SQLiteCacheTier(str(tmp_path / "cache.db"))
+        threads = []
+        for name in ("get", "set"):
+            original = getattr(tier, name)
+            def record(*args, original=original):
+                threads.append(threading.current_thread())
+                return original(*args)
+            setattr(tier, name, record)
+        cache = ResponseCache(persistent_tier=tier)
+
+        async def scenario():
+            assert await cache.get_async("Hello", "m") is None
+            await cache.set_async("Hello", "m", "Hi")
+            assert await cache.get_async("Hello", "m") == "Hi"  # from memory
+
+        asyncio.run(scenario())
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+        assert cache.stats()["misses"] == 1
+
+    def test_expired_rows_ignored(self, tmp_path):
+        """Test that expired persistent entries are treated as misses"""
+        tier = SQLiteCacheTier(str(tmp_path / "cache.db"))
+        tier.set("key", "value", expires_at=0)
+        assert tier.get("key") is None
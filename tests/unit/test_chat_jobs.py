@@ -0,0 +1,108 @@
+from datetime import timedelta
+from sqlalchemy import update
+from src.backend.chat_jobs import (
+    JobWorkerPool, complete_job, enqueue_job, fail_job, lease_job, release_job
+)
+from src.database.models import ChatJob, User, utcnow
+from src.api.gemini import UpstreamBusyError
+from unittest.mock import patch
+import asyncio
+import pytest
+
+@pytest.fixture(autouse=True)
+def job_settings(monkeypatch):
+    monkeypatch.setattr("src.backend.chat_jobs.CHAT_JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr("src.backend.chat_jobs.CHAT_JOB_RETRY_BACKOFF_SECONDS", 60)
+
+def expire_leases(db):
+    """Move every lease and retry delay into the past"""
+    db.execute(update(ChatJob).values(available_at=utcnow() - timedelta(seconds=1)))
+    db.commit()
+
+class TestChatJobQueue:
+    def test_lease_oldest_job_once(self, test_db):
+        """Test that jobs are leased oldest first and a leased job is not handed out again"""
+        first = enqueue_job(test_db, 1, "First")
+        second = enqueue_job(test_db, 1, "Second")
+
+        leased = lease_job(test_db)
+        assert (leased.id, leased.prompt, leased.attempt) == (first.id, "First", 1)
+        assert lease_job(test_db).id == second.id
+        assert lease_job(test_db) is None
+        assert test_db.get(ChatJob, first.id).status == "running"
+
+    def test_complete_job(self, test_db):
+        """Test that completing a leased job stores the reply"""
+        job_id = enqueue_job(test_db, 1, "Hi").id
+
+        assert complete_job(test_db, lease_job(test_db), "Hello")
+
+        job = test_db.get(ChatJob, job_id)
+        test_db.refresh(job)
+        assert (job.status, job.response) == ("succeeded", "Hello")
+        assert job.finished_at is not None
+
+    def test_lapsed_lease_is_fenced(self, test_db):
+        """Test that a lapsed lease is re-leased and the old holder can no longer finish"""
+        enqueue_job(test_db, 1, "Hi")
+        stale = lease_job(test_db)
+        expire_leases(test_db)
+
+        fresh = lease_job(test_db)
+        assert (fresh.id, fresh.attempt) == (stale.id, 2)
+        assert not complete_job(test_db, stale, "Late reply")
+        assert complete_job(test_db, fresh, "Reply")
+
+    def test_failed_job_retried_with_backoff(self, test_db):
+        """Test that a failure requeues the job after a delay until attempts run out"""
+        job_id = enqueue_job(test_db, 1, "Hi").id
+
+        assert fail_job(test_db, lease_job(test_db), "API Error")
+        assert lease_job(test_db) is None  # still backing off
+        expire_leases(test_db)
+        assert fail_job(test_db, lease_job(test_db), "API Error again")
+
+        job = test_db.get(ChatJob, job_id)
+        test_db.refresh(job)
+        assert (job.status, job.attempts, job.error) == ("failed", 2, "API Error again")
+        expire_leases(test_db)
+        assert lease_job(test_db) is None
+
+    def test_lapsed_last_attempt_fails_job(self, test_db):
+        """Test that a job whose final lease lapses is failed instead of retried forever"""
+        job_id = enqueue_job(test_db, 1, "Hi").id
+        lease_job(test_db)
+        expire_leases(test_db)
+        lease_job(test_db)
+        expire_leases(test_db)
+
+        assert lease_job(test_db) is None
+        job = test_db.get(ChatJob, job_id)
+        test_db.refresh(job)
+        assert job.status == "failed"
+
+    def test_release_keeps_attempt(self, test_db):
+        """Test that an interrupted job is requeued without using up an attempt"""
+        enqueue_job(test_db, 1, "Hi")
+
+        assert release_job(test_db, lease_job(test_db))
+        assert lease_job(test_db).attempt == 1
+
+    def test_busy_upstream_keeps_attempt(self, test_db):
+        """Test that local upstream backpressure defers a job without using up an attempt"""
+        test_db.add(User(id=1, username="alice", email="alice@example.com", hashed_password="x"))
+        test_db.commit()
+        job_id = enqueue_job(test_db, 1, "Hi").id
+        async def in_test_db(_, func, *args):
+            # The in-memory test database lives on this thread only
+            return func(test_db, *args)
+        busy = UpstreamBusyError("Too many pending upstream requests")
+        with patch("src.backend.chat_jobs.run_in_threadpool", in_test_db), \
+                patch("src.backend.chat_jobs.get_chat_response_async", side_effect=busy):
+            for _ in range(3):
+                asyncio.run(JobWorkerPool(workers=0).process(lease_job(test_db)))
+                expire_leases(test_db)
+
+        job = test_db.get(ChatJob, job_id)
+        test_db.refresh(job)
+        assert (job.status, job.attempts) == ("queued", 0)
@@ -0,0 +1,98 @@
+from src.api.coalescing import RequestCoalescer
+import asyncio
+import pytest
+
+class TestRequestCoalescer:
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that identical in-flight requests trigger a single upstream call"""
+        coalescer = RequestCoalescer()
+        calls = 0
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "shared result"
+
+        async def run():
+            return await asyncio.gather(*(coalescer.run("key", upstream) for _ in range(5)))
+
+        results = asyncio.run(run())
+        assert results == ["shared result"] * 5
+        assert calls == 1
+        assert coalescer.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+    def test_different_keys_run_separately(self):
+        """Test that distinct prompts are not coalesced"""
+        coalescer = RequestCoalescer()
+
+        async def run():
+            return await asyncio.gather(
+                coalescer.run("a", lambda: asyncio.sleep(0, result="A")),
+                coalescer.run("b", lambda: asyncio.sleep(0, result="B")),
+            )
+
+        assert asyncio.run(run()) == ["A", "B"]
+        assert coalescer.started == 2
+
+    def test_errors_propagate_to_all_waiters(self):
+        """Test that an upstream exception is raised in every waiting caller"""
+        coalescer = RequestCoalescer()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        async def run():
+            return await asyncio.gather(
+                *(coalescer.run("key", failing) for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(coalescer) == 0
+
+    def test_cancelled_waiter_does_not_cancel_others(self):
+        """Test that one caller cancelling leaves the shared call running"""
+        coalescer = RequestCoalescer()
+
+        async def upstream():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def run():
+            first = asyncio.create_task(coalescer.run("key", upstream))
+            second = asyncio.create_task(coalescer.run("key", upstream))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(run()) == "done"
+
+    def test_upstream_cancelled_when_all_waiters_leave(self):
+        """Test that the shared call is cancelled once nobody is waiting for it"""
+        coalescer = RequestCoalescer()
+
+        async def run():
+            upstream_cancelled = asyncio.Event()
+
+            async def upstream():
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    upstream_cancelled.set()
+                    raise
+
+            waiter = asyncio.create_task(coalescer.run("key", upstream))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            await asyncio.wait_for(upstream_cancelled.wait(), timeout=1)
+            # A new caller starts a fresh call instead of joining the cancelled one
+            return await coalescer.run("key", lambda: asyncio.sleep(0, result="fresh"))
+
+        assert asyncio.run(run()) == "fresh"
+        assert coalescer.started == 2
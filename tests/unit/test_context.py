@@ -0,0 +1,81 @@
+from src.api.context import Turn, build_context, estimate_tokens, summary_prompt, SUMMARY_PREFIX
+import pytest
+
+def make_turns(count: int, tokens: int = 10) -> list[Turn]:
+    """Alternating user/model turns with fixed token counts"""
+    return [
+        Turn(id=i + 1, role="user" if i % 2 == 0 else "model", content=f"turn {i + 1}",
+             token_count=tokens)
+        for i in range(count)
+    ]
+
+class TestEstimateTokens:
+    @pytest.mark.parametrize("text,expected", [
+        ("", 1),
+        ("Hello", 2),  # five characters span two four-character pieces
+        ("Hi there!", 4),
+        ("a b c d", 4),
+    ])
+    def test_estimates(self, text, expected):
+        """Test the word/punctuation based token estimate"""
+        assert estimate_tokens(text) == expected
+
+    def test_grows_with_length(self):
+        """Test that longer text never estimates fewer tokens"""
+        assert estimate_tokens("word " * 100) > estimate_tokens("word " * 10)
+
+class TestBuildContext:
+    def test_includes_everything_within_budget(self):
+        """Test that a short history is sent in full, in order"""
+        context = build_context(make_turns(4), "next", budget=1000)
+
+        assert [c["parts"][0] for c in context.contents] == ["turn 1", "turn 2", "turn 3", "turn 4"]
+        assert [c["role"] for c in context.contents] == ["user", "model", "user", "model"]
+        assert context.dropped_turns == 0
+        assert context.oldest_included_id == 1
+
+    def test_keeps_most_recent_turns(self):
+        """Test that older turns are dropped once the budget is exhausted"""
+        prompt_tokens = estimate_tokens("next")
+        context = build_context(make_turns(10), "next", budget=prompt_tokens + 40)
+
+        assert [c["parts"][0] for c in context.contents] == ["turn 7", "turn 8", "turn 9", "turn 10"]
+        assert context.dropped_turns == 6
+        assert context.token_count <= prompt_tokens + 40
+
+    def test_history_starts_with_user_turn(self):
+        """Test that a leading model turn left by the cut is removed"""
+        prompt_tokens = estimate_tokens("next")
+        context = build_context(make_turns(10), "next", budget=prompt_tokens + 30)
+
+        assert context.contents[0]["role"] == "user"
+        assert [c["parts"][0] for c in context.contents] == ["turn 9", "turn 10"]
+        assert context.oldest_included_id == 9
+
+    def test_summary_counts_against_budget(self):
+        """Test that a rolling summary is prepended and takes budget from history"""
+        prompt_tokens = estimate_tokens("next")
+        summary = "The user is planning a trip to Lisbon"
+        budget = prompt_tokens + estimate_tokens(summary) + 20
+        context = build_context(make_turns(10), "next", summary=summary, budget=budget)
+
+        assert context.contents[0]["parts"][0] == f"{SUMMARY_PREFIX}\n{summary}"
+        assert [c["parts"][0] for c in context.contents[2:]] == ["turn 9", "turn 10"]
+
+    def test_prompt_alone_over_budget(self):
+        """Test that the prompt is still sent when it exceeds the budget by itself"""
+        context = build_context(make_turns(4), "a very long prompt " * 50, budget=10)
+        assert context.contents == []
+        assert context.dropped_turns == 4
+
+    def test_uses_stored_token_counts(self):
+        """Test that stored counts are used instead of re-estimating content"""
+        turns = [Turn(id=1, role="user", content="short", token_count=500)]
+        context = build_context(turns, "next", budget=100)
+        assert context.contents == []
+
+    def test_summary_prompt_includes_previous_summary(self):
+        """Test the summarization instruction carries the old summary and new turns"""
+        instruction = summary_prompt("Earlier facts", make_turns(2))
+        assert "Earlier facts" in instruction
+        assert "user: turn 1" in instruction and "model: turn 2" in instruction
@@ -1,4 +1,12 @@
-from src.database.models import User
+from src.database.models import User, Conversation, Message
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from src.database.database import (
+    Base, SQLITE_PRAGMAS, make_async_engine, make_engine, to_async_url
+)
+import asyncio
 from src.utils.password import hash_password
 import pytest
 
@@ -106,3 +114,99 @@ class TestDatabaseOperations:
         with pytest.raises(Exception):
             test_db.commit()
         test_db.rollback()
+
+class TestConversationModels:
+    def test_conversation_messages(self, test_db):
+        """Test storing a conversation with its messages"""
+        user = User(username="chatter", email="chatter@example.com", hashed_password="x")
+        test_db.add(user)
+        test_db.commit()
+        conversation = Conversation(user_id=user.id, title="First chat")
+        test_db.add(conversation)
+        test_db.commit()
+        test_db.add_all([
+            Message(conversation_id=conversation.id, role="user", content="Hi"),
+            Message(conversation_id=conversation.id, role="model", content="Hello!"),
+        ])
+        test_db.commit()
+
+        messages = test_db.query(Message).filter(Message.conversation_id == conversation.id).all()
+        assert [m.content for m in messages] == ["Hi", "Hello!"]
+        assert conversation.created_at is not None
+
+    def test_pagination_indexes(self, test_db):
+        """Test that the composite indexes backing keyset pagination exist"""
+        inspector = inspect(test_db.get_bind())
+        conversation_indexes = {
+            i["name"]: i["column_names"] for i in inspector.get_indexes("conversations")
+        }
+        message_indexes = {i["name"]: i["column_names"] for i in inspector.get_indexes("messages")}
+        assert conversation_indexes["ix_conversations_user_created"] == ["user_id", "created_at"]
+        assert message_indexes["ix_messages_conversation_id"] == ["conversation_id", "id"]
+
+
+class TestAsyncDatabase:
+    @pytest.mark.parametrize("url,expected", [
+        ("sqlite:///./test.db", "sqlite+aiosqlite:///./test.db"),
+        ("postgresql://user:pw@db:5432/chat", "postgresql+asyncpg://user:pw@db:5432/chat"),
+        ("postgresql+psycopg2://user:pw@db/chat", "postgresql+asyncpg://user:pw@db/chat"),
+        ("mysql+aiomysql://user:pw@db/chat", "mysql+aiomysql://user:pw@db/chat"),
+    ])
+    def test_to_async_url(self, url, expected):
+        """Test that sync URLs are mapped to their async drivers"""
+        assert to_async_url(url) == expected
+
+    def test_async_session_roundtrip(self):
+        """Test creating and reading a user through an AsyncSession"""
+        async def run():
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with async_sessionmaker(engine)() as db:
+                db.add(User(username="async_user", email="async@example.com", hashed_password="x"))
+                await db.commit()
+                user = await db.scalar(select(User).where(User.username == "async_user"))
+            await engine.dispose()
+            return user.email
+
+        assert asyncio.run(run()) == "async@example.com"
+
+class TestSQLiteProfile:
+    def test_pragmas_applied(self, tmp_path):
+        """Test that every new connection gets the tuned SQLite pragmas"""
+        engine = make_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            assert busy_timeout == SQLITE_PRAGMAS["busy_timeout"]
+            assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+        engine.dispose()
+
+    def test_read_engine_refuses_writes(self, tmp_path):
+        """Test that the read-only engine can query but not modify data"""
+        url = f"sqlite:///{tmp_path / 'split.db'}"
+        write_engine, read_engine = make_engine(url), make_engine(url, read_only=True)
+        Base.metadata.create_all(bind=write_engine)
+        with sessionmaker(bind=write_engine)() as db:
+            db.add(User(username="reader", email="reader@example.com", hashed_password="x"))
+            db.commit()
+
+        with sessionmaker(bind=read_engine)() as db:
+            assert db.query(User).filter(User.username == "reader").first() is not None
+            db.add(User(username="writer", email="writer@example.com", hashed_password="x"))
+            with pytest.raises(OperationalError, match="readonly"):
+                db.commit()
+        write_engine.dispose()
+        read_engine.dispose()
+
+    def test_async_engine_pragmas(self, tmp_path):
+        """Test that the async engine applies the same connection profile"""
+        async def run():
+            engine = make_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+            async with engine.connect() as conn:
+                mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+            await engine.dispose()
+            return mode
+
+        assert asyncio.run(run()) == "wal"
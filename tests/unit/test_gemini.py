@@ -1,7 +1,40 @@
-from unittest.mock import Mock, patch
-from src.api.gemini import get_chat_response
+from unittest.mock import AsyncMock, Mock, patch
+from src.api.gemini import (
+    get_chat_response, get_chat_response_async, stream_chat_response, get_model,
+    response_cache, provider_router, ConcurrencyGate, UpstreamBusyError, UpstreamError
+)
+from src.utils.metrics import GEMINI_ERRORS, GEMINI_REQUEST_DURATION, GEMINI_TOKENS
+import asyncio
 import pytest
 
+@pytest.fixture(autouse=True)
+def fresh_model():
+    """Drop the shared model and cached replies so each test sees its own mock"""
+    get_model.cache_clear()
+    response_cache.clear()
+    provider_router.reset()
+    yield
+    get_model.cache_clear()
+    response_cache.clear()
+    provider_router.reset()
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+class AsyncChunks:
+    """Minimal stand-in for the async streaming response returned by the SDK"""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
 class TestGeminiIntegration:
     @patch('src.api.gemini.genai.GenerativeModel')
     def test_chat_response_generation(self, mock_model):
@@ -59,3 +92,227 @@ class TestGeminiIntegration:
         mock_getenv.return_value = None
         with pytest.raises(ValueError, match="GEMINI_API_KEY environment variable not set"):
             get_chat_response("Test prompt")
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_model_instance_is_shared(self, mock_model):
+        """Test that the model is constructed once and reused across calls"""
+        mock_model.return_value.generate_content.return_value.text = "Mocked response"
+
+        get_chat_response("First")
+        get_chat_response("Second")
+
+        mock_model.assert_called_once_with('gemini-2.0-flash')
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_async_chat_response(self, mock_model):
+        """Test the async path uses the SDK's async generate API"""
+        mock_generate = AsyncMock(return_value=Mock(text="Async response"))
+        mock_model.return_value.generate_content_async = mock_generate
+
+        response = asyncio.run(get_chat_response_async("Test prompt"))
+
+        assert response == "Async response"
+        mock_generate.assert_awaited_once_with("Test prompt")
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_async_chat_response_error(self, mock_model):
+        """Test upstream failures on the async path raise UpstreamError"""
+        mock_model.return_value.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
+
+        with pytest.raises(UpstreamError, match="API Error"):
+            asyncio.run(get_chat_response_async("Test prompt"))
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_async_chat_response_cached(self, mock_model):
+        """Test that a repeated prompt is answered from cache without an upstream call"""
+        mock_generate = AsyncMock(return_value=Mock(text="Cached response"))
+        mock_model.return_value.generate_content_async = mock_generate
+
+        first = asyncio.run(get_chat_response_async("What is FastAPI?"))
+        second = asyncio.run(get_chat_response_async("  What is   FastAPI? "))
+
+        assert first == second == "Cached response"
+        mock_generate.assert_awaited_once()
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_async_chat_response_semantic_cache(self, mock_model):
+        """Test that a reworded prompt is served by the semantic cache, per user scope"""
+        from src.api.semantic_cache import SemanticCache
+        mock_generate = AsyncMock(side_effect=[Mock(text="Summary A"), Mock(text="Summary B")])
+        mock_model.return_value.generate_content_async = mock_generate
+        prompt = "Summarize the following article about climate change policy in Europe"
+
+        with patch('src.api.gemini.semantic_cache', SemanticCache(capacity=8, dim=256)), \
+                patch('src.api.gemini.SEMANTIC_CACHE_SCOPE', "user"):
+            first = asyncio.run(get_chat_response_async(prompt, user="alice"))
+            reworded = asyncio.run(get_chat_response_async(f"Please {prompt}.", user="alice"))
+            other_user = asyncio.run(get_chat_response_async(f"Please {prompt}.", user="bob"))
+
+        assert first == reworded == "Summary A"
+        assert other_user == "Summary B"
+        assert mock_generate.await_count == 2
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_user_scope_keeps_exact_replies_private(self, mock_model):
+        """Test that with a per-user scope one user's reply is never served to another"""
+        replies = iter(["Reply for alice", "Reply for bob"])
+        async def slow_generate(prompt):
+            reply = next(replies)
+            await asyncio.sleep(0.01)
+            return Mock(text=reply)
+        mock_generate = AsyncMock(side_effect=slow_generate)
+        mock_model.return_value.generate_content_async = mock_generate
+
+        async def run():
+            # Concurrent, so a shared coalescer key would hand bob alice's call
+            return await asyncio.gather(
+                get_chat_response_async("what is my plan", user="alice"),
+                get_chat_response_async("what is my plan", user="bob"),
+            )
+        with patch('src.api.gemini.SEMANTIC_CACHE_SCOPE', "user"):
+            alice, bob = asyncio.run(run())
+            again = asyncio.run(get_chat_response_async("what is my plan", user="bob"))
+
+        assert (alice, bob) == ("Reply for alice", "Reply for bob")
+        assert again == "Reply for bob"
+        assert mock_generate.await_count == 2
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_async_chat_response_errors_not_cached(self, mock_model):
+        """Test that upstream errors are retried rather than served from cache"""
+        mock_generate = AsyncMock(side_effect=[Exception("API Error"), Mock(text="Recovered")])
+        mock_model.return_value.generate_content_async = mock_generate
+
+        with pytest.raises(UpstreamError):
+            asyncio.run(get_chat_response_async("Retry me"))
+        assert asyncio.run(get_chat_response_async("Retry me")) == "Recovered"
+        assert mock_generate.await_count == 2
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_async_chat_response_coalesced(self, mock_model):
+        """Test that concurrent identical prompts share one upstream call"""
+        async def slow_generate(prompt):
+            await asyncio.sleep(0.01)
+            return Mock(text="Shared response")
+        mock_generate = AsyncMock(side_effect=slow_generate)
+        mock_model.return_value.generate_content_async = mock_generate
+
+        async def run():
+            return await asyncio.gather(*(get_chat_response_async("Same prompt") for _ in range(4)))
+
+        assert asyncio.run(run()) == ["Shared response"] * 4
+        mock_generate.assert_awaited_once()
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_stream_chat_response_yields_chunks(self, mock_model):
+        """Test that streamed chunks are yielded in order as they arrive"""
+        chunks = [Mock(text="Hel"), Mock(text="lo"), Mock(text="!")]
+        mock_generate = AsyncMock(return_value=AsyncChunks(chunks))
+        mock_model.return_value.generate_content_async = mock_generate
+
+        result = asyncio.run(collect(stream_chat_response("Test prompt")))
+
+        assert result == ["Hel", "lo", "!"]
+        mock_generate.assert_awaited_once_with("Test prompt", stream=True)
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_stream_chat_response_skips_empty_chunks(self, mock_model):
+        """Test that metadata-only chunks without text parts are skipped"""
+        chunks = [Mock(text="Hi"), Mock(parts=[])]
+        mock_model.return_value.generate_content_async = AsyncMock(return_value=AsyncChunks(chunks))
+
+        assert asyncio.run(collect(stream_chat_response("Test prompt"))) == ["Hi"]
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_stream_chat_response_raises_errors(self, mock_model):
+        """Test that streaming errors are raised instead of returned as text"""
+        mock_model.return_value.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
+
+        with pytest.raises(Exception, match="API Error"):
+            asyncio.run(collect(stream_chat_response("Test prompt")))
+
+class TestGeminiMetrics:
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_records_latency_and_tokens(self, mock_model):
+        """Test that a successful call records its latency and token usage"""
+        usage = Mock(prompt_token_count=12, candidates_token_count=30)
+        mock_model.return_value.generate_content_async = AsyncMock(
+            return_value=Mock(text="Counted", usage_metadata=usage)
+        )
+        calls = GEMINI_REQUEST_DURATION.count("chat", "ok")
+        prompt_tokens = GEMINI_TOKENS.value("prompt")
+        completion_tokens = GEMINI_TOKENS.value("completion")
+
+        asyncio.run(get_chat_response_async("Count my tokens"))
+
+        assert GEMINI_REQUEST_DURATION.count("chat", "ok") == calls + 1
+        assert GEMINI_TOKENS.value("prompt") == prompt_tokens + 12
+        assert GEMINI_TOKENS.value("completion") == completion_tokens + 30
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_bills_tokens_to_user(self, mock_model):
+        """Test that usage listeners receive each response's tokens for the calling user"""
+        usage = Mock(prompt_token_count=5, candidates_token_count=7)
+        mock_model.return_value.generate_content_async = AsyncMock(
+            return_value=Mock(text="Billed", usage_metadata=usage)
+        )
+        listener = Mock()
+
+        with patch('src.api.gemini.usage_listeners', [listener]):
+            asyncio.run(get_chat_response_async("Bill me", user="alice"))
+            asyncio.run(get_chat_response_async("Bill me", user="alice"))
+
+        # The second call was served from cache and costs nothing
+        listener.assert_called_once_with("alice", 5, 7)
+
+    @patch('src.api.gemini.genai.GenerativeModel')
+    def test_counts_errors_by_type(self, mock_model):
+        """Test that failed calls are counted under their exception type"""
+        mock_model.return_value.generate_content.side_effect = TimeoutError("slow")
+        errors = GEMINI_ERRORS.value("chat", "TimeoutError")
+
+        get_chat_response("Test prompt")
+
+        assert GEMINI_ERRORS.value("chat", "TimeoutError") == errors + 1
+
+class TestConcurrencyGate:
+    def test_limits_in_flight_calls(self):
+        """Test that no more than max_concurrency callers hold the gate"""
+        gate = ConcurrencyGate(max_concurrency=2, max_waiting=10)
+        peak = 0
+
+        async def worker():
+            nonlocal peak
+            async with gate:
+                peak = max(peak, gate.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(worker() for _ in range(6)))
+
+        asyncio.run(run())
+        assert peak == 2
+        assert gate.in_flight == 0 and gate.waiting == 0
+
+    def test_rejects_when_queue_full(self):
+        """Test that callers beyond the queue depth fail fast"""
+        gate = ConcurrencyGate(max_concurrency=1, max_waiting=1)
+
+        async def run():
+            release = asyncio.Event()
+
+            async def holder():
+                async with gate:
+                    await release.wait()
+
+            tasks = [asyncio.create_task(holder()) for _ in range(2)]
+            await asyncio.sleep(0)  # one holds the slot, one waits
+            assert gate.is_full()
+            with pytest.raises(UpstreamBusyError):
+                async with gate:
+                    pass
+            release.set()
+            await asyncio.gather(*tasks)
+            assert not gate.is_full()
+
+        asyncio.run(run())
@@ -1,4 +1,8 @@
-from src.utils.jwt import create_access_token, verify_token
+from src.utils.jwt import (
+    create_access_token, verify_token, revoke_token, token_cache, RevocationList,
+    VerifiedTokenCache
+)
+from unittest.mock import Mock, patch
 from src.database.models import User
 import pytest
 from jose import jwt
@@ -66,3 +70,134 @@ class TestJWTUtils:
             expires_delta=expires_delta
         )
         assert verify_token(token) is not None
+
+class TestVerifiedTokenCache:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        token_cache.clear()
+        yield
+        token_cache.clear()
+
+    def test_repeat_verification_skips_decode(self):
+        """Test that a verified token is served from cache on the next call"""
+        token = create_access_token(data={"sub": "testuser"})
+        with patch("src.utils.jwt.jwt.decode", wraps=jwt.decode) as mock_decode:
+            first = verify_token(token)
+            second = verify_token(token)
+
+        assert first == second
+        assert second["sub"] == "testuser"
+        mock_decode.assert_called_once()
+
+    def test_cached_claims_are_copies(self):
+        """Test that mutating returned claims does not affect the cache"""
+        token = create_access_token(data={"sub": "testuser"})
+        verify_token(token)["sub"] = "mallory"
+        assert verify_token(token)["sub"] == "testuser"
+
+    def test_entry_expires_with_token(self):
+        """Test that cached claims are not served past the token's exp"""
+        token = create_access_token(data={"sub": "testuser"}, expires_delta=timedelta(seconds=60))
+        assert verify_token(token) is not None
+
+        exp = jwt.get_unverified_claims(token)["exp"]
+        with patch("src.utils.jwt.time.time", return_value=exp + 1):
+            assert token_cache.get(token) is None
+        assert len(token_cache) == 0
+
+    def test_revoke_token_invalidates_cache(self):
+        """Test that revoked tokens are dropped from the cache"""
+        token = create_access_token(data={"sub": "testuser"})
+        verify_token(token)
+        revoke_token(token)
+        assert token_cache.get(token) is None
+
+    def test_invalid_tokens_not_cached(self):
+        """Test that failed verifications leave nothing in the cache"""
+        verify_token("invalid.token.format")
+        assert len(token_cache) == 0
+
+    def test_cache_is_bounded(self):
+        """Test that the least recently used entry is evicted at capacity"""
+        cache = VerifiedTokenCache(max_entries=2)
+        for name in ["a", "b", "c"]:
+            cache.put(name, {"sub": name}, expires_at=9999999999)
+        assert len(cache) == 2
+        assert cache.get("a") is None
+        assert cache.get("c") == {"sub": "c"}
+
+class TestRevocationList:
+    @pytest.fixture
+    def revocations(self):
+        revocations = RevocationList(capacity=100, error_rate=0.01)
+        revocations.confirm = Mock(return_value=True)
+        with patch("src.utils.jwt.revocation_list", revocations):
+            yield revocations
+        token_cache.clear()
+
+    def test_tokens_carry_unique_ids(self):
+        """Test that every issued token has its own jti"""
+        first = jwt.get_unverified_claims(create_access_token(data={"sub": "testuser"}))
+        second = jwt.get_unverified_claims(create_access_token(data={"sub": "testuser"}))
+        assert first["jti"] != second["jti"]
+
+    def test_unrevoked_tokens_skip_confirmation(self, revocations):
+        """Test that tokens the filter has not seen never reach the store"""
+        token = create_access_token(data={"sub": "testuser"})
+        assert verify_token(token) is not None
+        revocations.confirm.assert_not_called()
+
+    def test_revoked_token_rejected_even_when_cached(self, revocations):
+        """Test that a revoked token fails verification after being cached"""
+        token = create_access_token(data={"sub": "testuser"})
+        assert verify_token(token) is not None
+
+        jti = jwt.get_unverified_claims(token)["jti"]
+        revocations.add(jti)
+        assert verify_token(token) is None
+        revocations.confirm.assert_called_once_with(jti)
+
+    def test_filter_false_positive_is_overruled(self, revocations):
+        """Test that a filter match the store does not confirm is accepted"""
+        token = create_access_token(data={"sub": "testuser"})
+        revocations.add(jwt.get_unverified_claims(token)["jti"])
+        revocations.confirm.return_value = False
+        assert verify_token(token) is not None
+
+    def test_confirmations_are_remembered(self, revocations):
+        """Test that replays of a revoked token reach the store only once"""
+        token = create_access_token(data={"sub": "testuser"})
+        revocations.add(jwt.get_unverified_claims(token)["jti"])
+
+        for _ in range(3):
+            assert verify_token(token) is None
+        revocations.confirm.assert_called_once()
+
+    def test_new_revocation_overrides_remembered_false_positive(self, revocations):
+        """Test that revoking a jti once confirmed as unrevoked takes effect"""
+        token = create_access_token(data={"sub": "testuser"})
+        jti = jwt.get_unverified_claims(token)["jti"]
+        revocations.add(jti)
+        revocations.confirm.return_value = False
+        assert verify_token(token) is not None
+
+        revocations.confirm.return_value = True
+        revocations.add(jti)
+        assert verify_token(token) is None
+
+    def test_rebuild_swaps_in_a_filled_filter(self, revocations):
+        """Test that a rebuild never exposes an empty filter"""
+        revocations.add("old")
+        revocations.add("kept")
+        seen_during_fill = []
+
+        def fill(jtis):
+            for jti in jtis:
+                seen_during_fill.append(revocations.is_revoked("kept"))
+                yield jti
+
+        revocations.rebuild(fill(["kept"]))
+
+        assert seen_during_fill == [True]
+        assert "kept" in revocations.filter
+        assert "old" not in revocations.filter
@@ -0,0 +1,80 @@
+from src.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry, format_labels
+import pytest
+import threading
+
+class TestMetrics:
+    def test_counter_sums_labels(self):
+        """Test that counter increments accumulate per label set"""
+        counter = Counter("requests_total", "Requests", ("route",))
+        counter.inc("/a")
+        counter.inc("/a", amount=2)
+        counter.inc("/b")
+
+        assert counter.value("/a") == 3
+        assert counter.value("/b") == 1
+        assert counter.value("/c") == 0
+
+    def test_counter_merges_thread_shards(self):
+        """Test that increments from many threads are all counted"""
+        counter = Counter("work_total", "Work")
+
+        def worker():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.value() == 8000
+
+    def test_gauge_tracks_in_flight(self):
+        """Test that a tracked block raises the gauge only while it runs"""
+        gauge = Gauge("in_flight", "In flight", ("method",))
+        with gauge.track("GET"):
+            assert gauge.value("GET") == 1
+        assert gauge.value("GET") == 0
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram exposition lines for buckets, sum and count"""
+        histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value, "/a")
+
+        lines = list(histogram.render())
+
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_sum{route="/a"} 2.55' in lines
+        assert 'latency_seconds_count{route="/a"} 3' in lines
+        assert "# TYPE latency_seconds histogram" in lines
+
+    def test_histogram_time(self):
+        """Test that timing a block records one observation"""
+        histogram = Histogram("op_seconds", "Op")
+        with histogram.time():
+            pass
+        assert histogram.count() == 1
+
+    def test_label_values_are_escaped(self):
+        """Test that quotes and backslashes cannot break the exposition format"""
+        assert format_labels(("path",), ('a"b\\c',)) == '{path="a\\"b\\\\c"}'
+
+    def test_registry_renders_metrics_and_collectors(self):
+        """Test the registry output, duplicate names and reset"""
+        registry = MetricsRegistry()
+        counter = registry.counter("jobs_total", "Jobs")
+        registry.add_collector(lambda: ["custom_metric 7"])
+        counter.inc()
+
+        text = registry.render()
+
+        assert "jobs_total 1\n" in text
+        assert text.endswith("custom_metric 7\n")
+        with pytest.raises(ValueError):
+            registry.counter("jobs_total", "Again")
+        registry.reset()
+        assert counter.value() == 0
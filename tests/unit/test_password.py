@@ -1,5 +1,9 @@
+import asyncio
 import pytest
-from src.utils.password import hash_password, verify_password
+from src.utils.password import (
+    hash_password, verify_password, hash_password_async, verify_password_async,
+    get_hash_rounds, needs_rehash, get_password_pool
+)
 
 class TestPasswordUtils:
     def test_hash_password_returns_string(self):
@@ -33,3 +37,48 @@ class TestPasswordUtils:
         """Test various edge cases for password handling"""
         hashed = hash_password(password)
         assert verify_password(password, hashed) is True
+
+class TestPasswordService:
+    @pytest.fixture(autouse=True)
+    def fast_rounds(self, monkeypatch):
+        monkeypatch.setattr("src.utils.password.BCRYPT_ROUNDS", 4)
+
+    def test_configured_work_factor(self):
+        """Test that new hashes use the configured bcrypt cost"""
+        assert get_hash_rounds(hash_password("secret")) == 4
+        assert get_hash_rounds(hash_password("secret", rounds=5)) == 5
+
+    def test_needs_rehash(self):
+        """Test that hashes with a different cost are flagged for rehashing"""
+        assert needs_rehash(hash_password("secret")) is False
+        assert needs_rehash(hash_password("secret", rounds=5)) is True
+
+    def test_needs_rehash_invalid_hash(self):
+        """Test that a malformed hash is rejected"""
+        with pytest.raises(ValueError):
+            needs_rehash("invalid_hash_format")
+
+    def test_async_hash_and_verify(self):
+        """Test hashing and verifying through the password pool"""
+        async def run():
+            hashed = await hash_password_async("pooled")
+            return (
+                hashed,
+                await verify_password_async("pooled", hashed),
+                await verify_password_async("wrong", hashed),
+            )
+
+        hashed, correct, wrong = asyncio.run(run())
+        assert get_hash_rounds(hashed) == 4
+        assert correct is True
+        assert wrong is False
+
+    def test_pool_disabled_runs_inline(self, monkeypatch):
+        """Test that PASSWORD_POOL_WORKERS=0 skips the process pool"""
+        monkeypatch.setattr("src.utils.password.PASSWORD_POOL_WORKERS", 0)
+        assert get_password_pool() is None
+
+        async def run():
+            return await verify_password_async("inline", await hash_password_async("inline"))
+
+        assert asyncio.run(run()) is True
@@ -0,0 +1,165 @@
+from src.api.providers import (
+    CircuitBreaker, ConcurrencyGate, LatencyTracker, LLMProvider, ProviderRouter, StubProvider,
+    UpstreamBusyError, UpstreamError, build_providers
+)
+import asyncio
+import pytest
+
+class FailingProvider(LLMProvider):
+    """Provider whose calls always fail, counting how often it was tried"""
+    def __init__(self, name="failing"):
+        self.name = name
+        self.calls = 0
+
+    async def generate(self, contents, operation="chat"):
+        self.calls += 1
+        raise RuntimeError(f"{self.name} is down")
+
+    async def stream(self, contents):
+        self.calls += 1
+        raise RuntimeError(f"{self.name} is down")
+        yield
+
+class SlowThenFastProvider(StubProvider):
+    """First call straggles, later calls are quick; records cancellations"""
+    def __init__(self, name="primary"):
+        super().__init__(name, reply=name)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate(self, contents, operation="chat"):
+        self.calls += 1
+        try:
+            await asyncio.sleep(1.0 if self.calls == 1 else 0.0)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"{self.name} reply {self.calls}"
+
+def make_router(providers, hedge=True):
+    return ProviderRouter(providers, ConcurrencyGate(8, 8), hedge=hedge)
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_recovers(self):
+        """Test closed -> open -> half-open -> closed transitions"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        now[0] = 10
+        assert breaker.allow()  # the single half-open trial
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.allow()
+
+    def test_failed_trial_reopens(self):
+        """Test that a failing half-open trial opens the circuit again"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=5, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 5
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+
+class TestLatencyTracker:
+    def test_percentile_needs_samples(self):
+        """Test that no percentile is reported before enough samples"""
+        tracker = LatencyTracker(window=100)
+        tracker.record(0.1)
+        assert tracker.percentile(95, min_samples=2) is None
+
+        for value in range(1, 101):
+            tracker.record(value / 100)
+        assert tracker.percentile(95, min_samples=2) == 0.95
+
+class TestProviderRouter:
+    def test_hedge_beats_straggler(self, monkeypatch):
+        """Test that a slow primary is hedged and the loser is cancelled"""
+        monkeypatch.setattr("src.api.providers.LLM_HEDGE_INITIAL_DELAY_MS", 20)
+        primary = SlowThenFastProvider("primary")
+        backup = StubProvider("backup", reply="backup reply")
+        router = make_router([primary, backup])
+
+        result = asyncio.run(router.generate("Hello"))
+
+        assert result == "backup reply"
+        assert primary.cancelled == 1
+        assert router.breakers["primary"].state == "closed"
+
+    def test_single_provider_hedges_against_itself(self, monkeypatch):
+        """Test that a lone provider gets a duplicate request when it straggles"""
+        monkeypatch.setattr("src.api.providers.LLM_HEDGE_INITIAL_DELAY_MS", 20)
+        primary = SlowThenFastProvider("primary")
+        router = make_router([primary])
+
+        assert asyncio.run(router.generate("Hello")) == "primary reply 2"
+
+    def test_no_hedge_when_disabled(self, monkeypatch):
+        """Test that hedging can be switched off"""
+        monkeypatch.setattr("src.api.providers.LLM_HEDGE_INITIAL_DELAY_MS", 20)
+        primary = StubProvider("primary", reply="slow reply", latency=0.1)
+        backup = StubProvider("backup", reply="backup reply")
+        router = make_router([primary, backup], hedge=False)
+
+        assert asyncio.run(router.generate("Hello")) == "slow reply"
+
+    def test_fails_over_to_next_provider(self):
+        """Test that a failing primary is routed around"""
+        primary = FailingProvider("primary")
+        router = make_router([primary, StubProvider("backup", reply="backup reply")])
+
+        assert asyncio.run(router.generate("Hello")) == "backup reply"
+        assert router.breakers["primary"].failures == 1
+
+    def test_open_circuit_skips_provider(self):
+        """Test that a provider with an open circuit is not called at all"""
+        primary = FailingProvider("primary")
+        router = make_router([primary, StubProvider("backup", reply="backup reply")])
+        router.breakers["primary"] = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+
+        asyncio.run(router.generate("First"))
+        asyncio.run(router.generate("Second"))
+
+        assert primary.calls == 1
+
+    def test_all_providers_failing_raises(self):
+        """Test that UpstreamError is raised once every provider failed"""
+        router = make_router([FailingProvider("a"), FailingProvider("b")])
+        with pytest.raises(UpstreamError, match="b is down"):
+            asyncio.run(router.generate("Hello"))
+
+    def test_busy_gate_propagates(self):
+        """Test that a full gate surfaces as UpstreamBusyError, not a provider failure"""
+        router = ProviderRouter([StubProvider()], ConcurrencyGate(1, 0))
+
+        async def run():
+            async with router.gate:
+                await router.generate("Hello")
+
+        with pytest.raises(UpstreamBusyError):
+            asyncio.run(run())
+        assert router.breakers["stub"].failures == 0
+
+    def test_stream_fails_over_before_first_chunk(self):
+        """Test that streams move to the next provider if nothing was sent yet"""
+        router = make_router([FailingProvider("primary"), StubProvider("backup", reply="a b")])
+        assert asyncio.run(collect(router.stream("Hello"))) == ["a ", "b "]
+
+class TestBuildProviders:
+    def test_builds_registered_types(self):
+        """Test parsing a provider spec into instances"""
+        providers = build_providers("stub:first, stub", {"stub": StubProvider})
+        assert [p.name for p in providers] == ["first", "stub"]
+
+    def test_rejects_unknown_type(self):
+        """Test that a typo in the spec fails loudly"""
+        with pytest.raises(ValueError):
+            build_providers("gpt:4", {"stub": StubProvider})
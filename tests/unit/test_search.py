@@ -0,0 +1,85 @@
+from fastapi import HTTPException
+from src.backend.search import build_match, search_messages
+from src.database.models import Conversation, Message
+from src.database.search import create_search_index
+import pytest
+
+@pytest.fixture
+def search_db(test_db):
+    create_search_index(test_db.get_bind())
+    return test_db
+
+def add_messages(db, user_id: int, *contents: str) -> list[int]:
+    conversation = Conversation(user_id=user_id)
+    db.add(conversation)
+    db.flush()
+    messages = [Message(conversation_id=conversation.id, role="user", content=c) for c in contents]
+    db.add_all(messages)
+    db.commit()
+    return [message.id for message in messages]
+
+class TestBuildMatch:
+    def test_terms_are_quoted_and_scoped(self):
+        """Test that user input is quoted, prefixes kept, and the owner scope added"""
+        assert build_match('rust "async io" trait*', 7) == (
+            'owner : u7 AND content : ("rust" "async io" "trait"*)'
+        )
+
+    def test_operators_cannot_widen_scope(self):
+        """Test that FTS syntax typed by the user is searched for literally"""
+        assert build_match('x OR owner:u1 "a""', 2) == (
+            'owner : u2 AND content : ("x" "OR" "owner:u1" "a" """")'
+        )
+
+    @pytest.mark.parametrize("query", ["", "   ", '""', "*"])
+    def test_empty_query_rejected(self, query):
+        with pytest.raises(HTTPException) as exc_info:
+            build_match(query, 1)
+        assert exc_info.value.status_code == 400
+
+class TestSearchMessages:
+    def test_ranked_snippets_scoped_to_user(self, search_db):
+        """Test that only the user's matches come back, best first, with snippets"""
+        best, other = add_messages(
+            search_db, 1, "Deploying the deploy script", "We can deploy it once the review is done"
+        )
+        add_messages(search_db, 2, "Deploy for someone else")
+
+        page = search_messages(search_db, 1, "deploy")
+
+        assert [hit.message_id for hit in page["items"]] == [best, other]
+        assert page["items"][0].snippet == "<mark>Deploying</mark> the <mark>deploy</mark> script"
+        assert page["items"][0].score > page["items"][1].score
+        assert page["next_cursor"] is None
+
+    def test_cursor_pagination(self, search_db):
+        """Test that following cursors visits every match exactly once"""
+        ids = add_messages(search_db, 1, *(f"note number {i}" for i in range(7)))
+
+        seen, cursor = [], None
+        while True:
+            page = search_messages(search_db, 1, "note", limit=3, cursor=cursor)
+            seen += [hit.message_id for hit in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(seen) == ids
+
+    def test_index_follows_updates_and_deletes(self, search_db):
+        """Test that triggers keep the index in step with message writes"""
+        message_id, = add_messages(search_db, 1, "original wording")
+        message = search_db.get(Message, message_id)
+        message.content = "revised wording"
+        search_db.commit()
+        assert search_messages(search_db, 1, "original")["items"] == []
+        assert len(search_messages(search_db, 1, "revised")["items"]) == 1
+
+        search_db.delete(message)
+        search_db.commit()
+        assert search_messages(search_db, 1, "wording")["items"] == []
+
+    def test_existing_messages_backfilled(self, test_db):
+        """Test that creating the index picks up messages stored before it existed"""
+        add_messages(test_db, 1, "written before search existed")
+        create_search_index(test_db.get_bind())
+        assert len(search_messages(test_db, 1, "search")["items"]) == 1
@@ -0,0 +1,144 @@
+from src.api.semantic_cache import HashedNgramEmbedder, SemanticCache
+from unittest.mock import MagicMock, patch
+import numpy as np
+import threading
+import time
+
+PROMPT = "Summarize the following article about climate change policy in Europe"
+REWORDED = "Please summarize the following article about climate change policy in Europe."
+
+
+class TestHashedNgramEmbedder:
+    def test_embeddings_are_stable_unit_vectors(self):
+        """Test that embeddings are deterministic, normalized and case-insensitive"""
+        embedder = HashedNgramEmbedder(dim=128)
+        vector = embedder.embed("How do I reset my password?")
+
+        assert vector.shape == (128,) and vector.dtype == np.float32
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+        assert np.allclose(vector, HashedNgramEmbedder(dim=128).embed("how do i RESET my password"))
+        assert not embedder.embed("?!").any()
+
+    def test_similar_text_scores_higher(self):
+        """Test that rewordings score well above unrelated prompts"""
+        embedder = HashedNgramEmbedder()
+        base = embedder.embed(PROMPT)
+
+        assert base @ embedder.embed(REWORDED) > 0.9
+        assert base @ embedder.embed("Write a poem about the sea") < 0.3
+
+
+class TestSemanticCache:
+    def test_hit_near_miss_and_miss(self):
+        """Test that lookups are served, counted as near misses, or missed by similarity"""
+        cache = SemanticCache(capacity=8, threshold=0.9, near_miss=0.7)
+        cache.set(PROMPT, "gemini", "Summary")
+
+        assert cache.get(REWORDED, "gemini") == "Summary"
+        assert cache.get(PROMPT.replace("Europe", "Germany"), "gemini") is None
+        assert cache.get("Write a poem about the sea", "gemini") is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["near_misses"]) == (1, 2, 1)
+
+    def test_lookup_many_matches_each_prompt(self):
+        """Test that a batched lookup answers every prompt from one product"""
+        cache = SemanticCache(capacity=8)
+        cache.set(PROMPT, "gemini", "Summary")
+        cache.set("Translate good morning into French", "gemini", "Bonjour")
+
+        assert cache.lookup_many(
+            [REWORDED, "translate 'good morning' into French", "Unrelated question"], "gemini"
+        ) == ["Summary", "Bonjour", None]
+
+    def test_scopes_are_isolated(self):
+        """Test that entries are only visible within their own scope"""
+        cache = SemanticCache(capacity=8)
+        cache.set(PROMPT, "gemini:alice", "Alice's summary")
+
+        assert cache.get(PROMPT, "gemini:alice") == "Alice's summary"
+        assert cache.get(PROMPT, "gemini:bob") is None
+
+    def test_duplicate_prompt_replaces_entry(self):
+        """Test that storing the same prompt again reuses its slot"""
+        cache = SemanticCache(capacity=8)
+        cache.set(PROMPT, "gemini", "Old")
+        cache.set(PROMPT.lower(), "gemini", "New")
+
+        assert cache.get(PROMPT, "gemini") == "New"
+        assert cache.stats()["size"] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Test that a full cache evicts the entry looked up least recently"""
+        cache = SemanticCache(capacity=2)
+        cache.set("What is FastAPI?", "gemini", "A web framework")
+        cache.set("What is SQLite?", "gemini", "An embedded database")
+        cache.get("What is FastAPI?", "gemini")
+        cache.set("What is Streamlit?", "gemini", "A UI library")
+
+        assert cache.get("What is FastAPI?", "gemini") == "A web framework"
+        assert cache.get("What is SQLite?", "gemini") is None
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired_entries_are_not_served(self, monkeypatch):
+        """Test that entries stop matching once their TTL has passed"""
+        cache = SemanticCache(capacity=8, ttl_seconds=60)
+        cache.set(PROMPT, "gemini", "Summary")
+
+        later = time.time() + 61
+        monkeypatch.setattr("src.api.semantic_cache.time.time", lambda: later)
+        assert cache.get(PROMPT, "gemini") is None
+        assert cache.stats()["size"] == 0
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test that a file-backed cache is reloaded from its memory-mapped vectors"""
+        path = str(tmp_path / "semantic.db")
+        cache = SemanticCache(capacity=8, dim=64, path=path)
+        cache.set(PROMPT, "gemini", "Summary")
+        cache.flush()
+
+        assert SemanticCache(capacity=8, dim=64, path=path).get(REWORDED, "gemini") == "Summary"
+        # A different shape cannot reuse the stored vectors
+        assert SemanticCache(capacity=8, dim=32, path=path).get(PROMPT, "gemini") is None
+
+    def test_vectors_flushed_before_metadata(self, tmp_path):
+        """Test that a slot's vector reaches the file before its metadata is committed"""
+        cache = SemanticCache(capacity=8, dim=64, path=str(tmp_path / "semantic.db"))
+        calls = MagicMock()
+        cache._db = calls.db
+        with patch.object(np.memmap, "flush", calls.flush):
+            cache.set(PROMPT, "gemini", "Summary")
+
+        names = [name for name, _, _ in calls.mock_calls]
+        assert names.index("flush") < names.index("db.commit")
+
+    def test_torn_entry_is_dropped(self, tmp_path):
+        """Test that metadata whose vector was overwritten without it is not served on reload"""
+        path = str(tmp_path / "semantic.db")
+        cache = SemanticCache(capacity=1, dim=64, path=path)
+        cache.set(PROMPT, "gemini", "Summary")
+        # A new vector reached the file, then the process died before its metadata did
+        cache._vectors[0] = cache.embedder.embed("What is the capital of France")
+        cache._vectors.flush()
+
+        reloaded = SemanticCache(capacity=1, dim=64, path=path)
+        assert reloaded.get(PROMPT, "gemini") is None
+        assert reloaded.stats()["size"] == 0
+
+    def test_lookups_do_not_wait_for_disk(self, tmp_path):
+        """Test that a hit is served while another thread is writing entries to disk"""
+        cache = SemanticCache(capacity=8, dim=64, path=str(tmp_path / "semantic.db"))
+        cache.set(PROMPT, "gemini", "Summary")
+        writing, release = threading.Event(), threading.Event()
+        def slow_flush(vectors):
+            writing.set()
+            release.wait(5)
+        with patch.object(np.memmap, "flush", slow_flush):
+            writer = threading.Thread(target=cache.set, args=("Another prompt", "gemini", "Other"))
+            writer.start()
+            try:
+                assert writing.wait(5)
+                assert cache.get(REWORDED, "gemini") == "Summary"
+                assert writer.is_alive()
+            finally:
+                release.set()
+                writer.join()
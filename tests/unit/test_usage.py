@@ -0,0 +1,97 @@
+from fastapi import HTTPException
+from src.backend.usage import UsageMeter, upsert_usage, usage_days, utc_today
+from src.database.models import TokenUsage, User
+from unittest.mock import patch
+import asyncio
+import pytest
+
+@pytest.fixture
+def users(test_db):
+    test_db.add_all([
+        User(username="alice", email="alice@example.com", hashed_password="x"),
+        User(username="bob", email="bob@example.com", hashed_password="x"),
+    ])
+    test_db.commit()
+
+def stored_usage(db, username):
+    row = db.query(TokenUsage).join(User).filter(User.username == username).one()
+    return row.prompt_tokens, row.completion_tokens, row.requests
+
+class TestUsageMeter:
+    def test_record_accumulates_in_memory(self):
+        """Test that recorded tokens count towards usage before any flush"""
+        meter = UsageMeter(quota=100)
+        meter.record("alice", 10, 20)
+        meter.record("alice", 5, 5)
+
+        assert meter.used("alice") == 40
+        assert meter.pending("alice", utc_today()) == [15, 25, 2]
+        assert meter.used("bob") == 0
+
+    def test_flush_writes_and_adds_up(self, test_db, users):
+        """Test that flushes add to the stored rows in one batch and clear pending counts"""
+        meter = UsageMeter()
+        meter.record("alice", 10, 20)
+        meter.record("bob", 1, 2)
+        assert meter.flush(test_db) == 2
+        meter.record("alice", 5, 5)
+        assert meter.flush(test_db) == 1
+
+        assert stored_usage(test_db, "alice") == (15, 25, 2)
+        assert stored_usage(test_db, "bob") == (1, 2, 1)
+        assert meter.pending("alice", utc_today()) == [0, 0, 0]
+        # The view now comes from the stored totals
+        assert meter.used("alice") == 40
+        assert meter.flush(test_db) == 0
+
+    def test_failed_flush_keeps_counts(self, test_db, users):
+        """Test that counts survive a failed flush and are written by the next one"""
+        meter = UsageMeter()
+        meter.record("alice", 10, 20)
+        with patch("src.backend.usage.upsert_usage", side_effect=RuntimeError("locked")):
+            with pytest.raises(RuntimeError):
+                meter.flush(test_db)
+        meter.record("alice", 1, 1)
+
+        assert meter.flush(test_db) == 1
+        assert stored_usage(test_db, "alice") == (11, 21, 2)
+
+    def test_flushing_batch_still_counts(self, test_db, users):
+        """Test that usage being written by a flush keeps counting towards the quota and reports"""
+        meter = UsageMeter(quota=30)
+        meter.record("alice", 10, 20)
+        seen = []
+        def upsert(db, rows):
+            day, = usage_days(db, "alice", 1)
+            seen.append((meter.used("alice"), day.prompt_tokens, day.completion_tokens))
+            upsert_usage(db, rows)
+        with patch("src.backend.usage.upsert_usage", upsert), \
+                patch("src.backend.usage.usage_meter", meter):
+            meter.flush(test_db)
+
+        assert seen == [(30, 10, 20)]
+        assert meter.used("alice") == 30
+        assert meter._inflight == {}
+
+    def test_check_rejects_over_quota(self, test_db, users):
+        """Test that a user at the quota is refused with 429 and others are not"""
+        meter = UsageMeter(quota=30)
+        meter.record("alice", 10, 20)
+        async def in_test_db(_, func, *args):
+            # The in-memory test database lives on this thread only
+            return func(test_db, *args)
+        with patch("src.backend.usage.run_in_threadpool", in_test_db):
+            with pytest.raises(HTTPException) as error:
+                asyncio.run(meter.check("alice"))
+            asyncio.run(meter.check("bob"))
+
+        assert error.value.status_code == 429
+        assert int(error.value.headers["Retry-After"]) > 0
+
+    def test_unlimited_quota_skips_lookup(self):
+        """Test that no quota means no check and no database access"""
+        meter = UsageMeter(quota=0)
+        meter.record("alice", 10**9, 0)
+        with patch.object(UsageMeter, "_in_session") as in_session:
+            asyncio.run(meter.check("alice"))
+        in_session.assert_not_called()
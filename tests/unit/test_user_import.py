@@ -0,0 +1,128 @@
+from sqlalchemy import event
+from src.backend.user_import import UserImporter, detect_format, read_rows
+from src.database.models import User
+from src.utils.password import verify_password
+import pytest
+
+@pytest.fixture(autouse=True)
+def fast_inline_hashing(monkeypatch):
+    monkeypatch.setattr("src.backend.user_import.BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr("src.utils.password.PASSWORD_POOL_WORKERS", 0)
+
+def csv_lines(*rows: str) -> list[str]:
+    return ["username,email,password\n", *(row + "\n" for row in rows)]
+
+class TestReadRows:
+    def test_csv_rows(self):
+        """Test that CSV rows are numbered and keyed by header"""
+        rows = list(read_rows(csv_lines("alice,alice@example.com,secret1"), "csv"))
+        assert rows == [
+            (1, {"username": "alice", "email": "alice@example.com", "password": "secret1"})
+        ]
+
+    def test_jsonl_rows(self):
+        """Test that JSONL rows are parsed, skipping blanks and flagging bad lines"""
+        lines = ['{"username": "bob"}\n', "\n", "not json\n", "[1, 2]\n"]
+        assert list(read_rows(lines, "jsonl")) == [(1, {"username": "bob"}), (3, None), (4, None)]
+
+    @pytest.mark.parametrize("filename,fmt,expected", [
+        ("users.csv", None, "csv"),
+        ("users.JSONL", None, "jsonl"),
+        ("upload.txt", "csv", "csv"),
+    ])
+    def test_detect_format(self, filename, fmt, expected):
+        """Test format detection from explicit value or file extension"""
+        assert detect_format(filename, fmt) == expected
+
+    def test_detect_unknown_format(self):
+        """Test that unknown formats are rejected"""
+        with pytest.raises(ValueError):
+            detect_format("users.xlsx", None)
+
+class TestUserImporter:
+    def test_imports_valid_rows(self, test_db):
+        """Test that valid rows are created with hashed passwords"""
+        importer = UserImporter(test_db, batch_size=2)
+        lines = csv_lines(
+            "alice,alice@example.com,secret1",
+            "bob,bob@example.com,secret2",
+            "carol,carol@example.com,secret3",
+        )
+        results = list(importer.run(read_rows(lines, "csv")))
+
+        assert [r.status for r in results] == ["created"] * 3
+        assert importer.counts == {"created": 3, "duplicate": 0, "invalid": 0}
+        carol = test_db.query(User).filter(User.username == "carol").first()
+        assert verify_password("secret3", carol.hashed_password)
+
+    def test_reports_duplicates_and_invalid_rows(self, test_db):
+        """Test per-row results for existing users, in-file duplicates and bad data"""
+        test_db.add(User(username="taken", email="taken@example.com", hashed_password="x"))
+        test_db.commit()
+        lines = csv_lines(
+            "taken,new@example.com,secret1",      # username in database
+            "fresh,taken@example.com,secret1",    # email in database
+            "dave,dave@example.com,secret1",
+            "dave,other@example.com,secret1",     # repeats an earlier row
+            "x,bad-email,1",                      # fails validation
+        )
+        results = list(UserImporter(test_db, batch_size=2).run(read_rows(lines, "csv")))
+
+        assert [(r.row, r.status) for r in results] == [
+            (1, "duplicate"), (2, "duplicate"), (3, "created"), (4, "duplicate"), (5, "invalid")
+        ]
+        assert results[0].detail == "Username already registered"
+        assert results[1].detail == "Email already registered"
+        assert "username" in results[4].detail
+        assert test_db.query(User).count() == 2
+
+    def test_rejected_rows_do_not_claim_names(self, test_db):
+        """Test that a duplicate row's other fields stay free for later rows, across batches"""
+        test_db.add(User(username="alice", email="alice@example.com", hashed_password="x"))
+        test_db.commit()
+        lines = csv_lines(
+            "alice,b@example.com,secret1",        # username in database
+            "carol,b@example.com,secret1",        # same batch, email never imported
+            "alice,c@example.com,secret1",        # username in database
+            "dave,dave@example.com,secret1",
+            "erin,c@example.com,secret1",         # later batch, email never imported
+        )
+        results = list(UserImporter(test_db, batch_size=2).run(read_rows(lines, "csv")))
+
+        assert [r.status for r in results] == [
+            "duplicate", "created", "duplicate", "created", "created"
+        ]
+        assert test_db.query(User).count() == 4
+
+    def test_extra_columns_are_invalid(self, test_db):
+        """Test that a CSV row longer than the header is reported instead of ending the import"""
+        lines = csv_lines(
+            "erin,erin@example.com,secret1,surplus",
+            "frank,frank@example.com,secret1",
+        )
+        results = list(UserImporter(test_db).run(read_rows(lines, "csv")))
+
+        assert [(r.row, r.status) for r in results] == [(1, "invalid"), (2, "created")]
+        assert results[0].detail == "More columns than the header"
+
+    def test_one_duplicate_query_per_batch(self, test_db):
+        """Test that duplicate detection issues a single SELECT per batch"""
+        importer = UserImporter(test_db, batch_size=50)
+        lines = csv_lines(*(f"user{i},user{i}@example.com,secret{i}" for i in range(100)))
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = test_db.get_bind()
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            list(importer.run(read_rows(lines, "csv")))
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+        assert len(selects) == 2
+        assert len(inserts) == 2
+        assert test_db.query(User).count() == 100
@@ -0,0 +1,136 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database.database import Base
+from src.database.models import Conversation, Message, User
+from src.database.writer import MessageWriter
+from src.backend.conversations import exchange_rows
+from concurrent.futures import Future
+import asyncio
+import pytest
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database, since the writer commits from its own thread
+    engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        user = User(username="alice", email="alice@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(Conversation(id=1, user_id=user.id, title="Chat"))
+        db.commit()
+    yield factory
+    engine.dispose()
+
+def stored_contents(factory):
+    with factory() as db:
+        return [row.content for row in db.query(Message).order_by(Message.id)]
+
+class TestMessageWriter:
+    def test_write_waits_for_commit(self, session_factory):
+        """Test that write() returns only after the rows are readable"""
+        writer = MessageWriter(session_factory, max_wait_ms=0)
+        try:
+            asyncio.run(writer.write(exchange_rows(1, "hello", "hi there")))
+            assert stored_contents(session_factory) == ["hello", "hi there"]
+        finally:
+            writer.stop()
+
+    def test_groups_queued_submissions(self, session_factory):
+        """Test that submissions queued together share one commit"""
+        writer = MessageWriter(session_factory, max_wait_ms=50)
+        commits = []
+        commit = writer._commit
+        writer._commit = lambda batch: (commits.append(len(batch)), commit(batch))
+        try:
+            futures = [writer.submit(exchange_rows(1, f"q{i}", f"a{i}")) for i in range(5)]
+            for future in futures:
+                future.result(timeout=5)
+        finally:
+            writer.stop()
+
+        assert sum(commits) == 5
+        assert len(commits) < 5
+        assert len(stored_contents(session_factory)) == 10
+
+    def test_batch_size_is_bounded(self, session_factory):
+        """Test that a batch stops taking submissions at max_batch rows"""
+        writer = MessageWriter(session_factory, max_batch=4, max_wait_ms=50)
+        sizes = []
+        commit = writer._commit
+        writer._commit = lambda batch: (
+            sizes.append(sum(len(rows) for rows, _ in batch)), commit(batch)
+        )
+        try:
+            futures = [writer.submit(exchange_rows(1, f"q{i}", f"a{i}")) for i in range(6)]
+            for future in futures:
+                future.result(timeout=5)
+        finally:
+            writer.stop()
+
+        assert max(sizes) <= 4
+        assert sum(sizes) == 12
+
+    def test_failure_only_fails_its_submission(self, session_factory):
+        """Test that a bad row fails its own caller while the rest of the batch commits"""
+        writer = MessageWriter(session_factory, max_wait_ms=50)
+        try:
+            good = writer.submit(exchange_rows(1, "fine", "ok"))
+            bad = writer.submit([{"conversation_id": 1, "role": "user", "content": None}])
+            good.result(timeout=5)
+            with pytest.raises(Exception):
+                bad.result(timeout=5)
+        finally:
+            writer.stop()
+
+        assert stored_contents(session_factory) == ["fine", "ok"]
+
+    def test_stop_commits_pending_rows(self, session_factory):
+        """Test that stop() drains the queue before the thread ends"""
+        writer = MessageWriter(session_factory, max_wait_ms=1000)
+        future = writer.submit(exchange_rows(1, "last", "words"))
+        writer.stop()
+
+        assert future.done() and future.exception() is None
+        assert stored_contents(session_factory) == ["last", "words"]
+
+    def test_cancelled_waiter_does_not_stall_batch(self, session_factory):
+        """Test that cancelling one waiter mid-batch leaves the writer and other waiters working"""
+        writer = MessageWriter(session_factory, max_wait_ms=200)
+
+        async def scenario():
+            cancelled = asyncio.create_task(writer.write(exchange_rows(1, "gone", "bye")))
+            waiting = asyncio.create_task(writer.write(exchange_rows(1, "stay", "hi")))
+            await asyncio.sleep(0.05)
+            cancelled.cancel()
+            await asyncio.wait_for(waiting, 5)
+            await asyncio.wait_for(writer.write(exchange_rows(1, "later", "ok")), 5)
+
+        try:
+            asyncio.run(scenario())
+            assert writer._thread.is_alive()
+        finally:
+            writer.stop()
+
+        assert stored_contents(session_factory) == ["gone", "bye", "stay", "hi", "later", "ok"]
+
+    def test_full_queue_does_not_block_loop(self, session_factory):
+        """Test that write() waits for queue room off the event loop"""
+        writer = MessageWriter(session_factory, queue_size=1)
+        # No writer thread, so the queue only drains when the test says so
+        writer.start = lambda: None
+        writer._queue.put((exchange_rows(1, "first", "one"), Future()))
+
+        async def scenario():
+            write = asyncio.create_task(
+                writer.write(exchange_rows(1, "second", "two"), durable=False)
+            )
+            await asyncio.sleep(0.05)
+            assert not write.done()
+            writer._queue.get_nowait()
+            await asyncio.wait_for(write, 5)
+
+        asyncio.run(scenario())
+        rows, _ = writer._queue.get_nowait()
+        assert rows[0]["content"] == "second"